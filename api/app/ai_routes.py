@@ -1,10 +1,15 @@
 # api/app/ai_routes.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 import os
+import time
 import httpx
 
+from .http_client import get_ai_client
+from .metrics import UPSTREAM_SECONDS
+from .resilience import AsyncUpstreamGuard, Overloaded
+
 
 class BudgetItem(BaseModel):
     category: str
@@ -27,13 +32,45 @@ router = APIRouter(prefix="/ai", tags=["ai"])
 
 AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://localhost:8001")
 
+# max in-flight calls + circuit breaker in front of the ai-service (see app/resilience.py)
+ai_guard = AsyncUpstreamGuard.from_env()
+
 
 @router.post("/advice")
-async def get_budget_advice(req: AdviceRequest):
+async def get_budget_advice(req: AdviceRequest, client: httpx.AsyncClient = Depends(get_ai_client)):
     """
-    Called by the frontend. Forwards the request body to the ai-service.
+    Called by the frontend. Forwards the request body to the ai-service
+    over the shared, pooled client (see app/http_client.py).
     """
-    async with httpx.AsyncClient() as client:
+    try:
+        ticket = await ai_guard.acquire()
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"ai-service unavailable ({e.reason})",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    started = time.perf_counter()
+    outcome = "error"
+    try:
         resp = await client.post(f"{AI_SERVICE_URL}/advice", json=req.dict())
+        # 5xx means the ai-service is struggling; 4xx is our request's fault
+        if resp.status_code >= 500:
+            ticket.failure()
+        else:
+            ticket.success()
+            outcome = "ok"
+    except httpx.TimeoutException:
+        ticket.failure()
+        outcome = "timeout"
+        raise HTTPException(status_code=504, detail="ai-service timed out")
+    except httpx.HTTPError:
+        ticket.failure()
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, "ai-service", outcome)
+        await ticket.release()
+
     resp.raise_for_status()
     return resp.json()
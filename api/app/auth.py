@@ -0,0 +1,113 @@
+# api/app/auth.py
+"""
+Bearer tokens for the API.
+
+POST /auth/token checks an email and password against the user the web app
+registered and returns a random token. Clients send it back as
+`Authorization: Bearer <token>`. As with password reset tokens
+(services/reset_tokens.py), only a SHA-256 of the token is stored, in
+`api_tokens`. A TTL index on `expires_at` removes expired tokens, and
+lookups check `expires_at` too. A user can hold several tokens, one per
+device; DELETE /auth/token revokes the one in use.
+
+`current_user` is the dependency routes use to find out who is calling.
+"""
+import asyncio
+import functools
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+
+import bcrypt
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from werkzeug.security import check_password_hash
+
+from .database import get_database
+from .schemas import TokenResponse, UserLogin
+
+COLLECTION = "api_tokens"
+TOKEN_TTL = int(os.getenv("API_TOKEN_TTL", str(7 * 24 * 3600)))
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+bearer = HTTPBearer(auto_error=False)
+
+
+@functools.lru_cache(maxsize=1)
+def _dummy_hash():
+    # checked when the email is unknown, so the response time doesn't reveal it
+    return bcrypt.hashpw(b"not a password", bcrypt.gensalt(rounds=12)).decode("ascii")
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def verify_password(stored, password):
+    """Check `password` against a hash the web app stored (bcrypt, or a werkzeug method)."""
+    if not stored:
+        return False
+    if stored.startswith(("$2b$", "$2a$", "$2y$")):
+        try:
+            # bcrypt only looks at the first 72 bytes, like services/passwords.py
+            return bcrypt.checkpw(password.encode("utf-8")[:72], stored.encode("ascii"))
+        except ValueError:  # malformed hash
+            return False
+    return check_password_hash(stored, password)
+
+
+async def issue_token(db, user_id, ttl=TOKEN_TTL, now=None):
+    """Store a new token for `user_id` and return it in plain text, with its expiry."""
+    now = now or datetime.utcnow()
+    token = secrets.token_urlsafe(32)
+    expires_at = now + timedelta(seconds=ttl)
+    await db[COLLECTION].insert_one({
+        "user_id": user_id,
+        "token_hash": hash_token(token),
+        "created_at": now,
+        "expires_at": expires_at,
+    })
+    return token, expires_at
+
+
+def _unauthorized(detail):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer),
+    db=Depends(get_database),
+) -> ObjectId:
+    """The id of the user whose bearer token came with the request; 401 without a live one."""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    doc = await db[COLLECTION].find_one(
+        {"token_hash": hash_token(credentials.credentials), "expires_at": {"$gt": datetime.utcnow()}},
+        {"user_id": 1},
+    )
+    if doc is None:
+        raise _unauthorized("Invalid or expired token")
+    return doc["user_id"]
+
+
+@router.post("/token", response_model=TokenResponse)
+async def login(body: UserLogin, db=Depends(get_database)):
+    user = await db.users.find_one({"email": body.email.strip().lower()}, {"password": 1})
+    stored = user.get("password") if user else _dummy_hash()
+    # bcrypt is slow on purpose; keep it off the event loop
+    valid = await asyncio.to_thread(verify_password, stored, body.password)
+    if not (user and valid):
+        raise _unauthorized("Invalid email or password")
+    token, expires_at = await issue_token(db, user["_id"])
+    return {"access_token": token, "token_type": "bearer", "expires_at": expires_at, "user_id": str(user["_id"])}
+
+
+@router.delete("/token", status_code=204)
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(bearer), db=Depends(get_database)):
+    """Revoke the token this request carries."""
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    await db[COLLECTION].delete_one({"token_hash": hash_token(credentials.credentials)})
+    return Response(status_code=204)
@@ -0,0 +1,88 @@
+"""
+Bulk create: tens of thousands of rows in one request.
+
+The `/batch` endpoints let FastAPI validate the body, so one bad row rejects
+the whole request, and they send every created row back. The `/bulk`
+endpoints read the raw body instead, with a size cap. `validate_rows`
+parses and validates it in one `TypeAdapter.validate_json` pass: pydantic-core
+reads the bytes straight into models, with no per-item model calls and no
+intermediate list of dicts. Only when some rows fail is the body parsed again,
+to validate the rest. Failures are reported per row, like a statement import.
+
+The routes only call `read_body` after the caller's token has been checked
+(crud_routes.owner), so an anonymous request is refused without the server
+buffering its body.
+"""
+import json
+from typing import List
+
+from pydantic import TypeAdapter, ValidationError
+
+from .schemas import ExpenseCreate, IncomeCreate
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+# building an adapter compiles a validator, so do it once
+EXPENSE_ROWS = TypeAdapter(List[ExpenseCreate])
+INCOME_ROWS = TypeAdapter(List[IncomeCreate])
+
+
+class BulkError(ValueError):
+    """The request as a whole is unusable; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_body(request, max_bytes):
+    """The request body, or BulkError(413) as soon as it grows past max_bytes."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise BulkError(f"request body is over {max_bytes} bytes", status=413)
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise BulkError(f"request body is over {max_bytes} bytes", status=413)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _message(error):
+    field = ".".join(str(part) for part in error["loc"][1:])
+    return f"{field}: {error['msg']}" if field else error["msg"]
+
+
+def validate_rows(adapter, body, max_rows):
+    """
+    (models, row numbers, {row number: error}) for a JSON array of rows.
+
+    Row numbers are 0-based positions in the array; models[i] came from row
+    numbers[i]. Raises BulkError if the body isn't a JSON array or has more
+    than max_rows rows.
+    """
+    try:
+        items = adapter.validate_json(body)
+    except ValidationError as e:
+        failed = {}
+        for error in e.errors(include_url=False, include_input=False):
+            loc = error["loc"]
+            if not loc or not isinstance(loc[0], int):
+                # invalid JSON, or not an array
+                raise BulkError(f"body must be a JSON array of rows: {error['msg']}")
+            failed.setdefault(loc[0], []).append(_message(error))
+        rows = orjson.loads(body) if orjson is not None else json.loads(body)
+        if len(rows) > max_rows:
+            raise BulkError(f"at most {max_rows} rows per request", status=413)
+        numbers = [i for i in range(len(rows)) if i not in failed]
+        # every row left is valid on its own, so this can't raise
+        items = adapter.validate_python([rows[i] for i in numbers])
+        return items, numbers, {i: "; ".join(messages) for i, messages in failed.items()}
+
+    if len(items) > max_rows:
+        raise BulkError(f"at most {max_rows} rows per request", status=413)
+    return items, range(len(items)), {}
@@ -0,0 +1,385 @@
+# api/app/crud_routes.py
+"""
+Async CRUD for a user's expenses, incomes and budget plans, for the mobile
+client and integrations (the web app keeps its own form routes). Every route
+needs a bearer token (app/auth.py) for the {user_id} in the path.
+
+Documents have the same shape the web app writes. Listings use its keyset
+pagination (app/pagination.py), and every expense / income write also
+updates monthly_rollups (app/rollups.py) so the web dashboard stays current.
+Lists go out through app/responses.py rather than per-item Pydantic models.
+The `/bulk` endpoints validate a whole payload in one pass (app/bulk.py).
+"""
+import os
+from datetime import date, datetime, time, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .bulk import EXPENSE_ROWS, INCOME_ROWS, BulkError, read_body, validate_rows
+from .auth import current_user
+from .database import get_database
+from .models import BudgetPlan, Expense, Income
+from .pagination import PAGE_SIZE, SORT, clamp_page_size, keyset_filter, split_page
+from .responses import DocumentSerializer, FastJSONResponse
+from .rollups import COLLECTION as ROLLUPS, rollup_updates
+from .schemas import (
+    BudgetPlanCreate,
+    BulkResult,
+    BudgetPlanResponse,
+    ExpenseCreate,
+    ExpensePage,
+    ExpenseResponse,
+    IncomeCreate,
+    IncomePage,
+    IncomeResponse,
+)
+
+# same default page size as the web app's /api/expenses
+DEFAULT_LIMIT = clamp_page_size(os.getenv("EXPENSE_PAGE_SIZE", PAGE_SIZE))
+BATCH_MAX = int(os.getenv("API_BATCH_MAX", "500"))
+BULK_MAX_ROWS = int(os.getenv("API_BULK_MAX_ROWS", "50000"))
+BULK_MAX_BYTES = int(os.getenv("API_BULK_MAX_BYTES", str(16 * 1024 * 1024)))
+BULK_MAX_ERRORS = int(os.getenv("API_BULK_MAX_ERRORS", "100"))
+
+expense_json = DocumentSerializer(ExpenseResponse, object_ids=("user_id", "budget_plan_id"))
+income_json = DocumentSerializer(IncomeResponse, object_ids=("user_id", "budget_plan_id"))
+budget_plan_json = DocumentSerializer(BudgetPlanResponse)
+
+
+def _object_id(value, what):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail=f"{what} not found")
+
+
+def owner(user_id: str, caller: ObjectId = Depends(current_user)) -> ObjectId:
+    """The caller's id, if the {user_id} path segment is theirs; 403 otherwise."""
+    if user_id != str(caller):
+        raise HTTPException(status_code=403, detail="These records belong to another user")
+    return caller
+
+
+async def existing_owner(uid: ObjectId = Depends(owner), db=Depends(get_database)) -> ObjectId:
+    """Like `owner`, but 404s unless the user exists (for writes)."""
+    if await db.users.find_one({"_id": uid}, {"_id": 1}) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return uid
+
+
+# owner on the router too, so no route here can skip the token check
+# (FastAPI resolves a dependency once per request)
+router = APIRouter(prefix="/users/{user_id}", tags=["records"], dependencies=[Depends(owner)])
+
+
+# ---------- helpers ----------
+def _naive_utc(dt):
+    # stored naive UTC, like everything the web app writes
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _month_start(year, month):
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+
+def _when(body):
+    """(date, year, month) for a new row: its date, else the 1st of its year/month, else today."""
+    if body.date is not None:
+        dt = _naive_utc(body.date)
+    elif body.year and body.month:
+        if not 1 <= body.month <= 12:
+            raise ValueError("month must be 1-12")
+        dt = _month_start(body.year, body.month)
+    else:
+        dt = datetime.combine(date.today(), time.min)
+    return dt, dt.year, dt.month
+
+
+def _date_range(start=None, end=None, year=None, month=None):
+    """Mongo condition for `date` in [start, end) and within year/month; None when unbounded."""
+    lower, upper = _naive_utc(start), _naive_utc(end)
+    if year is not None:
+        first, after = _month_start(year, month), _month_start(year, month + 1)
+        lower = max(lower, first) if lower else first
+        upper = min(upper, after) if upper else after
+    cond = {}
+    if lower:
+        cond["$gte"] = lower
+    if upper:
+        cond["$lt"] = upper
+    return cond or None
+
+
+def _check_month(year, month):
+    if (year is None) != (month is None):
+        raise HTTPException(status_code=422, detail="year and month go together")
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=422, detail="month must be 1-12")
+
+
+async def _page(collection, base_filter, cursor, limit, serializer):
+    try:
+        query = keyset_filter(base_filter, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = clamp_page_size(limit)
+    docs = await collection.find(query, serializer.projection).sort(SORT).limit(limit + 1).to_list(limit + 1)
+    docs, next_cursor = split_page(docs, limit)
+    # the cursor is taken from the raw last document, before serializing renames _id
+    return FastJSONResponse({"items": serializer.many(docs), "next_cursor": next_cursor})
+
+
+async def _record_rollups(db, expenses=(), incomes=(), sign=1):
+    ops = rollup_updates(expenses, incomes, sign)
+    if ops:
+        await db[ROLLUPS].bulk_write(ops, ordered=False)
+
+
+def _build(rows, make):
+    """Documents for a batch; 422 naming the first row that can't be placed in a month."""
+    if len(rows) > BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX} rows per batch")
+    docs = []
+    for i, row in enumerate(rows):
+        try:
+            docs.append(make(row))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"row {i}: {e}")
+    return docs
+
+
+async def _bulk_create(request, db, collection, adapter, make, kind):
+    """
+    Validate, normalize and insert a `/bulk` body. Rows that fail are skipped
+    and reported; the rest go in one unordered insert_many (one bulk write,
+    which the driver splits into wire-sized batches) and one rollup bulk_write.
+    """
+    try:
+        body = await read_body(request, BULK_MAX_BYTES)
+        items, numbers, errors = validate_rows(adapter, body, BULK_MAX_ROWS)
+    except BulkError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    del body
+    rows = len(items) + len(errors)
+
+    # each document replaces its model, so the two lists never coexist in full
+    for i, item in enumerate(items):
+        try:
+            items[i] = make(item)
+        except ValueError as e:
+            errors[numbers[i]] = str(e)
+            items[i] = None
+    docs, doc_rows = items, numbers
+    if len(errors) > rows - len(items):
+        kept = [i for i, doc in enumerate(items) if doc is not None]
+        docs, doc_rows = [items[i] for i in kept], [numbers[i] for i in kept]
+
+    written = docs
+    if docs:
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details["writeErrors"]}
+            for error in e.details["writeErrors"]:
+                errors[doc_rows[error["index"]]] = error["errmsg"]
+            written = [doc for i, doc in enumerate(docs) if i not in failed]
+        await _record_rollups(db, **{kind: written})
+
+    return {
+        "rows": rows,
+        "inserted": len(written),
+        "error_count": len(errors),
+        "errors": [{"row": row, "error": errors[row]} for row in sorted(errors)[:BULK_MAX_ERRORS]],
+    }
+
+
+# ---------- expenses ----------
+def expense_doc(uid, body: ExpenseCreate) -> dict:
+    dt, year, month = _when(body)
+    doc = Expense.create_expense_dict(uid, body.category, body.amount, body.is_recurring, dt, month, year)
+    doc["note"] = (body.note or "").strip()
+    return doc
+
+
+@router.get("/expenses", response_model=ExpensePage)
+async def list_expenses(
+    uid: ObjectId = Depends(owner),
+    db=Depends(get_database),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    category: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="date on or after"),
+    end: Optional[datetime] = Query(None, description="date before"),
+):
+    """Newest first; pass the returned next_cursor to get the following page."""
+    _check_month(year, month)
+    base_filter = {"user_id": uid}
+    if year is not None:
+        # by the stored year/month, so expenses without a date are listed too
+        base_filter.update(year=year, month=month)
+    if category:
+        base_filter["category"] = category
+    dates = _date_range(start, end)
+    if dates:
+        base_filter["date"] = dates
+    return await _page(db.expenses, base_filter, cursor, limit, expense_json)
+
+
+@router.post("/expenses", response_model=ExpenseResponse, status_code=201)
+async def create_expense(body: ExpenseCreate, uid: ObjectId = Depends(existing_owner), db=Depends(get_database)):
+    try:
+        doc = expense_doc(uid, body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await db.expenses.insert_one(doc)
+    await _record_rollups(db, expenses=[doc])
+    return Expense.to_response(doc)
+
+
+@router.post("/expenses/batch", response_model=List[ExpenseResponse], status_code=201)
+async def create_expenses(body: List[ExpenseCreate], uid: ObjectId = Depends(existing_owner),
+                          db=Depends(get_database)):
+    """Up to API_BATCH_MAX expenses in one insert_many and one rollup bulk_write."""
+    docs = _build(body, lambda row: expense_doc(uid, row))
+    if docs:
+        await db.expenses.insert_many(docs)
+        await _record_rollups(db, expenses=docs)
+    return FastJSONResponse(expense_json.many(docs), status_code=201)
+
+
+@router.post("/expenses/bulk", response_model=BulkResult)
+async def bulk_create_expenses(request: Request, uid: ObjectId = Depends(existing_owner),
+                               db=Depends(get_database)):
+    """
+    A JSON array of up to API_BULK_MAX_ROWS expenses (same fields as POST
+    /expenses). Invalid rows are reported by position and the rest are saved.
+    """
+    return await _bulk_create(request, db, db.expenses, EXPENSE_ROWS, lambda row: expense_doc(uid, row), "expenses")
+
+
+@router.delete("/expenses/{expense_id}", status_code=204)
+async def delete_expense(expense_id: str, uid: ObjectId = Depends(owner), db=Depends(get_database)):
+    deleted = await db.expenses.find_one_and_delete({"_id": _object_id(expense_id, "Expense"), "user_id": uid})
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    await _record_rollups(db, expenses=[deleted], sign=-1)
+    return Response(status_code=204)
+
+
+# ---------- incomes ----------
+def income_doc(uid, body: IncomeCreate) -> dict:
+    dt, year, month = _when(body)
+    doc = Income.create_income_dict(uid, body.amount, body.is_recurring, dt, month, year)
+    doc["source"] = (body.source or "").strip()
+    doc["note"] = (body.note or "").strip()
+    return doc
+
+
+@router.get("/incomes", response_model=IncomePage)
+async def list_incomes(
+    uid: ObjectId = Depends(owner),
+    db=Depends(get_database),
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_LIMIT,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    start: Optional[datetime] = Query(None, description="date on or after"),
+    end: Optional[datetime] = Query(None, description="date before"),
+):
+    """Newest first; pass the returned next_cursor to get the following page."""
+    _check_month(year, month)
+    base_filter = {"user_id": uid}
+    # web app incomes only carry `date`, so year/month is a date range here
+    dates = _date_range(start, end, year, month)
+    if dates:
+        base_filter["date"] = dates
+    return await _page(db.incomes, base_filter, cursor, limit, income_json)
+
+
+@router.post("/incomes", response_model=IncomeResponse, status_code=201)
+async def create_income(body: IncomeCreate, uid: ObjectId = Depends(existing_owner), db=Depends(get_database)):
+    try:
+        doc = income_doc(uid, body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await db.incomes.insert_one(doc)
+    await _record_rollups(db, incomes=[doc])
+    return Income.to_response(doc)
+
+
+@router.post("/incomes/batch", response_model=List[IncomeResponse], status_code=201)
+async def create_incomes(body: List[IncomeCreate], uid: ObjectId = Depends(existing_owner),
+                         db=Depends(get_database)):
+    """Up to API_BATCH_MAX incomes in one insert_many and one rollup bulk_write."""
+    docs = _build(body, lambda row: income_doc(uid, row))
+    if docs:
+        await db.incomes.insert_many(docs)
+        await _record_rollups(db, incomes=docs)
+    return FastJSONResponse(income_json.many(docs), status_code=201)
+
+
+@router.post("/incomes/bulk", response_model=BulkResult)
+async def bulk_create_incomes(request: Request, uid: ObjectId = Depends(existing_owner),
+                              db=Depends(get_database)):
+    """
+    A JSON array of up to API_BULK_MAX_ROWS incomes (same fields as POST
+    /incomes). Invalid rows are reported by position and the rest are saved.
+    """
+    return await _bulk_create(request, db, db.incomes, INCOME_ROWS, lambda row: income_doc(uid, row), "incomes")
+
+
+@router.delete("/incomes/{income_id}", status_code=204)
+async def delete_income(income_id: str, uid: ObjectId = Depends(owner), db=Depends(get_database)):
+    deleted = await db.incomes.find_one_and_delete({"_id": _object_id(income_id, "Income"), "user_id": uid})
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Income not found")
+    await _record_rollups(db, incomes=[deleted], sign=-1)
+    return Response(status_code=204)
+
+
+# ---------- budget plans ----------
+@router.get("/budget-plans", response_model=List[BudgetPlanResponse])
+async def list_budget_plans(uid: ObjectId = Depends(owner), db=Depends(get_database), year: Optional[int] = None):
+    """Newest month first. One plan per month, so this isn't paginated."""
+    query = {"user_id": uid}
+    if year is not None:
+        query["year"] = year
+    cursor = db.budget_plans.find(query, budget_plan_json.projection).sort([("year", -1), ("month", -1)])
+    docs = await cursor.to_list(None)
+    return FastJSONResponse(budget_plan_json.many(docs))
+
+
+@router.post("/budget-plans", response_model=BudgetPlanResponse, status_code=201)
+async def create_budget_plan(body: BudgetPlanCreate, uid: ObjectId = Depends(existing_owner),
+                             db=Depends(get_database)):
+    """409 if the month already has a plan (the web app edits it in place)."""
+    if not 1 <= body.month <= 12:
+        raise HTTPException(status_code=422, detail="month must be 1-12")
+    doc = BudgetPlan.create_budget_plan_dict(uid, body.month, body.year)
+    if body.total_budget is not None or body.category_budgets:
+        doc.update(
+            is_filled=True,
+            total_budget=body.total_budget or 0.0,
+            category_budgets=body.category_budgets or {},
+        )
+    try:
+        await db.budget_plans.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=f"A plan for {body.year}-{body.month:02d} already exists")
+    return BudgetPlan.to_response(doc)
+
+
+@router.delete("/budget-plans/{plan_id}", status_code=204)
+async def delete_budget_plan(plan_id: str, uid: ObjectId = Depends(owner), db=Depends(get_database)):
+    result = await db.budget_plans.delete_one({"_id": _object_id(plan_id, "Budget plan"), "user_id": uid})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Budget plan not found")
+    return Response(status_code=204)
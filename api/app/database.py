@@ -1,6 +1,8 @@
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional
+from .indexes import INDEXES
+from .metrics import MongoCommandMetrics, metrics_enabled
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
@@ -13,37 +15,17 @@ async def get_database():
 async def create_indexes():
     db = await get_database()
     
-    # users indexes
-    await db.users.create_index("email", unique=True)
-    
-    # budget_plans indexes
-    await db.budget_plans.create_index("user_id")
-    await db.budget_plans.create_index([("user_id", 1), ("year", 1), ("month", 1)], unique=True)
-    
-    # expenses indexes
-    await db.expenses.create_index("user_id")
-    await db.expenses.create_index([("user_id", 1), ("year", 1), ("month", 1)])
-    await db.expenses.create_index("category")
-    await db.expenses.create_index("date")
-    
-    # incomes indexes
-    await db.incomes.create_index("user_id")
-    await db.incomes.create_index([("user_id", 1), ("year", 1), ("month", 1)])
-    await db.incomes.create_index("date")
-    
-    # spending_habits indexes
-    await db.spending_habits.create_index("user_id", unique=True)
-    
-    # price_history indexes
-    await db.price_history.create_index("item_name")
-    await db.price_history.create_index("date")
-    await db.price_history.create_index([("item_name", 1), ("date", -1)])
+    # one manifest for both services, see app/indexes.py
+    for collection, models in INDEXES.items():
+        await db[collection].create_indexes(models)
     
     print("database indexes created")
 
 async def connect_to_mongo():
     mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/budgetbaddie")
-    database.client = AsyncIOMotorClient(mongo_uri)
+    # per-route command counts / latency for /metrics (Motor runs pymongo underneath)
+    listeners = [MongoCommandMetrics()] if metrics_enabled() else []
+    database.client = AsyncIOMotorClient(mongo_uri, event_listeners=listeners)
     await create_indexes()
     print(f"connected to mongodb: {mongo_uri}")
 
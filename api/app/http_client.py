@@ -0,0 +1,61 @@
+import os
+from typing import Optional
+
+import httpx
+
+
+class HttpClients:
+    ai: Optional[httpx.AsyncClient] = None
+
+http_clients = HttpClients()
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401  (optional: pip install "httpx[http2]")
+    except ImportError:
+        return False
+    return True
+
+
+def create_ai_client():
+    """
+    One pooled client for every call to AI_SERVICE_URL: keep-alive connections,
+    bounded pool, explicit timeouts, HTTP/2 if AI_HTTP2=1 and h2 is installed.
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30")),
+    )
+    timeout = httpx.Timeout(
+        connect=float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "5")),
+        read=float(os.getenv("AI_HTTP_READ_TIMEOUT", "30")),
+        write=float(os.getenv("AI_HTTP_WRITE_TIMEOUT", "10")),
+        pool=float(os.getenv("AI_HTTP_POOL_TIMEOUT", "5")),
+    )
+    http2 = os.getenv("AI_HTTP2", "0") == "1"
+    if http2 and not http2_available():
+        print("AI_HTTP2=1 but the h2 package is missing, using HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+async def start_http_clients():
+    if http_clients.ai is None:
+        http_clients.ai = create_ai_client()
+        print("ai-service http client started")
+
+
+async def close_http_clients():
+    if http_clients.ai is not None:
+        await http_clients.ai.aclose()
+        http_clients.ai = None
+        print("ai-service http client closed")
+
+
+async def get_ai_client():
+    """FastAPI dependency; starts the client on first use if startup didn't run (e.g. tests)."""
+    if http_clients.ai is None:
+        await start_http_clients()
+    return http_clients.ai
@@ -0,0 +1,66 @@
+"""
+Index manifest shared by the Flask web app and the FastAPI service.
+
+Every query the routes issue should be covered by one of these; the web app's
+`flask --app app audit-queries` command explains each query shape and fails on
+a COLLSCAN. create_index is idempotent, so both services apply the manifest at
+startup.
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "password_reset_tokens": [
+        # reset links are looked up by the token's hash; one live token per user
+        IndexModel([("token_hash", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        # Mongo removes each token once its expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "api_tokens": [
+        # bearer tokens are looked up by their hash (api/app/auth.py)
+        IndexModel([("token_hash", ASCENDING)], unique=True),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "budget_plans": [
+        IndexModel([("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)], unique=True),
+    ],
+    "expenses": [
+        # month listing, newest first with _id as the keyset tie-break (pagination.py);
+        # prefix also serves user_id-only matches
+        IndexModel([
+            ("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING),
+            ("date", DESCENDING), ("_id", DESCENDING),
+        ]),
+        IndexModel([("user_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "incomes": [
+        # web app incomes only carry `date`, not year/month
+        IndexModel([("user_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)]),
+    ],
+    "monthly_rollups": [
+        IndexModel([("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)], unique=True),
+    ],
+    "spending_habits": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "outbox": [
+        # senders claim the oldest due pending message (services/outbox.py)
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        # delivered messages are kept for a week, then removed by Mongo
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "price_history": [
+        IndexModel([("item_name", ASCENDING), ("date", DESCENDING)]),
+        IndexModel([("date", ASCENDING)]),
+    ],
+}
+
+
+def ensure_indexes(db):
+    """Create every index in the manifest on a (sync) pymongo database."""
+    for collection, models in INDEXES.items():
+        db[collection].create_indexes(models)
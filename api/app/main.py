@@ -1,17 +1,55 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from app.database import connect_to_mongo, close_mongo_connection
-from .ai_routes import router as ai_router
+from app.http_client import start_http_clients, close_http_clients
+from app.metrics import CONTENT_TYPE, REGISTRY, clear_request, finish_request, metrics_enabled, start_request
+from . import ai_routes, auth, crud_routes
+
+
+async def label_route(request: Request):
+    """Charge this request's Mongo commands to its path template ("/ai/advice"), not the raw URL."""
+    ctx = getattr(request.state, "metrics", None)
+    route = request.scope.get("route")
+    if ctx is not None and route is not None:
+        ctx.route = route.path
+
+
+app = FastAPI(title="Budget Baddie API", dependencies=[Depends(label_route)])
+app.include_router(ai_routes.router)
+app.include_router(auth.router)
+app.include_router(crud_routes.router)
+
+REGISTRY.add_collector("ai_service_guard", "ai-service admission limiter and breaker", lambda: ai_routes.ai_guard.stats())
+
+
+if metrics_enabled():
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        # the route is only known once the router has matched; label_route fills it in
+        ctx = start_request("unmatched")
+        request.state.metrics = ctx
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            finish_request(ctx, request.method, status, time.perf_counter() - started)
+            clear_request()
 
-app = FastAPI(title="Budget Baddie API")
-app.include_router(ai_router)
 
 @app.on_event("startup")
 async def startup_event():
+    await start_http_clients()
     await connect_to_mongo()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await close_http_clients()
     await close_mongo_connection()
 
 
@@ -20,4 +58,7 @@ def health_check():
     return {"status": "ok", "service": "api"}
 
 
-
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (see app/metrics.py)."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,354 @@
+"""
+Per-route request metrics in the Prometheus text format, shared by the Flask
+web app and this FastAPI service.
+
+- `MongoCommandMetrics` is a pymongo CommandListener (it works for Motor
+  too, which runs pymongo underneath). It charges every command's count,
+  duration and returned documents to the route that issued it. The route
+  lives in a contextvar that the web frameworks set per request; commands
+  from background threads are charged to "background".
+- `MongoPoolMetrics` is a pymongo ConnectionPoolListener that keeps the
+  state of the client's connection pool (open, in use, waiting) for
+  readiness checks.
+- `start_request` / `finish_request` record per-route latency and how many
+  Mongo commands each request issued.
+- `UPSTREAM_SECONDS` times calls to Gemini, the ai-service and SMTP.
+- `REGISTRY.add_collector` exposes existing stats() dicts (advice cache,
+  job pool, breaker, outbox) as gauges at scrape time.
+
+Everything is process-local: with several workers, scrape each one.
+Recording is a dict update under a lock, cheap enough to leave on (see
+METRICS_ENABLED).
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels):
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = (("le", _number(bound) if bound != float("inf") else "+Inf"),)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, prefix, help, fn):
+        """
+        Expose `fn()` (a stats() dict, possibly nested) as gauges named
+        `<prefix>_<key>`. Strings become a label: state="open" -> `<prefix>_state{value="open"} 1`.
+        """
+        self._collectors = [c for c in self._collectors if c[0] != prefix]
+        self._collectors.append((prefix, help, fn))
+
+    def _collected(self):
+        for prefix, help, fn in self._collectors:
+            try:
+                stats = fn()
+            except Exception as e:  # a broken collector must not take /metrics down
+                yield f"# {prefix}: collector failed: {_escape(e)}"
+                continue
+            for key, value in _flatten(stats):
+                name = f"{prefix}_{key}"
+                yield f"# HELP {name} {help}"
+                yield f"# TYPE {name} gauge"
+                if isinstance(value, str):
+                    yield f'{name}{{value="{_escape(value)}"}} 1'
+                else:
+                    yield f"{name} {_number(value)}"
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        lines.extend(self._collected())
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats, prefix=""):
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float, str)):
+            yield name, value
+        # None (e.g. no samples yet) is left out
+
+
+REGISTRY = Registry()
+
+MONGO_COMMANDS = REGISTRY.counter(
+    "mongo_commands_total", "MongoDB commands sent, by route and command", ("route", "command"))
+MONGO_FAILURES = REGISTRY.counter(
+    "mongo_command_failures_total", "MongoDB commands that failed", ("route", "command"))
+MONGO_DOCUMENTS = REGISTRY.counter(
+    "mongo_documents_returned_total", "Documents returned by MongoDB", ("route", "command"))
+MONGO_SECONDS = REGISTRY.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("route", "command"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency until the response is returned",
+    ("route", "method", "status"))
+HTTP_MONGO_COMMANDS = REGISTRY.histogram(
+    "http_request_mongo_commands", "MongoDB commands issued per request", ("route",), COUNT_BUCKETS)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "upstream_call_duration_seconds", "Calls to Gemini, the ai-service and SMTP",
+    ("service", "outcome"))
+
+BACKGROUND = "background"
+
+
+def metrics_enabled():
+    return os.getenv("METRICS_ENABLED", "1") == "1"
+
+
+class RequestMetrics:
+    __slots__ = ("route", "mongo_commands")
+
+    def __init__(self, route):
+        self.route = route
+        self.mongo_commands = 0
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def start_request(route):
+    """Call at the start of a request; Mongo commands from here on are charged to `route`."""
+    ctx = RequestMetrics(route)
+    _current.set(ctx)
+    return ctx
+
+
+def finish_request(ctx, method, status, seconds):
+    HTTP_SECONDS.observe(seconds, ctx.route, method, str(status))
+    HTTP_MONGO_COMMANDS.observe(ctx.mongo_commands, ctx.route)
+
+
+def clear_request():
+    _current.set(None)
+
+
+def current_route():
+    ctx = _current.get()
+    return ctx.route if ctx else BACKGROUND
+
+
+def _returned(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] else 0
+    return 0
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Pass in MongoClient(event_listeners=[...]) / AsyncIOMotorClient(event_listeners=[...])."""
+
+    def started(self, event):
+        ctx = _current.get()
+        if ctx is not None:
+            ctx.mongo_commands += 1
+
+    def succeeded(self, event):
+        route = current_route()
+        command = event.command_name
+        MONGO_COMMANDS.inc(route, command)
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, route, command)
+        returned = _returned(event.reply) if isinstance(event.reply, dict) else 0
+        if returned:
+            MONGO_DOCUMENTS.inc(route, command, amount=returned)
+
+    def failed(self, event):
+        route = current_route()
+        command = event.command_name
+        MONGO_COMMANDS.inc(route, command)
+        MONGO_FAILURES.inc(route, command)
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, route, command)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool state, summed over every server the client talks to:
+    open / in_use / waiting connections right now, plus totals since the
+    client was built. `wait_seconds` is time spent waiting for a connection;
+    when it grows, threads outnumber maxPoolSize.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # also called in a forked child, where the parent's lock may be held
+        self._lock = threading.Lock()
+        self._open = self._in_use = self._waiting = 0
+        self._totals = dict.fromkeys(("created", "closed", "checked_out", "checkout_failed", "cleared"), 0)
+        self._wait_seconds = 0.0
+
+    def _add(self, **changes):
+        with self._lock:
+            for name, amount in changes.items():
+                if name in self._totals:
+                    self._totals[name] += amount
+                else:
+                    setattr(self, "_" + name, getattr(self, "_" + name) + amount)
+
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+
+    def connection_closed(self, event):
+        self._add(open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, in_use=1, checked_out=1, wait_seconds=getattr(event, "duration", None) or 0.0)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, checkout_failed=1, wait_seconds=getattr(event, "duration", None) or 0.0)
+
+    def connection_checked_in(self, event):
+        self._add(in_use=-1)
+
+    def pool_cleared(self, event):
+        self._add(cleared=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": self._open - self._in_use,
+                "waiting": self._waiting,
+                **self._totals,
+                "wait_seconds": round(self._wait_seconds, 6),
+            }
+
+
+class timed_call:
+    """with timed_call("gemini"): ... -> upstream_call_duration_seconds{service, outcome}"""
+
+    __slots__ = ("service", "_start")
+
+    def __init__(self, service):
+        self.service = service
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "error" if exc_type else "ok"
+        UPSTREAM_SECONDS.observe(time.perf_counter() - self._start, self.service, outcome)
+        return False
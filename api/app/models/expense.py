@@ -34,7 +34,7 @@ class Expense:
     def to_response(expense_dict: dict) -> dict:
         expense_dict["id"] = str(expense_dict["_id"])
         expense_dict["user_id"] = str(expense_dict["user_id"])
-        if "budget_plan_id" in expense_dict:
+        if expense_dict.get("budget_plan_id") is not None:
             expense_dict["budget_plan_id"] = str(expense_dict["budget_plan_id"])
         del expense_dict["_id"]
         return expense_dict
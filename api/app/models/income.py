@@ -32,7 +32,7 @@ class Income:
     def to_response(income_dict: dict) -> dict:
         income_dict["id"] = str(income_dict["_id"])
         income_dict["user_id"] = str(income_dict["user_id"])
-        if "budget_plan_id" in income_dict:
+        if income_dict.get("budget_plan_id") is not None:
             income_dict["budget_plan_id"] = str(income_dict["budget_plan_id"])
         del income_dict["_id"]
         return income_dict
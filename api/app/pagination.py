@@ -0,0 +1,68 @@
+"""
+Keyset pagination over (date, _id), newest first, shared by the Flask web
+app (services/pagination.py) and this API's listings.
+
+The cursor is the (date, _id) of the last row on the previous page, so each
+page is an index range scan no matter how deep the user scrolls (no skip()).
+Rows without a date sort last, ordered by _id.
+"""
+import base64
+from datetime import datetime
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import DESCENDING
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+SORT = [("date", DESCENDING), ("_id", DESCENDING)]
+
+
+def encode_cursor(doc):
+    dt = doc.get("date")
+    stamp = dt.isoformat() if isinstance(dt, datetime) else ""
+    raw = f"{stamp}|{doc['_id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return (date or None, ObjectId); raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        stamp, _, oid = raw.partition("|")
+        return (datetime.fromisoformat(stamp) if stamp else None), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def keyset_filter(base_filter, cursor):
+    """Narrow `base_filter` to rows that sort after `cursor`."""
+    if not cursor:
+        return base_filter
+    dt, oid = decode_cursor(cursor)
+    if dt is None:
+        after = {"date": None, "_id": {"$lt": oid}}
+    else:
+        after = {"$or": [
+            {"date": {"$lt": dt}},
+            {"date": dt, "_id": {"$lt": oid}},
+            {"date": None},
+        ]}
+    return {"$and": [base_filter, after]}
+
+
+def clamp_page_size(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def split_page(docs, limit):
+    """`docs` was fetched with limit + 1; return (page, next_cursor or None)."""
+    if len(docs) > limit:
+        page = docs[:limit]
+        return page, encode_cursor(page[-1])
+    return docs, None
@@ -0,0 +1,330 @@
+"""
+Admission control and a circuit breaker for upstream AI calls.
+
+Shared by the Flask web app (threads, `UpstreamGuard`) and this FastAPI
+service (asyncio, `AsyncUpstreamGuard`):
+
+- at most `max_in_flight` calls run at once; up to `max_waiting` more wait
+  (for at most `wait_timeout` seconds) and anything beyond that is refused
+  straight away with `Overloaded`, which the routes turn into 503 +
+  Retry-After;
+- after `failure_threshold` consecutive failures (errors or timeouts) the
+  breaker opens and every call is refused for `reset_timeout` seconds; then
+  one half-open probe is let through, and its outcome closes or re-opens it.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class Overloaded(Exception):
+    """The upstream is saturated or the breaker is open; retry after `retry_after` seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probing = False
+
+    def before_call(self):
+        """Raise Overloaded unless a call may go upstream now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                remaining = self.opened_at + self.reset_timeout - self._clock()
+                if remaining > 0:
+                    self.short_circuited += 1
+                    raise Overloaded("circuit open", remaining)
+                self.state = HALF_OPEN
+            # half-open: exactly one probe at a time
+            if self._probing:
+                self.short_circuited += 1
+                raise Overloaded("circuit half-open", self.reset_timeout)
+            self._probing = True
+
+    def cancel_probe(self):
+        """The admitted call never went upstream (e.g. no free slot); free the probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = self._clock()
+            self._probing = False
+
+    def retry_after(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class _LimiterStats:
+    def _base_stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionLimiter(_LimiterStats):
+    """Thread-based limiter for the Flask app."""
+
+    def __init__(self, max_in_flight=8, max_waiting=16, wait_timeout=5.0, retry_after=2.0):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Overloaded("too many requests in flight", self.retry_after)
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self.in_flight < self.max_in_flight, self.wait_timeout
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    raise Overloaded("timed out waiting for a slot", self.retry_after)
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return self._base_stats()
+
+
+class AsyncAdmissionLimiter(_LimiterStats):
+    """asyncio limiter for the FastAPI service (one event loop)."""
+
+    def __init__(self, max_in_flight=8, max_waiting=16, wait_timeout=5.0, retry_after=2.0):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = None
+
+    def _condition(self):
+        # created lazily so it binds to the running loop, not the import-time one
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise Overloaded("too many requests in flight", self.retry_after)
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda: self.in_flight < self.max_in_flight), self.wait_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise Overloaded("timed out waiting for a slot", self.retry_after)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify()
+
+    def stats(self):
+        return self._base_stats()
+
+
+class Ticket:
+    """One admitted upstream call. Report its outcome, then release it (both idempotent)."""
+
+    def __init__(self, breaker, release):
+        self._breaker = breaker
+        self._release = release
+        self._reported = False
+        self._released = False
+
+    def success(self):
+        if not self._reported:
+            self._reported = True
+            self._breaker.record_success()
+
+    def failure(self):
+        if not self._reported:
+            self._reported = True
+            self._breaker.record_failure()
+
+    def _finish(self):
+        self._released = True
+        if not self._reported:
+            # outcome unknown (e.g. the client went away mid-stream): don't
+            # leave a half-open breaker waiting on this probe forever
+            self._breaker.cancel_probe()
+
+    def release(self):
+        if not self._released:
+            self._finish()
+            self._release()
+
+
+class AsyncTicket(Ticket):
+    async def release(self):
+        if not self._released:
+            self._finish()
+            await self._release()
+
+
+def _settings_from_env():
+    limiter = {
+        "max_in_flight": int(os.getenv("AI_MAX_IN_FLIGHT", "8")),
+        "max_waiting": int(os.getenv("AI_MAX_WAITING", "16")),
+        "wait_timeout": float(os.getenv("AI_ADMISSION_WAIT", "5")),
+        "retry_after": float(os.getenv("AI_RETRY_AFTER", "2")),
+    }
+    breaker = {
+        "failure_threshold": int(os.getenv("AI_BREAKER_FAILURES", "5")),
+        "reset_timeout": float(os.getenv("AI_BREAKER_RESET", "30")),
+    }
+    return limiter, breaker
+
+
+class UpstreamGuard:
+    """Limiter + breaker for synchronous callers."""
+
+    def __init__(self, limiter=None, breaker=None):
+        self.limiter = limiter or AdmissionLimiter()
+        self.breaker = breaker or CircuitBreaker()
+
+    @classmethod
+    def from_env(cls):
+        limiter, breaker = _settings_from_env()
+        return cls(AdmissionLimiter(**limiter), CircuitBreaker(**breaker))
+
+    def acquire(self):
+        """Return a Ticket, or raise Overloaded."""
+        self.breaker.before_call()
+        try:
+            self.limiter.acquire()
+        except Overloaded:
+            self.breaker.cancel_probe()
+            raise
+        return Ticket(self.breaker, self.limiter.release)
+
+    def call(self, fn, *args, **kwargs):
+        ticket = self.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            ticket.failure()
+            raise
+        else:
+            ticket.success()
+            return result
+        finally:
+            ticket.release()
+
+    def stats(self):
+        return {**self.limiter.stats(), **self.breaker.stats()}
+
+
+class AsyncUpstreamGuard(UpstreamGuard):
+    """Limiter + breaker for coroutines."""
+
+    def __init__(self, limiter=None, breaker=None):
+        super().__init__(limiter or AsyncAdmissionLimiter(), breaker)
+
+    @classmethod
+    def from_env(cls):
+        limiter, breaker = _settings_from_env()
+        return cls(AsyncAdmissionLimiter(**limiter), CircuitBreaker(**breaker))
+
+    async def acquire(self):
+        self.breaker.before_call()
+        try:
+            await self.limiter.acquire()
+        except Overloaded:
+            self.breaker.cancel_probe()
+            raise
+        return AsyncTicket(self.breaker, self.limiter.release)
+
+    async def call(self, fn, *args, **kwargs):
+        ticket = await self.acquire()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception:
+            ticket.failure()
+            raise
+        else:
+            ticket.success()
+            return result
+        finally:
+            await ticket.release()
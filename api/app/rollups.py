@@ -0,0 +1,84 @@
+"""
+Month rollup updates shared by the Flask web app and this API.
+
+Every write to expenses or incomes has to `$inc` the user's document for that
+month in monthly_rollups, or the dashboard (which reads rollups) goes stale.
+`rollup_updates` turns inserted or deleted documents into one upsert per
+(user, month) touched; run them with bulk_write(..., ordered=False). The
+reads, the rebuild and the consistency check are in services/rollups.py.
+"""
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+COLLECTION = "monthly_rollups"
+
+# Mongo field names can't contain "." or start with "$"; swap them for their
+# full-width look-alikes when a category is used as a key.
+_KEY_ESCAPES = (("$", "＄"), (".", "．"))
+
+
+def category_key(name):
+    name = name or "Other"
+    for raw, escaped in _KEY_ESCAPES:
+        name = name.replace(raw, escaped)
+    return name
+
+
+def category_name(key):
+    for raw, escaped in reversed(_KEY_ESCAPES):
+        key = key.replace(escaped, raw)
+    return key
+
+
+def income_month(income):
+    dt = income.get("date")
+    if isinstance(dt, datetime):
+        return dt.year, dt.month
+    return None
+
+
+def expense_month(expense):
+    dt = expense.get("date")
+    if isinstance(dt, datetime):
+        return dt.year, dt.month
+    if expense.get("year") and expense.get("month"):
+        return expense["year"], expense["month"]
+    return None
+
+
+def _deltas(expenses=(), incomes=(), sign=1):
+    """{(user_id, year, month): {field: amount}} for inserted (sign=1) or removed (sign=-1) documents."""
+    deltas = {}
+
+    def add(doc, ym, fields):
+        month = deltas.setdefault((doc["user_id"], ym[0], ym[1]), {})
+        for field, amount in fields.items():
+            month[field] = month.get(field, 0.0) + amount * sign
+
+    for income in incomes:
+        ym = income_month(income)
+        if ym:
+            add(income, ym, {"income_total": float(income.get("amount") or 0)})
+    for expense in expenses:
+        ym = expense_month(expense)
+        if ym:
+            amount = float(expense.get("amount") or 0)
+            add(expense, ym, {
+                "expense_total": amount,
+                f"category_spent.{category_key(expense.get('category'))}": amount,
+            })
+    return deltas
+
+
+def rollup_updates(expenses=(), incomes=(), sign=1):
+    """One UpdateOne upsert per (user, month) the documents fall in."""
+    now = datetime.utcnow()
+    return [
+        UpdateOne(
+            {"user_id": user_id, "year": year, "month": month},
+            {"$inc": fields, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for (user_id, year, month), fields in _deltas(expenses, incomes, sign).items()
+    ]
@@ -1,19 +1,25 @@
-from .user import UserCreate, UserLogin, UserResponse
+from .user import TokenResponse, UserCreate, UserLogin, UserResponse
+from .bulk import BulkResult, BulkRowError
 from .budget_plan import BudgetPlanCreate, BudgetPlanResponse
-from .expense import ExpenseCreate, ExpenseResponse
-from .income import IncomeCreate, IncomeResponse
+from .expense import ExpenseCreate, ExpensePage, ExpenseResponse
+from .income import IncomeCreate, IncomePage, IncomeResponse
 from .spending_habit import SpendingHabitResponse
 from .price_history import PriceHistoryCreate, PriceHistoryResponse
 
 __all__ = [
+    "TokenResponse",
     "UserCreate",
     "UserLogin",
     "UserResponse",
+    "BulkResult",
+    "BulkRowError",
     "BudgetPlanCreate",
     "BudgetPlanResponse",
     "ExpenseCreate",
+    "ExpensePage",
     "ExpenseResponse",
     "IncomeCreate",
+    "IncomePage",
     "IncomeResponse",
     "SpendingHabitResponse",
     "PriceHistoryCreate",
@@ -1,10 +1,12 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 class BudgetPlanCreate(BaseModel):
     month: int
     year: int
+    total_budget: Optional[float] = None
+    category_budgets: Optional[Dict[str, float]] = None
 
 class BudgetPlanResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -14,6 +16,9 @@ class BudgetPlanResponse(BaseModel):
     month: int
     year: int
     is_filled: bool
+    is_locked: bool = False
+    total_budget: Optional[float] = None
+    category_budgets: Optional[Dict[str, float]] = None
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkResult(BaseModel):
+    rows: int
+    inserted: int
+    error_count: int
+    # the first API_BULK_MAX_ERRORS of them, by row
+    errors: List[BulkRowError]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ExpenseCreate(BaseModel):
@@ -9,6 +9,7 @@ class ExpenseCreate(BaseModel):
     date: Optional[datetime] = None
     month: Optional[int] = None
     year: Optional[int] = None
+    note: Optional[str] = None
 
 class ExpenseResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -18,9 +19,14 @@ class ExpenseResponse(BaseModel):
     budget_plan_id: Optional[str] = None
     category: str
     amount: float
-    is_recurring: bool
-    date: datetime
-    month: int
-    year: int
+    is_recurring: bool = False
+    # expenses saved before dates were required only carry month/year
+    date: Optional[datetime] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
+    note: Optional[str] = None
     created_at: datetime
 
+class ExpensePage(BaseModel):
+    items: List[ExpenseResponse]
+    next_cursor: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class IncomeCreate(BaseModel):
@@ -8,6 +8,8 @@ class IncomeCreate(BaseModel):
     date: Optional[datetime] = None
     month: Optional[int] = None
     year: Optional[int] = None
+    source: Optional[str] = None
+    note: Optional[str] = None
 
 class IncomeResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -16,9 +18,15 @@ class IncomeResponse(BaseModel):
     user_id: str
     budget_plan_id: Optional[str] = None
     amount: float
-    is_recurring: bool
-    date: datetime
-    month: int
-    year: int
+    is_recurring: bool = False
+    # incomes added in the web app only carry `date`
+    date: Optional[datetime] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
+    source: Optional[str] = None
+    note: Optional[str] = None
     created_at: datetime
 
+class IncomePage(BaseModel):
+    items: List[IncomeResponse]
+    next_cursor: Optional[str] = None
@@ -17,3 +17,8 @@ class UserResponse(BaseModel):
     email: str
     created_at: datetime
 
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: datetime
+    user_id: str
@@ -0,0 +1,283 @@
+"""
+Deterministic synthetic data for performance work: N users x M months of
+expenses, incomes and budget plans.
+
+The same seed, sizes and end month always produce the same documents
+(ids included), so runs can be compared. Amounts are log-normal around
+per-category medians, with a fixed monthly rent and one or two paychecks.
+Documents come in every shape the apps have written over time:
+
+- "api":    the layout of app/models (date + month + year, is_recurring)
+- "web":    what the Flask forms insert (incomes have only `date`, no year/month)
+- "legacy": expenses with month/year but no `date` (`legacy_ratio` of them)
+
+Documents are generated lazily per user and written with insert_many in
+`batch_size` batches, so memory stays flat however many users you ask for.
+
+    python api/scripts/synthetic_data.py --users 1000 --months 24 --seed 42 [--replace]
+
+Uses MONGO_URI and writes into `--db` (default `budgetbaddie`, the database
+the web app reads). Every synthetic user has an email at `--domain` and the
+password `--password`; `--replace` first removes data from an earlier run.
+"""
+import argparse
+import calendar
+import math
+import os
+import random
+import re
+import struct
+import sys
+from datetime import date, datetime
+
+from bson import ObjectId
+
+CATEGORIES = [
+    # name, entries per month, median amount, spread (log-normal sigma)
+    ("Groceries", 8, 45.0, 0.5),
+    ("Transport", 10, 12.0, 0.6),
+    ("Dining", 5, 25.0, 0.6),
+    ("Entertainment", 3, 30.0, 0.8),
+    ("Shopping", 2, 60.0, 1.0),
+    ("Utilities", 1, 120.0, 0.3),
+    ("Health", 0.5, 40.0, 0.9),
+]
+RENT_SHARE = (0.25, 0.4)  # rent as a share of monthly income
+INCOME_SOURCES = ("Salary", "Freelance", "Refund")
+NOTES = ("", "", "", "weekly shop", "with friends", "card", "cash")
+SHAPES = ("api", "web", "legacy")
+COLLECTIONS = ("users", "budget_plans", "expenses", "incomes")
+# written for these users by the apps during a run (load_test.py), keyed by user_id
+DERIVED = ("monthly_rollups", "password_reset_tokens", "api_tokens")
+
+DEFAULT_DOMAIN = "synthetic.budgetbaddie.test"
+DEFAULT_PASSWORD = "synthetic-password"
+# fixed salt so the same password always hashes to the same string
+_SALT = b"budgetbaddiesynthetic."
+
+
+def password_hash(password=DEFAULT_PASSWORD, rounds=10):
+    import bcrypt
+    return bcrypt.hashpw(password.encode("utf-8"), b"$2b$%02d$" % rounds + _SALT).decode("ascii")
+
+
+def month_range(end, months):
+    """The `months` (year, month) pairs ending with `end`, oldest first."""
+    year, month = end
+    out = []
+    for _ in range(months):
+        out.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return out[::-1]
+
+
+def _poisson(rng, lam):
+    # Knuth; fine for the small rates used here
+    limit, k, p = math.exp(-lam), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def _amount(rng, median, sigma):
+    return round(rng.lognormvariate(math.log(median), sigma), 2)
+
+
+def _moment(rng, year, month):
+    day = rng.randint(1, calendar.monthrange(year, month)[1])
+    return datetime(year, month, day, rng.randint(7, 22), rng.randint(0, 59))
+
+
+def _object_id(rng, when):
+    # timestamp prefix like a real ObjectId, the rest from the seeded rng
+    seconds = int((when - datetime(1970, 1, 1)).total_seconds())
+    return ObjectId(struct.pack(">I", seconds) + rng.getrandbits(64).to_bytes(8, "big"))
+
+
+class SyntheticData:
+    def __init__(self, users=100, months=12, seed=0, end=None, legacy_ratio=0.1,
+                 domain=DEFAULT_DOMAIN, password=None):
+        self.users = users
+        self.months = month_range(end or (date.today().year, date.today().month), months)
+        self.seed = seed
+        self.legacy_ratio = legacy_ratio
+        self.domain = domain
+        self.password = password or password_hash()
+
+    def email(self, index):
+        return f"user{index}@{self.domain}"
+
+    def documents(self):
+        """Yield (collection, document) pairs, one user at a time."""
+        for index in range(self.users):
+            yield from self.user_documents(index)
+
+    def user_documents(self, index):
+        rng = random.Random(f"{self.seed}:{index}")
+        first_year, first_month = self.months[0]
+        joined = datetime(first_year, first_month, 1)
+        user_id = _object_id(rng, joined)
+        yield "users", {
+            "_id": user_id,
+            "email": self.email(index),
+            "password": self.password,
+            "created_at": joined,
+            "verification_code": None,
+        }
+
+        salary = _amount(rng, 3200.0, 0.35)
+        paychecks = rng.choice((1, 2))
+        rent = round(salary * rng.uniform(*RENT_SHARE), 2)
+        # each user leans towards some categories more than others
+        appetite = {name: rng.uniform(0.5, 1.5) for name, *_ in CATEGORIES}
+
+        for year, month in self.months:
+            first_day = datetime(year, month, 1)
+            plan_id = _object_id(rng, first_day)
+            category_budgets = {"Rent": rent}
+            for name, per_month, median, _ in CATEGORIES:
+                category_budgets[name] = round(per_month * median * appetite[name] * rng.uniform(0.9, 1.2), 2)
+            yield "budget_plans", {
+                "_id": plan_id,
+                "user_id": user_id,
+                "month": month,
+                "year": year,
+                "is_filled": True,
+                "is_locked": rng.random() < 0.5,
+                "total_budget": round(sum(category_budgets.values()), 2),
+                "category_budgets": category_budgets,
+                "created_at": first_day,
+                "updated_at": first_day,
+            }
+
+            for n in range(paychecks):
+                when = datetime(year, month, 1 if n == 0 else 15, 9)
+                yield "incomes", self._income(rng, user_id, plan_id, when, round(salary / paychecks, 2),
+                                              "Salary", recurring=True)
+            for _ in range(_poisson(rng, 0.3)):
+                when = _moment(rng, year, month)
+                yield "incomes", self._income(rng, user_id, plan_id, when, _amount(rng, 250.0, 0.8),
+                                              rng.choice(INCOME_SOURCES[1:]), recurring=False)
+
+            yield "expenses", self._expense(rng, user_id, plan_id, datetime(year, month, 1, 8), "Rent", rent, True)
+            for name, per_month, median, sigma in CATEGORIES:
+                for _ in range(_poisson(rng, per_month * appetite[name])):
+                    when = _moment(rng, year, month)
+                    yield "expenses", self._expense(rng, user_id, plan_id, when, name,
+                                                    _amount(rng, median, sigma), per_month <= 1)
+
+    def _expense(self, rng, user_id, plan_id, when, category, amount, recurring):
+        roll = rng.random()
+        shape = "legacy" if roll < self.legacy_ratio else ("api" if roll < 0.5 else "web")
+        doc = {
+            "_id": _object_id(rng, when),
+            "user_id": user_id,
+            "category": category,
+            "amount": amount,
+            "date": when,
+            "month": when.month,
+            "year": when.year,
+            "created_at": when,
+        }
+        if shape == "api":
+            doc["is_recurring"] = recurring
+            doc["budget_plan_id"] = plan_id
+        else:
+            doc["budget_plan_id"] = None
+            doc["note"] = rng.choice(NOTES)
+        if shape == "legacy":
+            del doc["date"]
+        return doc
+
+    def _income(self, rng, user_id, plan_id, when, amount, source, recurring):
+        doc = {
+            "_id": _object_id(rng, when),
+            "user_id": user_id,
+            "amount": amount,
+            "date": when,
+            "created_at": when,
+        }
+        if rng.random() < 0.5:
+            doc.update({"is_recurring": recurring, "month": when.month, "year": when.year,
+                        "budget_plan_id": plan_id})
+        else:
+            doc.update({"source": source, "note": rng.choice(NOTES)})
+        return doc
+
+
+def write(db, data, batch_size=1000):
+    """insert_many the generated documents in batches; returns {collection: count}."""
+    buffers = {name: [] for name in COLLECTIONS}
+    counts = dict.fromkeys(COLLECTIONS, 0)
+
+    def flush(name):
+        if buffers[name]:
+            db[name].insert_many(buffers[name], ordered=False)
+            counts[name] += len(buffers[name])
+            buffers[name] = []
+
+    for name, doc in data.documents():
+        buffers[name].append(doc)
+        if len(buffers[name]) >= batch_size:
+            flush(name)
+    for name in COLLECTIONS:
+        flush(name)
+    return counts
+
+
+def at_domain(domain=DEFAULT_DOMAIN):
+    """Filter for the users whose email is at `domain`."""
+    return {"email": {"$regex": f"@{re.escape(domain)}$"}}
+
+
+def remove(db, domain=DEFAULT_DOMAIN, batch_size=1000):
+    """
+    Delete the users at `domain` and everything they own, including what the
+    apps wrote for them (rollups, tokens, outbox emails), so a rerun with the
+    same seed (and so the same ids) starts clean. Returns how many users.
+    """
+    removed = 0
+    while True:
+        users = list(db.users.find(at_domain(domain), {"email": 1}).limit(batch_size))
+        if not users:
+            return removed
+        ids = [u["_id"] for u in users]
+        for name in COLLECTIONS[1:] + DERIVED:
+            db[name].delete_many({"user_id": {"$in": ids}})
+        db.outbox.delete_many({"to": {"$in": [u["email"] for u in users]}})
+        db.users.delete_many({"_id": {"$in": ids}})
+        removed += len(ids)
+
+
+def main():
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", help="last month as YYYY-MM (default: this month)")
+    parser.add_argument("--legacy-ratio", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--db", default="budgetbaddie")
+    parser.add_argument("--domain", default=DEFAULT_DOMAIN)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--replace", action="store_true", help="remove earlier synthetic users first")
+    args = parser.parse_args()
+
+    end = tuple(int(part) for part in args.end.split("-")) if args.end else None
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client[args.db]
+    if args.replace:
+        print(f"removed {remove(db, args.domain)} synthetic users")
+    data = SyntheticData(args.users, args.months, args.seed, end, args.legacy_ratio, args.domain,
+                         password_hash(args.password, args.bcrypt_rounds))
+    counts = write(db, data, args.batch_size)
+    print(", ".join(f"{n} {name}" for name, n in counts.items()))
+    client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import bcrypt
+import httpx
+import pytest
+import pytest_asyncio
+from werkzeug.security import generate_password_hash
+
+from app.auth import COLLECTION, issue_token, verify_password
+from app.database import get_database
+from app.main import app
+from app.models.user import User
+
+
+@pytest_asyncio.fixture
+async def api(test_db):
+    app.dependency_overrides[get_database] = lambda: test_db
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.pop(get_database, None)
+
+
+def test_verify_password_reads_the_web_apps_hashes():
+    """Test both bcrypt and werkzeug hashes (services/passwords.py schemes) verify"""
+    hashed = bcrypt.hashpw(b"hunter22", bcrypt.gensalt(rounds=4)).decode("ascii")
+
+    assert verify_password(hashed, "hunter22")
+    assert not verify_password(hashed, "hunter23")
+    assert verify_password(generate_password_hash("hunter22", method="pbkdf2:sha256:1000"), "hunter22")
+    assert not verify_password("$2b$12$malformed", "hunter22")
+    assert not verify_password(None, "hunter22")
+
+
+@pytest.mark.asyncio
+async def test_login_issues_a_token_for_the_users_records(api, test_db):
+    """Test a token from /auth/token opens that user's records and stops working once revoked"""
+    hashed = bcrypt.hashpw(b"hunter22", bcrypt.gensalt(rounds=4)).decode("ascii")
+    uid = (await test_db.users.insert_one(User.create_user_dict("me@example.com", hashed))).inserted_id
+
+    wrong = await api.post("/auth/token", json={"email": "me@example.com", "password": "nope"})
+    unknown = await api.post("/auth/token", json={"email": "nobody@example.com", "password": "hunter22"})
+    resp = await api.post("/auth/token", json={"email": "Me@Example.com", "password": "hunter22"})
+
+    assert wrong.status_code == unknown.status_code == 401
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["user_id"] == str(uid) and body["token_type"] == "bearer"
+    stored = await test_db[COLLECTION].find_one({})
+    assert body["access_token"] not in str(stored)
+    headers = {"Authorization": f"Bearer {body['access_token']}"}
+    assert (await api.get(f"/users/{uid}/budget-plans", headers=headers)).status_code == 200
+    assert (await api.delete("/auth/token", headers=headers)).status_code == 204
+    assert (await api.get(f"/users/{uid}/budget-plans", headers=headers)).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_refused(api, test_db):
+    """Test a token past its expires_at is a 401 even before Mongo's TTL monitor removes it"""
+    uid = (await test_db.users.insert_one(User.create_user_dict("old@example.com", "x"))).inserted_id
+    token, _ = await issue_token(test_db, uid, ttl=60, now=datetime.utcnow() - timedelta(minutes=5))
+
+    resp = await api.get(f"/users/{uid}/expenses", headers={"Authorization": f"Bearer {token}"})
+
+    assert resp.status_code == 401
@@ -0,0 +1,192 @@
+from datetime import datetime
+
+import httpx
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+
+from app.auth import issue_token
+from app.database import get_database
+from app.indexes import INDEXES
+from app.main import app
+from app.models.user import User
+
+
+@pytest_asyncio.fixture
+async def user_id(test_db):
+    result = await test_db.users.insert_one(User.create_user_dict("api@example.com", "$2b$12$test"))
+    return str(result.inserted_id)
+
+
+@pytest_asyncio.fixture
+async def api(test_db, user_id):
+    """An async client for the app, signed in as user_id, with its database pointed at test_db"""
+    app.dependency_overrides[get_database] = lambda: test_db
+    token, _ = await issue_token(test_db, ObjectId(user_id))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        yield client
+    app.dependency_overrides.pop(get_database, None)
+
+
+@pytest.mark.asyncio
+async def test_create_expense_updates_rollup(api, test_db, user_id):
+    """Test a created expense is stored like the web app's and counted in its month's rollup"""
+    resp = await api.post(f"/users/{user_id}/expenses", json={
+        "category": "Groceries", "amount": 42.5, "date": "2025-03-14T00:00:00Z", "note": " weekly shop ",
+    })
+
+    assert resp.status_code == 201
+    body = resp.json()
+    assert body["user_id"] == user_id
+    assert (body["year"], body["month"], body["note"]) == (2025, 3, "weekly shop")
+    stored = await test_db.expenses.find_one({})
+    assert stored["date"] == datetime(2025, 3, 14)
+    rollup = await test_db.monthly_rollups.find_one({"year": 2025, "month": 3})
+    assert rollup["expense_total"] == 42.5
+    assert rollup["category_spent"]["Groceries"] == 42.5
+
+
+@pytest.mark.asyncio
+async def test_list_expenses_pages_and_filters(api, user_id):
+    """Test keyset pages cover every row once and year/month and category narrow the listing"""
+    rows = [{"category": "Dining" if day % 2 else "Rent", "amount": day, "date": f"2025-0{month}-{day:02d}"}
+            for month in (4, 5) for day in (3, 10, 27)]
+    created = await api.post(f"/users/{user_id}/expenses/batch", json=rows)
+    assert created.status_code == 201
+    assert len(created.json()) == 6
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        page = (await api.get(f"/users/{user_id}/expenses", params=params)).json()
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 6 and len({item["id"] for item in seen}) == 6
+    assert [item["date"][:10] for item in seen[:2]] == ["2025-05-27", "2025-05-10"]
+    april = (await api.get(f"/users/{user_id}/expenses", params={"year": 2025, "month": 4})).json()
+    assert {item["month"] for item in april["items"]} == {4}
+    rent = (await api.get(f"/users/{user_id}/expenses", params={"category": "Rent"})).json()
+    assert [item["amount"] for item in rent["items"]] == [10, 10]
+    assert (await api.get(f"/users/{user_id}/expenses", params={"cursor": "not-a-cursor"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_delete_expense_reverses_rollup(api, test_db, user_id):
+    """Test deleting an expense takes it back out of the rollup, and only once"""
+    created = (await api.post(f"/users/{user_id}/expenses", json={
+        "category": "Fun", "amount": 20, "year": 2025, "month": 2,
+    })).json()
+
+    resp = await api.delete(f"/users/{user_id}/expenses/{created['id']}")
+
+    assert resp.status_code == 204
+    assert await test_db.expenses.count_documents({}) == 0
+    rollup = await test_db.monthly_rollups.find_one({"year": 2025, "month": 2})
+    assert rollup["expense_total"] == 0
+    assert (await api.delete(f"/users/{user_id}/expenses/{created['id']}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_incomes_and_budget_plans(api, test_db, user_id):
+    """Test income month filters by date and a second plan for the same month conflicts"""
+    await test_db.budget_plans.create_indexes(INDEXES["budget_plans"])
+    await api.post(f"/users/{user_id}/incomes/batch", json=[
+        {"amount": 3000, "date": "2025-06-01T00:00:00", "source": "Salary"},
+        {"amount": 150, "date": "2025-07-02T00:00:00", "source": "Refund"},
+    ])
+    # web app incomes carry no year/month
+    await test_db.incomes.update_many({}, {"$unset": {"year": "", "month": ""}})
+
+    june = (await api.get(f"/users/{user_id}/incomes", params={"year": 2025, "month": 6})).json()
+
+    assert [item["source"] for item in june["items"]] == ["Salary"]
+    plan = {"year": 2025, "month": 6, "total_budget": 2000}
+    first = await api.post(f"/users/{user_id}/budget-plans", json=plan)
+    assert first.status_code == 201 and first.json()["is_filled"] is True
+    assert (await api.post(f"/users/{user_id}/budget-plans", json=plan)).status_code == 409
+    plans = (await api.get(f"/users/{user_id}/budget-plans")).json()
+    assert [(p["year"], p["month"]) for p in plans] == [(2025, 6)]
+
+
+@pytest.mark.asyncio
+async def test_records_are_only_the_callers(api, test_db, user_id):
+    """Test another user's path is a 403, no token is a 401 and a deleted user can't write"""
+    body = {"category": "Groceries", "amount": 5}
+    other = await test_db.users.insert_one(User.create_user_dict("other@example.com", "$2b$12$test"))
+
+    assert (await api.get(f"/users/{other.inserted_id}/expenses")).status_code == 403
+    assert (await api.post(f"/users/{other.inserted_id}/expenses", json=body)).status_code == 403
+    assert (await api.post("/users/not-an-id/expenses", json=body)).status_code == 403
+    anonymous = await api.get(f"/users/{user_id}/budget-plans", headers={"Authorization": ""})
+    assert anonymous.status_code == 401
+    assert anonymous.headers["www-authenticate"] == "Bearer"
+    await test_db.users.delete_one({"_id": ObjectId(user_id)})
+    assert (await api.post(f"/users/{user_id}/expenses", json=body)).status_code == 404
+    assert await test_db.expenses.count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_reports_bad_rows_and_saves_the_rest(api, test_db, user_id):
+    """Test each invalid row is reported by position while the valid ones are saved and rolled up"""
+    rows = [
+        {"category": "Groceries", "amount": 10, "date": "2025-03-14T00:00:00Z", "month": 1},
+        {"category": "Groceries", "amount": "lots"},
+        "not a row",
+        {"category": "Rent", "amount": 900, "year": 2025, "month": 13},
+        {"category": "Rent", "amount": 900, "year": 2025, "month": 4},
+    ]
+
+    resp = await api.post(f"/users/{user_id}/expenses/bulk", json=rows)
+
+    assert resp.status_code == 200
+    result = resp.json()
+    assert (result["rows"], result["inserted"], result["error_count"]) == (5, 2, 3)
+    assert [e["row"] for e in result["errors"]] == [1, 2, 3]
+    assert result["errors"][0]["error"].startswith("amount:")
+    assert result["errors"][2]["error"] == "month must be 1-12"
+    # month/year come from the date when there is one
+    stored = await test_db.expenses.find_one({"category": "Groceries"})
+    assert (stored["year"], stored["month"]) == (2025, 3)
+    march = await test_db.monthly_rollups.find_one({"year": 2025, "month": 3})
+    assert march["expense_total"] == 10
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_rejects_unusable_bodies(api, monkeypatch, user_id):
+    """Test a body that isn't an array, or has too many rows, is refused as a whole"""
+    from app import crud_routes
+    monkeypatch.setattr(crud_routes, "BULK_MAX_ROWS", 2)
+    url = f"/users/{user_id}/incomes/bulk"
+
+    assert (await api.post(url, json={"amount": 5})).status_code == 422
+    assert (await api.post(url, content=b"[{")).status_code == 422
+    assert (await api.post(url, json=[{"amount": 1}] * 3)).status_code == 413
+    assert (await api.post(url, json=[{"amount": 1}, {"amount": "x"}, {}])).status_code == 413
+    ok = (await api.post(url, json=[{"amount": 1, "date": "2025-05-02T00:00:00"}, {"amount": "x"}])).json()
+    assert (ok["inserted"], ok["error_count"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_batch_and_bulk_writes_need_the_callers_token(api, test_db, user_id):
+    """Test anonymous or cross-user batch/bulk writes are refused before any row or rollup is written"""
+    other = (await test_db.users.insert_one(User.create_user_dict("other@example.com", "$2b$12$test"))).inserted_id
+    rows = [{"category": "Rent", "amount": 900, "date": "2025-04-01T00:00:00"}]
+    anonymous = {"Authorization": ""}
+
+    for kind in ("expenses", "incomes"):
+        assert (await api.post(f"/users/{user_id}/{kind}/bulk", json=rows, headers=anonymous)).status_code == 401
+        assert (await api.post(f"/users/{user_id}/{kind}/batch", json=rows, headers=anonymous)).status_code == 401
+        assert (await api.post(f"/users/{other}/{kind}/bulk", json=rows)).status_code == 403
+        assert (await api.post(f"/users/{other}/{kind}/batch", json=rows)).status_code == 403
+    # refused on the header alone, not after reading a body up to API_BULK_MAX_BYTES
+    oversized = b"[" + b" " * (17 * 1024 * 1024) + b"]"
+    assert (await api.post(f"/users/{user_id}/expenses/bulk", content=oversized, headers=anonymous)).status_code == 401
+
+    assert await test_db.expenses.count_documents({}) == 0
+    assert await test_db.incomes.count_documents({}) == 0
+    assert await test_db.monthly_rollups.count_documents({}) == 0
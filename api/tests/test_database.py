@@ -211,6 +211,12 @@ async def test_income_with_budget_plan_id(test_db):
     response = Income.to_response(income_dict)
     assert response["budget_plan_id"] == plan_id
 
+def test_to_response_keeps_missing_budget_plan_as_none():
+    # web-app documents store budget_plan_id: None
+    for model in (Expense, Income):
+        doc = {"_id": ObjectId(), "user_id": ObjectId(), "budget_plan_id": None}
+        assert model.to_response(doc)["budget_plan_id"] is None
+
 @pytest.mark.asyncio
 async def test_connect_to_mongo_with_env_var(test_db):
     from app.database import connect_to_mongo, database, get_database
@@ -0,0 +1,164 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.http_client import (
+    close_http_clients,
+    create_ai_client,
+    http_clients,
+    start_http_clients,
+)
+
+ADVICE_BODY = {
+    "user_id": "u1",
+    "question": "Can I afford it?",
+    "snapshot": {"month": "2025-03", "income": 1000.0, "expenses": []},
+}
+
+
+@pytest.fixture
+def ai_client():
+    """Swap the shared ai-service client for one backed by a mock transport"""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"advice": "ok"})
+
+    original = http_clients.ai
+    http_clients.ai = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield calls
+    http_clients.ai = original
+
+
+def test_client_settings_from_env(monkeypatch):
+    """Test pool timeouts come from the environment"""
+    monkeypatch.setenv("AI_HTTP_CONNECT_TIMEOUT", "1.5")
+    monkeypatch.setenv("AI_HTTP_READ_TIMEOUT", "7")
+
+    client = create_ai_client()
+
+    assert client.timeout.connect == 1.5
+    assert client.timeout.read == 7.0
+
+
+def test_http2_falls_back_without_h2(monkeypatch):
+    """Test AI_HTTP2=1 without the h2 package still builds a client"""
+    monkeypatch.setenv("AI_HTTP2", "1")
+    monkeypatch.setattr("app.http_client.http2_available", lambda: False)
+
+    assert isinstance(create_ai_client(), httpx.AsyncClient)
+
+
+@pytest.mark.asyncio
+async def test_start_and_close():
+    """Test startup creates one client and shutdown closes it"""
+    original = http_clients.ai
+    http_clients.ai = None
+
+    await start_http_clients()
+    client = http_clients.ai
+    await start_http_clients()
+
+    assert http_clients.ai is client
+    await close_http_clients()
+    assert http_clients.ai is None
+    assert client.is_closed
+    http_clients.ai = original
+
+
+def test_proxy_reuses_shared_client(ai_client):
+    """Test every proxied request goes through the same pooled client"""
+    shared = http_clients.ai
+    client = TestClient(app)
+
+    for _ in range(3):
+        response = client.post("/ai/advice", json=ADVICE_BODY)
+        assert response.status_code == 200
+        assert response.json() == {"advice": "ok"}
+
+    assert len(ai_client) == 3
+    assert http_clients.ai is shared
+
+
+def test_proxy_timeout_is_504():
+    """Test an ai-service timeout is reported as 504"""
+    def handler(request):
+        raise httpx.ReadTimeout("too slow", request=request)
+
+    original = http_clients.ai
+    http_clients.ai = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        response = TestClient(app).post("/ai/advice", json=ADVICE_BODY)
+    finally:
+        http_clients.ai = original
+
+    assert response.status_code == 504
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    """A tight limiter and breaker for the proxy"""
+    from app import ai_routes
+    from app.resilience import AsyncAdmissionLimiter, AsyncUpstreamGuard, CircuitBreaker
+    guard = AsyncUpstreamGuard(
+        AsyncAdmissionLimiter(max_in_flight=1, max_waiting=0, retry_after=3),
+        CircuitBreaker(failure_threshold=2, reset_timeout=60),
+    )
+    monkeypatch.setattr(ai_routes, "ai_guard", guard)
+    return guard
+
+
+def _upstream(status):
+    original = http_clients.ai
+    http_clients.ai = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(status, json={"advice": "ok"}))
+    )
+    return original
+
+
+def test_saturated_proxy_returns_503(guard):
+    """Test a request beyond the in-flight limit is refused with Retry-After"""
+    guard.limiter.in_flight = 1  # the only slot is taken
+    original = _upstream(200)
+    try:
+        response = TestClient(app).post("/ai/advice", json=ADVICE_BODY)
+    finally:
+        http_clients.ai = original
+        guard.limiter.in_flight = 0
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+
+def test_breaker_opens_on_upstream_5xx(guard):
+    """Test repeated 5xx answers open the circuit and the proxy sheds load"""
+    original = _upstream(502)
+    client = TestClient(app, raise_server_exceptions=False)
+    try:
+        client.post("/ai/advice", json=ADVICE_BODY)
+        client.post("/ai/advice", json=ADVICE_BODY)
+        shed = client.post("/ai/advice", json=ADVICE_BODY)
+    finally:
+        http_clients.ai = original
+
+    assert shed.status_code == 503
+    stats = guard.stats()
+    assert stats["state"] == "open"
+    assert stats["in_flight"] == 0
+    assert stats["times_opened"] == 1
+
+
+def test_metrics_time_the_proxy(ai_client):
+    """Test /metrics reports route latency and the ai-service call timing"""
+    client = TestClient(app)
+    client.post("/ai/advice", json=ADVICE_BODY)
+
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{route="/ai/advice",method="POST",status="200"}' in response.text
+    assert 'upstream_call_duration_seconds_count{service="ai-service",outcome="ok"}' in response.text
+    assert 'ai_service_guard_state{value="closed"} 1' in response.text
+    assert client.get("/ai/stats").status_code == 404
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app import responses
+from app.models.expense import Expense
+from app.responses import DocumentSerializer, dumps
+from app.schemas.expense import ExpenseResponse
+
+
+def web_expense():
+    """An expense as the web app stores it (no is_recurring)"""
+    return {
+        "_id": ObjectId(),
+        "user_id": ObjectId(),
+        "budget_plan_id": None,
+        "category": "Groceries",
+        "amount": 12.5,
+        "note": "",
+        "date": datetime(2025, 3, 14),
+        "month": 3,
+        "year": 2025,
+        "created_at": datetime(2025, 3, 14, 9, 30, 15, 250000),
+    }
+
+
+def pydantic_json(doc):
+    return json.loads(ExpenseResponse.model_validate(Expense.to_response(doc)).model_dump_json())
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_matches_pydantic_output(monkeypatch, use_orjson):
+    """Test the fast path writes the same JSON as validating through the response model"""
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    doc = web_expense()
+    expected = pydantic_json(dict(doc))
+
+    serializer = DocumentSerializer(ExpenseResponse, object_ids=("user_id", "budget_plan_id"))
+    fast = json.loads(dumps(serializer(dict(doc) | {"budget_plan_id": ObjectId()})))
+    expected["budget_plan_id"] = fast["budget_plan_id"]
+
+    assert fast == expected
+    assert fast["is_recurring"] is False
+
+
+def test_projection_is_the_schema():
+    """Test only the response fields are fetched"""
+    projection = DocumentSerializer(ExpenseResponse).projection
+
+    assert set(projection) == set(ExpenseResponse.model_fields) - {"id"}
+    assert "_id" not in projection
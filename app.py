@@ -1,138 +1,300 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from flask_mail import Mail, Message
+from flask import Blueprint, Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, Response, stream_with_context, current_app
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from bson.objectid import ObjectId
 from datetime import datetime,date, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 import os
 from dotenv import load_dotenv
-from collections import defaultdict
-import secrets
-import json
-import google.generativeai as genai
+import threading
+import time
+import click
+from functools import partial
+from markupsafe import Markup
+
+from api.app.indexes import ensure_indexes
+from api.app.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    REGISTRY,
+    UPSTREAM_SECONDS,
+    MongoCommandMetrics,
+    MongoPoolMetrics,
+    clear_request,
+    finish_request,
+    metrics_enabled,
+    start_request,
+    timed_call,
+)
+from api.app.resilience import Overloaded, UpstreamGuard
+from services import DashboardSnapshot, monthly_totals, summarize_months
+from services.advice import (
+    ADVICE_MODEL,
+    AdviceCache,
+    FakeAdviceModel,
+    advice_cache_key,
+    build_advice_prompt,
+    replay_advice,
+    stream_advice,
+)
+from services.budget_plans import parse_category_budgets
+from services.cache import TTLCache
+from services.dashboard_view import BUDGET_OVERVIEW_FIELDS, SAVINGS_FIELDS, dashboard_view
+from services.fragments import cached_fragment
+from services.exports import export_stream, parse_include
+from services.imports import AUTO, detect_format, import_statement
+from services.jobs import DONE, ERROR, TIMEOUT, JobQueue, QueueFull
+from services.lazy import ForkSafeClient, after_fork
+from services.outbox import OutboxSender, SmtpSettings, enqueue as enqueue_email
+from services.pagination import PAGE_SIZE, clamp_page_size, fetch_page
+from services.passwords import PasswordHasher
+from services.query_audit import audit_queries
+from services.reset_tokens import consume_token, find_token, issue_token
+from services.rollups import (
+    check_rollups,
+    monthly_totals_from_rollups,
+    rebuild_rollups,
+    record_expense,
+    record_income,
+    rollups_ready,
+)
 
 
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "dev-secret")
+# 配置先收集在 config 里，create_app() 再装进每个 app.config；请求里用 current_app.config
+config = {"SECRET_KEY": os.getenv("SECRET_KEY", "dev-secret")}
+
+
+# 所有路由、请求钩子和 CLI 命令都挂在这个 blueprint 上，create_app() 再注册到 app
+# cli_group=None：命令还是 `flask --app app send-outbox`，不加 blueprint 前缀
+web = Blueprint("web", __name__, cli_group=None)
+
 
 #monthly savings codes
 
-def compute_monthly_savings(user_id):
+def compute_monthly_savings(user_id, user=None):
     """
     对该用户每个月做汇总：
       saving = max(income - expense, 0)
     返回 (monthly_savings, total_savings)
     monthly_savings 里每一项包含: year, month, month_name, income, expense, savings
+    和 DashboardSnapshot 一样看 rollups_ready(user)：是就直接读 monthly_rollups（每月一条）；
+    否则在 MongoDB 里用 aggregation 按月汇总，只把每月的总数传回来。
+    user 是已经读出来的用户文档，没传就按 user_id 查一次。
     """
-    uid = user_id if isinstance(user_id, ObjectId) else ObjectId(user_id)
-
-    month_income = defaultdict(float)
-    month_expense = defaultdict(float)
-
-    # ---- incomes: 按 (year, month) 汇总 ----
-    for inc in db.incomes.find({"user_id": uid}):
-        dt = inc.get("date")
-        if isinstance(dt, datetime):
-            y, m = dt.year, dt.month
-        else:
-            # 没有合法 date 就跳过
-            continue
-        month_income[(y, m)] += float(inc.get("amount") or 0)
-
-    # ---- expenses: 按 (year, month) 汇总 ----
-    for exp in db.expenses.find({"user_id": uid}):
-        dt = exp.get("date")
-        if isinstance(dt, datetime):
-            y, m = dt.year, dt.month
-        else:
-            y, m = exp.get("year"), exp.get("month")
-            if not y or not m:
-                continue
-        month_expense[(y, m)] += float(exp.get("amount") or 0)
-
-    monthly_savings = []
-    total_savings = 0.0
-
-    all_keys = sorted(set(month_income.keys()) | set(month_expense.keys()))
-    for (y, m) in all_keys:
-        inc = month_income.get((y, m), 0.0)
-        exp = month_expense.get((y, m), 0.0)
-
-        # 完全没有记录的月份直接跳过
-        if inc == 0 and exp == 0:
-            continue
-
-        saving = inc - exp
-        if saving < 0:
-            saving = 0.0   # 亏损月份当成 0 savings 显示
-
-        month_name = datetime(y, m, 1).strftime("%B")  # "September" 之类
-
-        monthly_savings.append({
-            "year": y,
-            "month": m,
-            "month_name": month_name,
-            "income": inc,
-            "expense": exp,
-            "savings": saving,
-        })
-        total_savings += saving
-
-    return monthly_savings, total_savings
+    if user is None:
+        user = db.users.find_one({"_id": ObjectId(user_id)}, {"rollups_ready": 1})
+    if rollups_ready(user):
+        month_income, month_expense = monthly_totals_from_rollups(db, user_id)
+    else:
+        month_income, month_expense = monthly_totals(db, user_id)
+    return summarize_months(month_income, month_expense)
 
 #Reset Password
-app.config["MAIL_SERVER"]="smtp.gmail.com"
-app.config["MAIL_PORT"] = 587
-app.config["MAIL_USE_TLS"] = True
-app.config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME")
-app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
-app.config["MAIL_DEFAULT_SENDER"] = os.getenv("MAIL_DEFAULT_SENDER") or app.config["MAIL_USERNAME"]
+config["MAIL_SERVER"] = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+config["MAIL_PORT"] = int(os.getenv("MAIL_PORT", "587"))
+config["MAIL_USE_TLS"] = os.getenv("MAIL_USE_TLS", "1") == "1"
+config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME")
+config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
+config["MAIL_DEFAULT_SENDER"] = os.getenv("MAIL_DEFAULT_SENDER") or config["MAIL_USERNAME"]
 
-mail = Mail(app)
 
 # MongoDB connection - use MONGO_URI from environment or fallback to localhost
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client["budgetbaddie"]
+# 每条 Mongo 命令的次数 / 耗时 / 返回文档数按当前路由记到 /metrics（METRICS_ENABLED=0 关闭）
+config["METRICS_ENABLED"] = metrics_enabled()
+# 连接池按进程算：gunicorn 每个 worker 一个池，由 WEB_THREADS 个请求线程和后台线程共用
+config["MONGO_MAX_POOL_SIZE"] = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+config["MONGO_MIN_POOL_SIZE"] = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# 等不到空闲连接 / 找不到可用的 Mongo 时尽快报错，不让请求线程一直挂着
+config["MONGO_WAIT_QUEUE_TIMEOUT_MS"] = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+config["MONGO_SERVER_SELECTION_TIMEOUT_MS"] = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+mongo_pool = MongoPoolMetrics()
+after_fork(mongo_pool.reset)
+
+
+def create_mongo_client():
+    listeners = [mongo_pool]
+    if config["METRICS_ENABLED"]:
+        listeners.append(MongoCommandMetrics())
+    return MongoClient(
+        MONGO_URI,
+        maxPoolSize=config["MONGO_MAX_POOL_SIZE"],
+        minPoolSize=config["MONGO_MIN_POOL_SIZE"],
+        waitQueueTimeoutMS=config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        serverSelectionTimeoutMS=config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        event_listeners=listeners,
+    )
 
-# Configure Gemini AI
+
+def setup_indexes(mongo_client):
+    # 第一次连接时按 api/app/indexes.py 建索引（create_index 是幂等的）
+    if os.getenv("MONGO_CREATE_INDEXES", "1") == "1":
+        try:
+            ensure_indexes(mongo_client["budgetbaddie"])
+        except PyMongoError as e:
+            print("INDEX SETUP ERROR:", e)
+
+
+# 第一次查询时才建 MongoClient；fork 出来的 worker 各自重新建（MongoClient 不能跨 fork 共享）
+client = ForkSafeClient(create_mongo_client, on_connect=setup_indexes)
+db = client.database("budgetbaddie")
+
+# Gemini SDK 导入要 ~1 秒，等第一次真正调用 AI 时再导入
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_genai():
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                if GEMINI_API_KEY:
+                    genai.configure(api_key=GEMINI_API_KEY)
+                _genai = genai
+    return _genai
+
+
+def __getattr__(name):
+    # `app.genai` still works (and loads the SDK), e.g. for patch("app.genai.GenerativeModel")
+    if name == "genai":
+        return load_genai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# AI_FAKE_LATENCY=<seconds> 时用本地假模型代替 Gemini（测试 / 压测用）
+_fake_latency = os.getenv("AI_FAKE_LATENCY")
+config["AI_FAKE_LATENCY"] = float(_fake_latency) if _fake_latency else None
+# 异步 /ai/advice 的后台线程池
+config["AI_MAX_WAIT"] = float(os.getenv("AI_MAX_WAIT", "25"))
+advice_jobs = JobQueue(
+    max_workers=int(os.getenv("AI_WORKERS", "4")),
+    max_queue=int(os.getenv("AI_QUEUE_SIZE", "16")),
+    timeout=float(os.getenv("AI_TIMEOUT", "30")),
+    policy=os.getenv("AI_QUEUE_POLICY", "reject"),
+)
+
+# Gemini 调用的并发上限 + 熔断器（AI_MAX_IN_FLIGHT / AI_BREAKER_* 等）
+ai_guard = UpstreamGuard.from_env()
+
+# 相同问题 + 相同本月数据的回答缓存（AI_CACHE_TTL=0 关闭）
+advice_cache = AdviceCache(
+    maxsize=int(os.getenv("AI_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("AI_CACHE_TTL", "600")),
+)
+
+
+def get_advice_model():
+    latency = current_app.config["AI_FAKE_LATENCY"]
+    if latency is not None:
+        return FakeAdviceModel(latency=latency)
+    return load_genai().GenerativeModel(ADVICE_MODEL)
+
+
+def busy_response(retry_after):
+    response = jsonify({"error": "AI service is busy, please try again shortly"})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 503
+
+
+def event_stream_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def wants_event_stream():
+    # only an explicit text/event-stream counts; */* keeps the JSON response
+    return "text/event-stream" in request.accept_mimetypes.values()
+
+
+def generate_advice(model, prompt, context):
+    with timed_call("gemini"):
+        response = model.generate_content(prompt)
+    return {"advice": response.text, "context": context}
+
+# 邮件先写进 outbox 集合，请求马上返回；后台线程复用一个 SMTP 连接慢慢发（失败会退避重试）
+# MAIL_OUTBOX_SENDER=off 时本进程不发，交给 `flask --app app send-outbox`
+config["MAIL_OUTBOX_SENDER"] = os.getenv("MAIL_OUTBOX_SENDER", "thread")
+outbox = OutboxSender(
+    lambda: db,
+    SmtpSettings.from_config(config),
+    concurrency=int(os.getenv("MAIL_OUTBOX_CONCURRENCY", "1")),
+    max_attempts=int(os.getenv("MAIL_OUTBOX_MAX_ATTEMPTS", "5")),
+    backoff=float(os.getenv("MAIL_OUTBOX_BACKOFF", "30")),
+    stats_ttl=float(os.getenv("MAIL_OUTBOX_STATS_TTL", "10")),
+)
+
 
 def send_reset_email(user, token):
-    reset_url = url_for("reset_password", token=token, _external=True)
-    print("DEBUG RESET URL:", reset_url)
+    reset_url = url_for("web.reset_password", token=token, _external=True)
 
-    msg = Message(
-        subject="Reset your BudgetBaddie password",
-        recipients=[user["email"]],
-    )
-    msg.body = f"""Hi, 
+    body = f"""Hi, 
     You requested a password reset.
     Click the link below to reset your password:
 {reset_url}
 
 If you did not request this, you can ignore this email.
 """
-    try:
-        mail.send(msg)
-        print("MAIL SENT OK")
-    except Exception as e:
-        print("MAIL ERROR:", e)
+    # the link is useless once the token expires, so don't keep (or send) it past that
+    expires_at = datetime.utcnow() + timedelta(seconds=current_app.config["RESET_TOKEN_TTL"])
+    message_id = enqueue_email(db, user["email"], "Reset your BudgetBaddie password", body, expires_at=expires_at)
+    if current_app.config["MAIL_OUTBOX_SENDER"] == "thread":
+        outbox.notify()
+    return message_id
+
+
 
+# Per-process cache of logged-in users, keyed by user id. Off unless
+# USER_CACHE_TTL > 0; entries are dropped on password reset.
+config["USER_CACHE_TTL"] = float(os.getenv("USER_CACHE_TTL", "0"))
+user_cache = TTLCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")))
+
+# dashboard 只渲染第一页 expenses，其余由 /api/expenses 分页加载
+config["EXPENSE_PAGE_SIZE"] = clamp_page_size(os.getenv("EXPENSE_PAGE_SIZE", PAGE_SIZE))
+
+# no route needs these once the user is logged in
+USER_PROJECTION = {"password": 0, "password_reset_token": 0, "verification_code": 0}
 
 
 def get_current_user():
+    """Load the logged-in user at most once per request (cached on flask.g)."""
     user_id = session.get("user_id")
     if not user_id:
         return None
-    return db.users.find_one({"_id": ObjectId(user_id)})
+
+    cached = g.get("_current_user")
+    if cached and cached[0] == user_id:
+        return cached[1]
+
+    ttl = current_app.config["USER_CACHE_TTL"]
+    user = user_cache.get(user_id) if ttl > 0 else None
+    if user is None:
+        user = db.users.find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+        if user and ttl > 0:
+            user_cache.set(user_id, user, ttl=ttl)
+
+    g._current_user = (user_id, user)
+    return user
 
 # ---------- Auth routes ----------
-@app.route("/signup", methods=["GET", "POST"])
+# 密码哈希放到单独的小线程池里跑，算法/成本可配；旧参数的哈希在登录成功时自动升级
+config["PASSWORD_HASH_SCHEME"] = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+config["PASSWORD_BCRYPT_ROUNDS"] = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+passwords = PasswordHasher(
+    scheme=config["PASSWORD_HASH_SCHEME"],
+    rounds=config["PASSWORD_BCRYPT_ROUNDS"],
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("PASSWORD_HASH_QUEUE", "32")),
+)
+
+BUSY_MESSAGE = "Too many sign-ins right now, please try again in a moment."
+
+@web.route("/signup", methods=["GET", "POST"])
 def signup():
     if request.method == "POST":
         email = request.form["email"].strip().lower()
@@ -141,76 +303,82 @@ def signup():
         existing = db.users.find_one({"email": email})
         if existing:
             flash("Email already registered.")
-            return redirect(url_for("signup"))
+            return redirect(url_for("web.signup"))
 
-        hashed = generate_password_hash(password)
+        try:
+            hashed = passwords.hash(password)
+        except QueueFull:
+            flash(BUSY_MESSAGE)
+            return redirect(url_for("web.signup"))
 
         user = {
             "email": email,
             "password": hashed,
             "created_at": datetime.utcnow(),
             "verification_code": None,
-            "password_reset_token": None,
+            # brand-new account: every write from now on keeps its rollups current
+            "rollups_ready": True,
         }
         result = db.users.insert_one(user)
         session["user_id"] = str(result.inserted_id)
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("web.dashboard"))
 
     return render_template("signup.html")
 
-@app.route("/login", methods=["GET", "POST"])
+@web.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form["email"].strip().lower()
         password = request.form["password"]
 
         user = db.users.find_one({"email": email})
-        if not user or not check_password_hash(user["password"], password):
+        try:
+            valid = bool(user) and passwords.verify(user.get("password"), password)
+            if valid and passwords.needs_rehash(user["password"]):
+                # 登录成功时顺手把旧算法/旧成本的哈希升级掉
+                db.users.update_one(
+                    {"_id": user["_id"], "password": user["password"]},
+                    {"$set": {"password": passwords.hash(password)}},
+                )
+                user_cache.pop(str(user["_id"]))
+        except QueueFull:
+            flash(BUSY_MESSAGE)
+            return redirect(url_for("web.login"))
+
+        if not valid:
             flash("Invalid email or password.")
-            return redirect(url_for("login"))
+            return redirect(url_for("web.login"))
 
         session["user_id"] = str(user["_id"])
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("web.dashboard"))
 
     return render_template("login.html")
 
-import secrets
 
-@app.route("/forgot-password", methods=["GET", "POST"])
+config["RESET_TOKEN_TTL"] = int(os.getenv("RESET_TOKEN_TTL", "3600"))
+
+@web.route("/forgot-password", methods=["GET", "POST"])
 def forgot_password():
     if request.method == "POST":
         email = request.form["email"].strip().lower()
-        print("FORGOT PASSWORD POST, email =", email)   # 调试1：确认进来了
-
         user = db.users.find_one({"email": email})
-        print("USER FOUND? ->", bool(user))             # 调试2：确认有没有这个用户
 
         if user:
-            token = secrets.token_urlsafe(32)
-            db.users.update_one(
-                {"_id": user["_id"]},
-                {"$set": {"password_reset_token": token}}
-            )
-
-            # 生成 reset 链接
-            reset_url = url_for("reset_password", token=token, _external=True)
-            print("DEBUG RESET URL:", reset_url)        # 调试3：打印链接
+            # 存的是 token 的哈希，有过期时间；再点一次会替换掉旧链接
+            token = issue_token(db, user["_id"], ttl=current_app.config["RESET_TOKEN_TTL"])
 
-            # 开发 / demo 用：把链接显示在页面上（老师也能看到）
-            flash(f"[DEBUG] Reset link: {reset_url}")
+            # 只在本地 debug（python app.py）时把链接显示在页面上，方便演示；线上只发邮件
+            if current_app.debug:
+                flash(f"[DEBUG] Reset link: {url_for('web.reset_password', token=token, _external=True)}")
 
-            # 真正发邮件（如果 Gmail 配好了）
+            # 放进 outbox，由后台发送（不会卡住这个请求）
             try:
                 send_reset_email(user, token)
-                print("CALL send_reset_email DONE")
-            except Exception as e:
-                print("ERROR IN send_reset_email:", e)
-
-        else:
-            print("NO USER FOR EMAIL", email)
+            except PyMongoError as e:
+                current_app.logger.error("could not queue the reset email: %s", e)
 
         flash("If this email exists, a reset link has been sent.")
-        return redirect(url_for("forgot_password"))
+        return redirect(url_for("web.forgot_password"))
 
     # GET 请求：只渲染页面
     return render_template("forgot-password.html")
@@ -218,22 +386,28 @@ def forgot_password():
 
 #reset password token
 
-@app.route("/reset-password/<token>", methods=["GET", "POST"])
+@web.route("/reset-password/<token>", methods=["GET", "POST"])
 def reset_password(token):
-    user = db.users.find_one({"password_reset_token": token})
-    if not user:
+    if not find_token(db, token):
         flash("Invalid or expired reset link.")
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
 
     if request.method == "POST":
         new_password = request.form["password"]
-        hashed = generate_password_hash(new_password)
-        db.users.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"password": hashed, "password_reset_token": None}}
-        )
+        try:
+            hashed = passwords.hash(new_password)
+        except QueueFull:
+            flash(BUSY_MESSAGE)
+            return redirect(url_for("web.reset_password", token=token))
+        # 原子地删掉 token：同一个链接只能用一次
+        user_id = consume_token(db, token)
+        if not user_id:
+            flash("Invalid or expired reset link.")
+            return redirect(url_for("web.login"))
+        db.users.update_one({"_id": user_id}, {"$set": {"password": hashed}})
+        user_cache.pop(str(user_id))
         flash("Password updated. Please log in.")
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
 
     return render_template("reset-password.html")
 
@@ -241,20 +415,37 @@ def reset_password(token):
 
 from datetime import date
 
-@app.route("/dashboard")
+# Rendered dashboard fragments per (fragment, user[, year, month]). Each entry
+# carries a digest of the view data it came from, so it is re-rendered as soon
+# as that month's data changes. FRAGMENT_CACHE_TTL=0 turns it off.
+config["FRAGMENT_CACHE_TTL"] = float(os.getenv("FRAGMENT_CACHE_TTL", "300"))
+fragment_cache = TTLCache(maxsize=int(os.getenv("FRAGMENT_CACHE_SIZE", "2048")))
+
+
+def render_fragment(template, key, view, fields):
+    """Render `template` with `view`, reusing the cached HTML while `fields` of the view are unchanged."""
+    ttl = current_app.config["FRAGMENT_CACHE_TTL"]
+    return Markup(cached_fragment(
+        fragment_cache if ttl > 0 else None,
+        key,
+        {field: view[field] for field in fields},
+        lambda: render_template(template, view=view),
+        ttl=ttl,
+    ))
+
+
+@web.route("/dashboard")
 def dashboard():
     user = get_current_user()
     if not user:
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
 
     today = date.today()
     year, month = today.year, today.month
 
-    plan = db.budget_plans.find_one({
-        "user_id": user["_id"],
-        "year": year,
-        "month": month
-    })
+    # plan、本月消费（第一页）、收入、每月 savings 一次 aggregate 取回
+    snapshot = DashboardSnapshot.load(db, user, year, month, page_size=current_app.config["EXPENSE_PAGE_SIZE"])
+    plan = snapshot.plan
 
     # check if budget is filled
     is_filled = bool(plan and plan.get("is_filled", False))
@@ -264,56 +455,41 @@ def dashboard():
     need_budget_popup = not is_filled
     can_edit_budget = not is_locked
 
-    # 取出本月的简单消费记录
-    expenses = list(db.expenses.find({
-        "user_id": user["_id"],
-        "year": year,
-        "month": month
-    }).sort("date", -1))
-
-    # calculate total monthly income
-    from calendar import monthrange
-    last_day = monthrange(year, month)[1]
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month, last_day, 23, 59, 59)
-    
-    total_income = sum([
-        inc.get('amount', 0) 
-        for inc in db.incomes.find({
-            "user_id": user["_id"],
-            "date": {"$gte": start_date, "$lte": end_date}
-        })
-    ])
+    expenses = snapshot.expenses
+    # 所有数字在 dashboard_view 里算好，模板只负责显示
+    view = dashboard_view(snapshot)
+    user_id = str(user["_id"])
+    fragments = {
+        "savings": render_fragment(
+            "partials/_savings.html", ("savings", user_id),
+            view, SAVINGS_FIELDS,
+        ),
+        "budget_overview": render_fragment(
+            "partials/_budget_overview.html", ("budget_overview", user_id, year, month),
+            view, BUDGET_OVERVIEW_FIELDS,
+        ),
+    }
 
-    monthly_savings, total_savings = compute_monthly_savings(user["_id"])
-    
-    # calculate expenses by category
-    expense_by_category = {}
-    for e in expenses:
-        cat = e.get('category', 'Other')
-        expense_by_category[cat] = expense_by_category.get(cat, 0) + e.get('amount', 0)
-    
     return render_template(
         "dashboard.html",
         user=user,
         need_budget_popup=need_budget_popup,
         can_edit_budget = can_edit_budget,
         expenses=expenses,
+        next_cursor=snapshot.next_cursor,
         current_year=year,
         current_month=month,
         plan = plan, #add popup function?
-        monthly_savings=monthly_savings,
-        total_savings=total_savings,
-        total_income=total_income,
-        expense_by_category=expense_by_category,
+        view=view,
+        fragments=fragments,
     )
 
 #budget plan routes
-@app.route("/budget-plan", methods=["POST"])
+@web.route("/budget-plan", methods=["POST"])
 def save_budget_plan():
     user = get_current_user()
     if not user:
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
 
     year = int(request.form["year"])
     month = int(request.form["month"])
@@ -330,23 +506,8 @@ def save_budget_plan():
     old_locked = bool(old_plan and old_plan.get("is_locked", False))
     new_locked = old_locked or user_click_lock
 
-    #前端塞进来的 JSON 字符串
-    raw = request.form.get("categories_json", "[]")
-    try:
-        categories_list = json.loads(raw)
-    except json.JSONDecodeError:
-        categories_list = []
-
-    # 转成 {category: amount} 的 dict
-    category_budgets = {}
-    for item in categories_list:
-        name = item.get("category")
-        try:
-            amount = float(item.get("amount", 0) or 0)
-        except ValueError:
-            amount = 0
-        if name:
-            category_budgets[name] = amount
+    #前端塞进来的 JSON 字符串，转成 {category: amount} 的 dict
+    category_budgets = parse_category_budgets(request.form.get("categories_json", "[]"))
 
     # 如果当月已有 plan 就更新；没有就创建
     db.budget_plans.update_one(
@@ -365,7 +526,7 @@ def save_budget_plan():
     )
 
     flash("Monthly budget saved.")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("web.dashboard"))
 
     # upsert：如果当月已有 plan 就更新；没有就创建
     db.budget_plans.update_one(
@@ -382,14 +543,14 @@ def save_budget_plan():
     )
 
     flash("Monthly budget saved.")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("web.dashboard"))
 
-@app.route("/income/add", methods=["POST"])
+@web.route("/income/add", methods=["POST"])
 def add_income():
     # 1. 确认用户
     user = get_current_user()
     if not user:
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
 
     user_id = user["_id"]
 
@@ -423,17 +584,18 @@ def add_income():
         "created_at": datetime.utcnow(),
     }
     db.incomes.insert_one(income_doc)
+    record_income(db, income_doc)
 
     flash("Income added!")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("web.dashboard"))
 
 #add expenese
 
-@app.route("/expenses/add", methods=["POST"])
+@web.route("/expenses/add", methods=["POST"])
 def add_expense():
     user = get_current_user()
     if not user:
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
 
     user_id = user["_id"]
 
@@ -472,32 +634,179 @@ def add_expense():
     }
 
     db.expenses.insert_one(expense)
+    record_expense(db, expense)
 
     flash("Expense added.")
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("web.dashboard"))
 
-@app.route("/expenses/delete/<expense_id>", methods=["POST"])
+@web.route("/expenses/delete/<expense_id>", methods=["POST"])
 def delete_expense(expense_id):
     user = get_current_user()
     if not user:
-        return redirect(url_for("login"))
+        return redirect(url_for("web.login"))
     
     try:
-        result = db.expenses.delete_one({
+        deleted = db.expenses.find_one_and_delete({
             "_id": ObjectId(expense_id),
             "user_id": user["_id"]
         })
         
-        if result.deleted_count > 0:
+        if deleted:
+            record_expense(db, deleted, sign=-1)
             flash("Expense deleted.")
         else:
             flash("Expense not found.")
     except Exception as e:
         flash("Error deleting expense.")
     
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("web.dashboard"))
+
+# ---------- Statement import (CSV / OFX) ----------
+config["IMPORT_BATCH_SIZE"] = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+config["IMPORT_MAX_ERRORS"] = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+
+@web.route("/api/import", methods=["POST"])
+def import_statement_api():
+    """
+    multipart 上传 `file`（CSV 或 OFX），边读边分批写入；
+    可选 `format`=csv|ofx（默认看扩展名）、`kind`=auto|expense|income。
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    try:
+        fmt = detect_format(upload.filename, request.form.get("format"))
+        summary = import_statement(
+            db, user["_id"], upload.stream,
+            fmt=fmt,
+            kind=request.form.get("kind", AUTO),
+            batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+            max_errors=current_app.config["IMPORT_MAX_ERRORS"],
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PyMongoError:
+        return jsonify({"error": "Import stopped part-way; some rows may already be saved"}), 500
+
+    return jsonify(summary)
+
+# ---------- History export (CSV / NDJSON) ----------
+config["EXPORT_BATCH_SIZE"] = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+EXPORT_MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+@web.route("/api/export")
+def export_history_api():
+    """
+    ?format=csv|ndjson（默认 csv），?include=expenses,incomes,plans（默认全部），
+    ?gzip=1 边压缩边发。游标逐批读、逐块写，内存不随数据量增长。
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
 
-@app.route("/ai/advice", methods=["POST"])
+    fmt = request.args.get("format", "csv").lower()
+    compress = request.args.get("gzip") in ("1", "true")
+    try:
+        chunks = export_stream(
+            db, user["_id"],
+            fmt=fmt,
+            include=parse_include(request.args.get("include")),
+            compress=compress,
+            batch_size=current_app.config["EXPORT_BATCH_SIZE"],
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"budgetbaddie-{date.today().isoformat()}.{fmt}"
+    mimetype = EXPORT_MIMETYPES[fmt]
+    if compress:
+        filename += ".gz"
+        mimetype = "application/gzip"
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+# ---------- Paginated listings (JSON) ----------
+def _month_args():
+    """Optional ?year=&month= filter; (None, None) when absent."""
+    year = request.args.get("year", type=int)
+    month = request.args.get("month", type=int)
+    if year and month and 1 <= month <= 12:
+        return year, month
+    return None, None
+
+
+def _page_response(collection, base_filter, serialize):
+    limit = clamp_page_size(request.args.get("limit", current_app.config["EXPENSE_PAGE_SIZE"]))
+    try:
+        docs, next_cursor = fetch_page(collection, base_filter, request.args.get("cursor"), limit)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    return jsonify({"items": [serialize(doc) for doc in docs], "next_cursor": next_cursor})
+
+
+def _format_date(dt):
+    return dt.strftime("%Y-%m-%d") if dt else ""
+
+
+@web.route("/api/expenses")
+def list_expenses_api():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    base_filter = {"user_id": user["_id"]}
+    year, month = _month_args()
+    if year:
+        base_filter.update(year=year, month=month)
+
+    return _page_response(db.expenses, base_filter, lambda e: {
+        "id": str(e["_id"]),
+        "date": _format_date(e.get("date")),
+        "category": e.get("category") or "",
+        "amount": e.get("amount", 0),
+        "note": e.get("note") or "",
+    })
+
+
+@web.route("/api/incomes")
+def list_incomes_api():
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    base_filter = {"user_id": user["_id"]}
+    year, month = _month_args()
+    if year:
+        # incomes only carry `date`
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        base_filter["date"] = {"$gte": start, "$lt": end}
+
+    return _page_response(db.incomes, base_filter, lambda i: {
+        "id": str(i["_id"]),
+        "date": _format_date(i.get("date")),
+        "source": i.get("source") or "",
+        "amount": i.get("amount", 0),
+        "note": i.get("note") or "",
+    })
+
+
+@web.route("/ai/advice", methods=["POST"])
 def get_ai_advice():
     user = get_current_user()
     if not user:
@@ -511,94 +820,232 @@ def get_ai_advice():
     today = date.today()
     year, month = today.year, today.month
     
-    # Fetch budget plan
-    plan = db.budget_plans.find_one({
-        "user_id": user["_id"],
-        "year": year,
-        "month": month
-    })
-    
-    # Fetch expenses
-    expenses = list(db.expenses.find({
-        "user_id": user["_id"],
-        "year": year,
-        "month": month
-    }))
-    
-    # Calculate totals
-    from calendar import monthrange
-    last_day = monthrange(year, month)[1]
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month, last_day, 23, 59, 59)
-    
-    total_income = sum([
-        inc.get('amount', 0) 
-        for inc in db.incomes.find({
-            "user_id": user["_id"],
-            "date": {"$gte": start_date, "$lte": end_date}
-        })
-    ])
-    
-    # Build context for AI
-    total_budget = plan.get('total_budget', 0) if plan else 0
-    category_budgets = plan.get('category_budgets', {}) if plan else {}
-    
-    # Calculate spent per category
-    expense_by_category = {}
-    for e in expenses:
-        cat = e.get('category', 'Other')
-        expense_by_category[cat] = expense_by_category.get(cat, 0) + e.get('amount', 0)
-    
-    total_spent = sum(expense_by_category.values())
-    remaining_budget = total_budget - total_spent
-    savings = total_income - total_budget
-    
-    # Build prompt for Gemini
-    context = f"""You are a helpful financial advisor. Analyze this user's budget and provide practical advice.
+    snapshot = DashboardSnapshot.load(db, user, year, month, with_expenses=False, with_savings=False)
+    prompt, context = build_advice_prompt(snapshot, question)
 
-Current Financial Situation:
-- Monthly Income: ${total_income:.2f}
-- Total Budget: ${total_budget:.2f}
-- Total Spent This Month: ${total_spent:.2f}
-- Remaining Budget: ${remaining_budget:.2f}
-- Savings/Buffer: ${savings:.2f}
+    # 同一问题 + 同一份本月数据 -> 直接用缓存的回答
+    cache_key = advice_cache_key(user["_id"], snapshot, question)
+    cached = advice_cache.get(cache_key)
 
-Budget by Category:
-"""
-    for category, budget_amount in category_budgets.items():
-        spent = expense_by_category.get(category, 0)
-        remaining = budget_amount - spent
-        context += f"- {category}: ${budget_amount:.2f} budgeted, ${spent:.2f} spent, ${remaining:.2f} remaining\n"
-    
-    context += f"\nUser Question: {question}\n\nProvide clear, actionable advice. Be concise but helpful. If they're asking about a purchase, tell them if they can afford it and suggest which category it should come from."
-    
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        response = model.generate_content(context)
-        
+    # 客户端要 SSE 就边生成边推送（首字节更快），否则照旧返回 JSON
+    if wants_event_stream():
+        if cached is not None:
+            return event_stream_response(replay_advice(cached))
+        try:
+            ticket = ai_guard.acquire()
+        except Overloaded as e:
+            return busy_response(e.retry_after)
+
+        started = time.perf_counter()
+
+        def on_complete(text):
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, "gemini", "ok")
+            ticket.success()
+            advice_cache.set(cache_key, {"advice": text, "context": context})
+
+        def on_error(e):
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, "gemini", "error")
+            ticket.failure()
+
+        response = event_stream_response(stream_advice(
+            get_advice_model(), prompt, context,
+            on_complete=on_complete,
+            on_error=on_error,
+        ))
+        response.call_on_close(ticket.release)
+        return response
+
+    if cached is not None:
+        return jsonify(cached)
+
+    # 并发上限 + 熔断：上游慢或一直报错时直接 503，不堆积请求
+    ask_model = partial(ai_guard.call, generate_advice, get_advice_model(), prompt, context)
+
+    # 异步模式：丢进后台线程池，立刻返回 job id，前端轮询 /ai/advice/jobs/<id>
+    if request.json.get("async") or request.args.get("mode") == "async":
+        breaker_wait = ai_guard.breaker.retry_after()
+        if breaker_wait > 0:
+            return busy_response(int(breaker_wait) + 1)
+        try:
+            job = advice_jobs.submit(advice_cache.generate, cache_key, ask_model, owner=str(user["_id"]))
+        except QueueFull as e:
+            return busy_response(e.retry_after)
         return jsonify({
-            "advice": response.text,
-            "context": {
-                "total_income": total_income,
-                "total_budget": total_budget,
-                "total_spent": total_spent,
-                "remaining_budget": remaining_budget
-            }
-        })
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": url_for("web.get_ai_advice_job", job_id=job.id),
+        }), 202
+
+    try:
+        return jsonify(advice_cache.generate(cache_key, ask_model))
+    except Overloaded as e:
+        return busy_response(e.retry_after)
     except Exception as e:
         return jsonify({"error": f"AI service error: {str(e)}"}), 500
 
 
-@app.route("/logout")
+# ---------- Metrics ----------
+# 按路由统计延迟和 Mongo 命令；advice 缓存、任务池、outbox 等的计数也一起导出成 gauge
+REGISTRY.add_collector("ai_advice_cache", "Advice cache counters", lambda: advice_cache.stats())
+REGISTRY.add_collector("ai_advice_jobs", "Advice job pool counters", lambda: advice_jobs.stats())
+REGISTRY.add_collector("ai_upstream", "Gemini admission limiter and breaker", lambda: ai_guard.stats())
+REGISTRY.add_collector("mail_outbox", "Email outbox depth, delivery counters and send latency", lambda: outbox.stats())
+REGISTRY.add_collector("password_hash", "Password hashing pool", lambda: {"rejected": passwords.rejected})
+REGISTRY.add_collector("mongo_pool", "MongoDB connection pool of this process (see /ready)", lambda: mongo_pool.stats())
+
+
+@web.before_app_request
+def start_request_metrics():
+    if current_app.config["METRICS_ENABLED"]:
+        # url_rule 是路由模板（/expenses/<expense_id>），不是具体 URL，标签数量有上限
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        g._metrics = (start_request(rule), time.perf_counter())
+
+
+@web.after_app_request
+def finish_request_metrics(response):
+    started = g.pop("_metrics", None)
+    if started is not None:
+        ctx, t0 = started
+        finish_request(ctx, request.method, response.status_code, time.perf_counter() - t0)
+    return response
+
+
+@web.teardown_app_request
+def clear_request_metrics(exc):
+    clear_request()
+
+
+@web.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (see api/app/metrics.py)."""
+    return Response(REGISTRY.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+
+@web.route("/ready")
+def ready():
+    """Readiness probe: 200 once this worker can reach MongoDB, 503 otherwise, with its pool state."""
+    body = {
+        "pid": os.getpid(),
+        "pool": {
+            "max_pool_size": current_app.config["MONGO_MAX_POOL_SIZE"],
+            "min_pool_size": current_app.config["MONGO_MIN_POOL_SIZE"],
+            **mongo_pool.stats(),
+        },
+    }
+    started = time.perf_counter()
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        return jsonify(status="unavailable", error=str(e), **body), 503
+    return jsonify(status="ready", ping_ms=round((time.perf_counter() - started) * 1000, 2), **body)
+
+
+@web.route("/ai/advice/jobs/<job_id>")
+def get_ai_advice_job(job_id):
+    """Poll an async advice job; ?wait=N long-polls for up to N seconds (capped by AI_MAX_WAIT)."""
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+
+    job = advice_jobs.get(job_id, owner=str(user["_id"]))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    wait = min(request.args.get("wait", 0.0, type=float), current_app.config["AI_MAX_WAIT"])
+    if wait > 0 and not job.finished:
+        job.wait(wait)
+
+    if job.status == DONE:
+        return jsonify({"status": job.status, **job.result})
+    if job.status == ERROR:
+        return jsonify({"status": job.status, "error": f"AI service error: {job.error}"}), 500
+    if job.status == TIMEOUT:
+        return jsonify({"status": job.status, "error": "AI service timed out"}), 504
+    return jsonify({"status": job.status}), 202
+
+
+# ---------- Rollup maintenance (flask --app app <command>) ----------
+@web.cli.command("rebuild-rollups")
+@click.option("--batch-size", default=100, show_default=True, help="Users per batch.")
+@click.option("--user-id", "user_ids", multiple=True, help="Only rebuild these users.")
+def rebuild_rollups_command(batch_size, user_ids):
+    """Recompute monthly_rollups from raw expenses and incomes."""
+    count = rebuild_rollups(db, batch_size=batch_size, user_ids=list(user_ids) or None)
+    click.echo(f"rebuilt rollups for {count} user(s)")
+
+
+@web.cli.command("check-rollups")
+@click.option("--batch-size", default=100, show_default=True, help="Users per batch.")
+@click.option("--user-id", "user_ids", multiple=True, help="Only check these users.")
+def check_rollups_command(batch_size, user_ids):
+    """Compare monthly_rollups with raw data; exits 1 on any mismatch."""
+    mismatches = check_rollups(db, batch_size=batch_size, user_ids=list(user_ids) or None)
+    for m in mismatches:
+        click.echo(
+            f"{m['user_id']} {m['year']}-{m['month']:02d} {m['field']}: "
+            f"expected {m['expected']:.2f}, rollup has {m['actual']:.2f}"
+        )
+    if mismatches:
+        raise SystemExit(1)
+    click.echo("rollups are consistent")
+
+
+@web.cli.command("send-outbox")
+@click.option("--once", is_flag=True, help="Send everything that is due, then exit.")
+def send_outbox_command(once):
+    """Deliver queued emails (use with MAIL_OUTBOX_SENDER=off on the web workers)."""
+    if once:
+        click.echo(f"processed {outbox.drain()} message(s)")
+        return
+    outbox.start()
+    click.echo(f"sending with {outbox.concurrency} connection(s), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        outbox.stop()
+
+
+@web.cli.command("audit-queries")
+def audit_queries_command():
+    """Explain every query shape the routes issue; exits 1 on any COLLSCAN."""
+    results = audit_queries(db)
+    for r in results:
+        status = "COLLSCAN" if r["collscan"] else "ok"
+        click.echo(f"[{status:>8}] {r['collection']:<16} {r['label']}  ({' > '.join(r['stages'])})")
+    if any(r["collscan"] for r in results):
+        raise SystemExit(1)
+
+
+@web.route("/logout")
 def logout():
 
     session.clear()
     flash("You have been logged out.")
-    return redirect(url_for("login"))
+    return redirect(url_for("web.login"))
 
-@app.route("/")
+@web.route("/")
 def index():
-    return redirect(url_for("login"))
+    return redirect(url_for("web.login"))
+
+
+def create_app(overrides=None):
+    """
+    Build the Flask app: config from the environment (plus `overrides`),
+    routes, hooks and CLI commands. Mongo, the Gemini SDK, the outbox sender
+    and the thread pools all start on first use, so this is cheap and safe
+    to run in a pre-fork server's master process.
+    """
+    app = Flask(__name__)
+    app.config.update(config)
+    app.config.update(overrides or {})
+    app.register_blueprint(web)
+    return app
+
+
+# `flask --app app`, `gunicorn app:app` and the tests use this instance
+app = create_app()
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
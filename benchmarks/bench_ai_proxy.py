@@ -0,0 +1,107 @@
+"""
+Benchmark the FastAPI /ai/advice proxy against a local stub ai-service.
+
+Compares a fresh httpx.AsyncClient per request (the old behaviour: new pool,
+new TCP connection every call) with the shared pooled client created at
+startup (app/http_client.py).
+
+    python benchmarks/bench_ai_proxy.py [--requests 2000] [--concurrency 20]
+
+The stub listens on 127.0.0.1:8765 and answers /advice immediately, so the
+numbers measure proxy overhead, not model latency. No MongoDB needed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "api"))
+sys.path.insert(0, API_DIR)
+
+STUB_PORT = 8765
+os.environ.setdefault("AI_SERVICE_URL", f"http://127.0.0.1:{STUB_PORT}")
+
+from app.http_client import close_http_clients, get_ai_client, start_http_clients  # noqa: E402
+from app.main import app  # noqa: E402
+
+ADVICE_BODY = {
+    "user_id": "bench",
+    "question": "Can I afford a $50 dinner?",
+    "snapshot": {"month": "2025-03", "income": 3000.0, "expenses": [{"category": "Food", "amount": 120.0}]},
+}
+
+stub = FastAPI()
+
+
+@stub.post("/advice")
+async def stub_advice(body: dict):
+    return {"advice": "Yes, within your Food budget.", "question": body.get("question")}
+
+
+def run_stub():
+    config = uvicorn.Config(stub, host="127.0.0.1", port=STUB_PORT, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def per_request_client():
+    """The pre-pooling behaviour: a brand-new client (and connection) per call."""
+    async with httpx.AsyncClient() as client:
+        yield client
+
+
+async def drive(n_requests, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        async def one():
+            async with sem:
+                resp = await client.post("/ai/advice", json=ADVICE_BODY)
+                resp.raise_for_status()
+
+        # warm up
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(n_requests)))
+        return n_requests / (time.perf_counter() - start)
+
+
+async def main(n_requests, concurrency):
+    app.dependency_overrides[get_ai_client] = per_request_client
+    before = await drive(n_requests, concurrency)
+    app.dependency_overrides.clear()
+
+    await start_http_clients()
+    try:
+        after = await drive(n_requests, concurrency)
+    finally:
+        await close_http_clients()
+
+    print(f"{n_requests} requests, concurrency {concurrency}")
+    print(f"{'client':<24}{'req/s':>10}")
+    print(f"{'per-request (before)':<24}{before:>10.0f}")
+    print(f"{'shared pool (after)':<24}{after:>10.0f}")
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    server = run_stub()
+    try:
+        asyncio.run(main(args.requests, args.concurrency))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,133 @@
+"""
+Cost of validating a bulk-create body, from request bytes to documents.
+
+    python benchmarks/bench_bulk_validation.py [--sizes 1000 10000 50000] [--rounds 5] [--validate-only]
+
+Paths compared:
+    per-item models     json.loads, then ExpenseCreate(**row) for each row
+    adapter (python)    json.loads, then one TypeAdapter(list[...]).validate_python
+                        (roughly what FastAPI does for a List[...] body)
+    adapter (json)      validate_rows: one validate_json pass over the bytes
+                        (api/app/bulk.py, the /bulk endpoints)
+
+Each path also builds the documents with expense_doc, unless --validate-only. "peak MB" is the most
+memory tracemalloc saw in use during one call, request body excluded. No
+MongoDB needed.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from api.app.bulk import EXPENSE_ROWS, validate_rows  # noqa: E402
+from api.app.crud_routes import expense_doc  # noqa: E402
+from api.app.schemas import ExpenseCreate  # noqa: E402
+
+CATEGORIES = ("Groceries", "Rent", "Transport", "Dining", "Utilities", "Shopping")
+UID = ObjectId()
+make = lambda row: expense_doc(UID, row)  # noqa: E731
+
+
+def payload(n, seed=0):
+    """A /bulk request body: n rows with ISO dates, a few with notes."""
+    rng = random.Random(seed)
+    start = datetime(2025, 6, 30)
+    rows = []
+    for i in range(n):
+        row = {
+            "category": rng.choice(CATEGORIES),
+            "amount": round(rng.lognormvariate(3, 1), 2),
+            "date": (start - timedelta(days=i // 50)).isoformat(),
+        }
+        if i % 10 == 0:
+            row["note"] = "card"
+        rows.append(row)
+    return json.dumps(rows).encode()
+
+
+def per_item(body):
+    return [make(ExpenseCreate(**row)) for row in json.loads(body)]
+
+
+def adapter_python(body):
+    return [make(row) for row in EXPENSE_ROWS.validate_python(json.loads(body))]
+
+
+def adapter_json(body):
+    items, _, _ = validate_rows(EXPENSE_ROWS, body, len(body))
+    for i, item in enumerate(items):
+        items[i] = make(item)
+    return items
+
+
+PATHS = {
+    "per-item models": per_item,
+    "adapter (python)": adapter_python,
+    "adapter (json)": adapter_json,
+}
+
+
+def measure(fn, body, rounds):
+    """Seconds per call, each starting from a collected heap."""
+    times = []
+    for _ in range(rounds):
+        gc.collect()
+        start = time.perf_counter()
+        fn(body)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def peak_mb(fn, body):
+    tracemalloc.start()
+    try:
+        fn(body)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def comparable(docs):
+    if docs and not isinstance(docs[0], dict):
+        return [row.model_dump() for row in docs]
+    return [{k: v for k, v in doc.items() if k != "created_at"} for doc in docs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--validate-only", action="store_true", help="stop at the models")
+    args = parser.parse_args()
+
+    global make
+    if args.validate_only:
+        make = lambda row: row  # noqa: E731
+
+    print(f"{'path':<20}{'rows':>7}{'median ms':>11}{'per row us':>12}{'vs per-item':>13}{'peak MB':>9}")
+    for size in args.sizes:
+        body = payload(size)
+        # every path must produce the same documents
+        reference = comparable(per_item(body))
+        baseline = None
+        for name, fn in PATHS.items():
+            assert comparable(fn(body)) == reference, name
+            median = statistics.median(measure(fn, body, args.rounds))
+            baseline = baseline or median
+            print(f"{name:<20}{size:>7}{median * 1e3:>11.1f}{median / size * 1e6:>12.2f}"
+                  f"{baseline / median:>12.1f}x{peak_mb(fn, body):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Micro-benchmarks for the hot pure-Python paths, at several input sizes.
+
+    python benchmarks/bench_hot_paths.py                      # run all, save JSON
+    python benchmarks/bench_hot_paths.py --only dashboard_view prompt
+    python benchmarks/bench_hot_paths.py --compare benchmarks/results/<old>.json
+
+Cases (size = what grows):
+    compute_monthly_savings  months of aggregated totals coming back from Mongo
+    dashboard_view           budget categories and months of savings history
+    parse_category_budgets   categories in the budget form's categories_json
+    build_advice_prompt      budget categories in the prompt
+    to_response.<model>      documents converted for an API response
+
+Every (case, size) is run in `--rounds` timed rounds, each repeating the call
+enough times to last about `--min-time`. Results (min/median/mean/stddev per
+call, plus per-item time and a scaling exponent across sizes: ~1.0 is linear)
+are written to benchmarks/results/<commit>.json. `--compare` prints the change
+against an earlier file and exits non-zero if any median got slower by more
+than `--threshold`.
+
+compute_monthly_savings reads its totals from an in-memory stand-in for the
+two aggregate() calls, so only the Python side is timed here; see
+bench_monthly_savings.py for the database side. No MongoDB needed.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+os.environ.setdefault("MONGO_CREATE_INDEXES", "0")
+os.environ.setdefault("MAIL_OUTBOX_SENDER", "off")
+
+import app as flask_app  # noqa: E402
+from api.app.models import BudgetPlan, Expense, Income, User  # noqa: E402
+from services.advice import build_advice_prompt  # noqa: E402
+from services.budget_plans import parse_category_budgets  # noqa: E402
+from services.dashboard_view import dashboard_view  # noqa: E402
+from services.snapshot import DashboardSnapshot  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# ---- inputs ----
+def months_back(n, end=(2025, 6)):
+    year, month = end
+    keys = []
+    for _ in range(n):
+        keys.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys
+
+
+def category_names(n):
+    base = ["Rent", "Groceries", "Transport", "Entertainment", "Dining", "Utilities", "Shopping", "Health"]
+    return base[:n] + [f"Category {i}" for i in range(len(base), n)]
+
+
+def snapshot(n, rng):
+    names = category_names(n)
+    keys = months_back(n)
+    return DashboardSnapshot(
+        2025, 6,
+        plan={"total_budget": 100.0 * n, "category_budgets": {c: round(rng.uniform(20, 400), 2) for c in names}},
+        total_income=3200.0,
+        expense_by_category={c: round(rng.uniform(0, 450), 2) for c in names[: int(n * 0.8)]},
+        month_income={k: round(rng.uniform(2500, 4000), 2) for k in keys},
+        month_expense={k: round(rng.uniform(1500, 4500), 2) for k in keys},
+    )
+
+
+class _Aggregated:
+    """Stands in for one collection: aggregate() returns precomputed rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def aggregate(self, pipeline):
+        return iter(self.rows)
+
+
+class _TotalsDB:
+    def __init__(self, n, rng):
+        def rows():
+            return [{"_id": {"year": y, "month": m}, "total": round(rng.uniform(100, 4000), 2)}
+                    for y, m in months_back(n)]
+        self.incomes = _Aggregated(rows())
+        self.expenses = _Aggregated(rows())
+
+
+def expense_docs(n, rng):
+    uid, plan = ObjectId(), ObjectId()
+    return [Expense.create_expense_dict(uid, "Groceries", round(rng.uniform(1, 200), 2), False,
+                                        datetime(2025, 6, 1 + i % 28), 6, 2025, plan) | {"_id": ObjectId()}
+            for i in range(n)]
+
+
+def income_docs(n, rng):
+    uid = ObjectId()
+    return [Income.create_income_dict(uid, round(rng.uniform(100, 4000), 2), True,
+                                      datetime(2025, 6, 1 + i % 28), 6, 2025) | {"_id": ObjectId()}
+            for i in range(n)]
+
+
+def plan_docs(n, rng):
+    uid = ObjectId()
+    return [BudgetPlan.create_budget_plan_dict(uid, 1 + i % 12, 2000 + i // 12) | {"_id": ObjectId()}
+            for i in range(n)]
+
+
+def user_docs(n, rng):
+    return [User.create_user_dict(f"user{i}@example.com", "$2b$12$" + "x" * 53) | {"_id": ObjectId()}
+            for i in range(n)]
+
+
+# ---- cases ----
+# name -> (sizes, make(size, rng) -> (fn, fresh)); with fresh=True the input is
+# rebuilt (untimed) before every call because the function mutates it
+def _compute_monthly_savings(n, rng):
+    flask_app.db = _TotalsDB(n, rng)
+    uid = ObjectId()
+    # a user without rollups: the aggregate() path, and no users lookup
+    return (lambda: flask_app.compute_monthly_savings(uid, {"_id": uid})), None
+
+
+def _dashboard_view(n, rng):
+    snap = snapshot(n, rng)
+    return (lambda: dashboard_view(snap)), None
+
+
+def _parse_category_budgets(n, rng):
+    raw = json.dumps([{"category": c, "amount": f"{rng.uniform(10, 500):.2f}"} for c in category_names(n)])
+    return (lambda: parse_category_budgets(raw)), None
+
+
+def _build_advice_prompt(n, rng):
+    snap = snapshot(n, rng)
+    return (lambda: build_advice_prompt(snap, "Can I afford a $50 dinner?")), None
+
+
+def _to_response(model, docs):
+    def make(n, rng):
+        template = docs(n, rng)
+        # to_response edits the dict in place: convert fresh copies every call
+        return (lambda batch: [model.to_response(doc) for doc in batch]), (lambda: [dict(d) for d in template])
+    return make
+
+
+CASES = {
+    "compute_monthly_savings": ((12, 60, 240), _compute_monthly_savings),
+    "dashboard_view": ((10, 100, 1000), _dashboard_view),
+    "parse_category_budgets": ((10, 100, 1000), _parse_category_budgets),
+    "build_advice_prompt": ((10, 100, 1000), _build_advice_prompt),
+    "to_response.expense": ((100, 1000, 10000), _to_response(Expense, expense_docs)),
+    "to_response.income": ((100, 1000, 10000), _to_response(Income, income_docs)),
+    "to_response.budget_plan": ((100, 1000, 10000), _to_response(BudgetPlan, plan_docs)),
+    "to_response.user": ((100, 1000, 10000), _to_response(User, user_docs)),
+}
+
+
+# ---- runner ----
+def measure(fn, fresh, rounds, min_time):
+    """Seconds per call for each round."""
+    if fresh is None:
+        iterations = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            if time.perf_counter() - start >= min_time / 10 or iterations >= 1 << 20:
+                break
+            iterations *= 2
+        iterations = max(1, int(iterations * min_time / max(time.perf_counter() - start, 1e-9) / 10))
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            times.append((time.perf_counter() - start) / iterations)
+        return times, iterations
+
+    times = []
+    for _ in range(rounds):
+        batches = [fresh() for _ in range(3)]
+        start = time.perf_counter()
+        for batch in batches:
+            fn(batch)
+        times.append((time.perf_counter() - start) / len(batches))
+    return times, 3
+
+
+def run_case(name, sizes, make, rounds, min_time, seed):
+    rows = []
+    for size in sizes:
+        fn, fresh = make(size, random.Random(f"{seed}:{name}:{size}"))
+        times, iterations = measure(fn, fresh, rounds, min_time)
+        median = statistics.median(times)
+        rows.append({
+            "name": name,
+            "size": size,
+            "rounds": rounds,
+            "iterations": iterations,
+            "min": min(times),
+            "median": median,
+            "mean": statistics.fmean(times),
+            "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "ops": 1 / median,
+            "per_item_us": median / size * 1e6,
+        })
+    first, last = rows[0], rows[-1]
+    exponent = math.log(last["median"] / first["median"]) / math.log(last["size"] / first["size"])
+    for row in rows:
+        row["scaling"] = round(exponent, 2)
+    return rows
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, results, threshold):
+    with open(old_path) as f:
+        old = {(r["name"], r["size"]): r for r in json.load(f)["benchmarks"]}
+    print(f"\ncompared with {old_path} (regression = median slower by more than {threshold:.0%})")
+    print(f"{'case':<26}{'size':>7}{'old us':>11}{'new us':>11}{'change':>9}")
+    regressions = 0
+    for r in results:
+        before = old.get((r["name"], r["size"]))
+        if before is None:
+            continue
+        change = r["median"] / before["median"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{r['name']:<26}{r['size']:>7}{before['median'] * 1e6:>11.1f}{r['median'] * 1e6:>11.1f}"
+              f"{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", help="case names (prefixes) to run")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="where to save results (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    cases = {name: case for name, case in CASES.items()
+             if not args.only or any(name.startswith(prefix) for prefix in args.only)}
+    original_db = flask_app.db
+    results = []
+    print(f"{'case':<26}{'size':>7}{'median us':>12}{'stddev':>9}{'per item us':>13}{'scaling':>9}")
+    try:
+        for name, (sizes, make) in cases.items():
+            for r in run_case(name, sizes, make, args.rounds, args.min_time, args.seed):
+                results.append(r)
+                print(f"{name:<26}{r['size']:>7}{r['median'] * 1e6:>12.1f}{r['stddev'] / r['median']:>9.1%}"
+                      f"{r['per_item_us']:>13.3f}{r['scaling']:>9.2f}")
+    finally:
+        flask_app.db = original_db
+
+    commit = git_commit()
+    path = args.json or os.path.join(RESULTS_DIR, f"{commit or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "commit": commit,
+            "datetime": datetime.utcnow().isoformat(timespec="seconds"),
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+            "settings": {"rounds": args.rounds, "min_time": args.min_time, "seed": args.seed},
+            "benchmarks": results,
+        }, f, indent=2)
+    print(f"saved {path}")
+
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark /login throughput at several bcrypt cost settings.
+
+For each cost, a burst of logins runs from `--concurrency` threads through
+the Flask test client, while one more thread keeps fetching a cheap page
+(GET /login). Each cost runs twice: with one hash thread per request (the
+old inline behaviour) and with the bounded pool from services/passwords.py,
+to show how much the pool lets other requests through during a login storm.
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_login.py [--costs 10 11 12]
+
+Writes into the `budgetbaddie_bench` database and drops it afterwards.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+import app as flask_app  # noqa: E402
+from services.passwords import PasswordHasher  # noqa: E402
+
+EMAIL = "bench@example.com"
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def run(cost, n_requests, concurrency, workers):
+    flask_app.passwords = PasswordHasher(rounds=cost, max_workers=workers, max_queue=n_requests)
+    flask_app.db.users.delete_many({"email": EMAIL})
+    flask_app.db.users.insert_one({"email": EMAIL, "password": flask_app.passwords.hash(PASSWORD)})
+
+    app = flask_app.app
+    stop = threading.Event()
+    page_latencies = []
+
+    def cheap_pages():
+        client = app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get("/login")
+            page_latencies.append(time.perf_counter() - start)
+
+    def login(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post("/login", data={"email": EMAIL, "password": PASSWORD})
+        assert "/dashboard" in response.location, response.location
+        return time.perf_counter() - start
+
+    background = threading.Thread(target=cheap_pages, daemon=True)
+    background.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(login, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    background.join()
+
+    return {
+        "cost": cost,
+        "logins_per_s": n_requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 95),
+        "page_p95_ms": percentile(page_latencies, 95) if page_latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    flask_app.db = flask_app.client["budgetbaddie_bench"]
+    try:
+        print(f"{args.requests} logins, concurrency {args.concurrency}")
+        print(f"{'cost':>4}  {'hashing':<10}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'GET p95 ms':>12}")
+        for cost in args.costs:
+            for label, workers in (("inline", args.concurrency), (f"pool({args.workers})", args.workers)):
+                r = run(cost, args.requests, args.concurrency, workers)
+                print(f"{r['cost']:>4}  {label:<10}{r['logins_per_s']:>10.1f}{r['p50_ms']:>10.0f}"
+                      f"{r['p95_ms']:>10.0f}{r['page_p95_ms']:>12.1f}")
+    finally:
+        flask_app.client.drop_database("budgetbaddie_bench")
+
+
+if __name__ == "__main__":
+    main()
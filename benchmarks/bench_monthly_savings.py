@@ -0,0 +1,106 @@
+"""
+Benchmark compute_monthly_savings as a user's history grows.
+
+Compares the old approach (stream every income/expense into Python and sum there)
+with the server-side aggregation in services.savings.
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_monthly_savings.py
+
+Writes into the `budgetbaddie_bench` database and drops it afterwards.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.savings import monthly_totals, summarize_months
+
+SIZES = [1_000, 10_000, 50_000]
+REPEAT = 7
+MONTHS = 36
+
+
+def python_side_totals(db, uid):
+    """The pre-aggregation implementation, kept here as the baseline."""
+    month_income = defaultdict(float)
+    month_expense = defaultdict(float)
+    for inc in db.incomes.find({"user_id": uid}):
+        dt = inc.get("date")
+        if isinstance(dt, datetime):
+            month_income[(dt.year, dt.month)] += float(inc.get("amount") or 0)
+    for exp in db.expenses.find({"user_id": uid}):
+        dt = exp.get("date")
+        if isinstance(dt, datetime):
+            y, m = dt.year, dt.month
+        else:
+            y, m = exp.get("year"), exp.get("month")
+            if not y or not m:
+                continue
+        month_expense[(y, m)] += float(exp.get("amount") or 0)
+    return month_income, month_expense
+
+
+def seed(db, uid, n_docs, rng):
+    expenses, incomes = [], []
+    for i in range(n_docs):
+        y = 2022 + (i % MONTHS) // 12
+        m = (i % 12) + 1
+        dt = datetime(y, m, rng.randint(1, 28))
+        if i % 10 == 0:
+            incomes.append({"user_id": uid, "date": dt, "amount": round(rng.uniform(500, 3000), 2)})
+        elif i % 7 == 0:
+            # legacy expense shape: no date, only year/month
+            expenses.append({"user_id": uid, "year": y, "month": m, "amount": round(rng.uniform(1, 200), 2)})
+        else:
+            expenses.append({"user_id": uid, "date": dt, "year": y, "month": m,
+                             "amount": round(rng.uniform(1, 200), 2)})
+    if expenses:
+        db.expenses.insert_many(expenses, ordered=False)
+    if incomes:
+        db.incomes.insert_many(incomes, ordered=False)
+
+
+def timed(fn):
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = client["budgetbaddie_bench"]
+    db.expenses.create_index([("user_id", 1), ("year", 1), ("month", 1)])
+    db.incomes.create_index([("user_id", 1), ("date", 1)])
+    rng = random.Random(42)
+
+    print(f"{'docs':>8} | {'python-side ms':>15} | {'aggregation ms':>15}")
+    print("-" * 45)
+    try:
+        for n_docs in SIZES:
+            uid = ObjectId()
+            seed(db, uid, n_docs, rng)
+
+            _, expected = summarize_months(*python_side_totals(db, uid))
+            _, actual = summarize_months(*monthly_totals(db, uid))
+            assert round(expected, 2) == round(actual, 2)
+
+            old_ms = timed(lambda: python_side_totals(db, uid))
+            new_ms = timed(lambda: monthly_totals(db, uid))
+            print(f"{n_docs:>8} | {old_ms:>15.2f} | {new_ms:>15.2f}")
+    finally:
+        client.drop_database("budgetbaddie_bench")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Per-item cost of turning a page of expense documents into a JSON response.
+
+    python benchmarks/bench_serialization.py [--sizes 100 1000 10000] [--rounds 7]
+
+Paths compared, each from the documents a find() returns to response bytes:
+    response_model        to_response() per item, then validate and dump the
+                          ExpensePage with Pydantic (what FastAPI does for a
+                          route with response_model in current versions)
+    response_model+json   the same, dumped to Python and through json.dumps
+                          (older FastAPI)
+    fast (orjson)         DocumentSerializer + orjson (api/app/responses.py)
+    fast (json)           DocumentSerializer + the stdlib fallback
+
+No MongoDB needed.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pydantic import TypeAdapter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from api.app import responses  # noqa: E402
+from api.app.models import Expense  # noqa: E402
+from api.app.responses import DocumentSerializer, dumps  # noqa: E402
+from api.app.schemas import ExpensePage, ExpenseResponse  # noqa: E402
+
+CATEGORIES = ("Groceries", "Rent", "Transport", "Dining", "Utilities", "Shopping")
+
+
+def expense_docs(n, seed=0):
+    """Documents as find() returns them: naive datetimes, ObjectIds."""
+    rng = random.Random(seed)
+    uid = ObjectId()
+    start = datetime(2025, 6, 30)
+    docs = []
+    for i in range(n):
+        dt = start - timedelta(days=i // 5)
+        docs.append({
+            "_id": ObjectId(),
+            "user_id": uid,
+            "category": rng.choice(CATEGORIES),
+            "amount": round(rng.lognormvariate(3, 1), 2),
+            "is_recurring": rng.random() < 0.1,
+            "date": dt,
+            "month": dt.month,
+            "year": dt.year,
+            "note": "",
+            "created_at": dt + timedelta(hours=rng.randint(8, 20)),
+        })
+    return docs
+
+
+PAGE = TypeAdapter(ExpensePage)
+FAST = DocumentSerializer(ExpenseResponse, object_ids=("user_id", "budget_plan_id"))
+
+
+def response_model(docs):
+    page = PAGE.validate_python({"items": [Expense.to_response(doc) for doc in docs], "next_cursor": None})
+    return PAGE.dump_json(page)
+
+
+def response_model_json(docs):
+    page = PAGE.validate_python({"items": [Expense.to_response(doc) for doc in docs], "next_cursor": None})
+    return json.dumps(PAGE.dump_python(page, mode="json"), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast(docs):
+    return dumps({"items": FAST.many(docs), "next_cursor": None})
+
+
+def fast_stdlib(docs):
+    saved, responses.orjson = responses.orjson, None
+    try:
+        return fast(docs)
+    finally:
+        responses.orjson = saved
+
+
+PATHS = {
+    "response_model": response_model,
+    "response_model+json": response_model_json,
+    "fast (orjson)": fast,
+    "fast (json)": fast_stdlib,
+}
+
+
+def measure(fn, template, rounds):
+    """Seconds per call; every call gets fresh dict copies, made outside the timing."""
+    times = []
+    for _ in range(rounds):
+        batch = [dict(doc) for doc in template]
+        start = time.perf_counter()
+        fn(batch)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    if responses.orjson is None:
+        print("orjson is not installed: the fast (orjson) row measures the stdlib fallback")
+    print(f"{'path':<22}{'items':>7}{'median ms':>11}{'per item us':>13}{'vs response_model':>19}")
+    for size in args.sizes:
+        template = expense_docs(size)
+        # every path must produce the same JSON
+        reference = json.loads(response_model([dict(doc) for doc in template]))
+        baseline = None
+        for name, fn in PATHS.items():
+            assert json.loads(fn([dict(doc) for doc in template])) == reference, name
+            median = statistics.median(measure(fn, template, args.rounds))
+            baseline = baseline or median
+            print(f"{name:<22}{size:>7}{median * 1e3:>11.2f}{median / size * 1e6:>13.2f}"
+                  f"{baseline / median:>18.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measure web app startup: how long `import app` takes and how long the first
+request after it takes, each in a fresh Python process.
+
+    python benchmarks/bench_startup.py [--runs 5] [--path /login]
+
+Imports run with MONGO_CREATE_INDEXES=0 by default, so the numbers don't
+depend on how far away MongoDB is (pass --with-indexes to include index
+setup). No MongoDB needed for the default /login page.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = """
+import json, sys, threading, time
+start = time.perf_counter()
+import app as flask_app
+imported = time.perf_counter()
+threads = threading.active_count()
+client = flask_app.app.test_client()
+response = client.get(sys.argv[1])
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first - imported) * 1000,
+    "second_request_ms": (second - first) * 1000,
+    "status": response.status_code,
+    "gemini_sdk_loaded": "google.generativeai" in sys.modules,
+    "threads_after_import": threads,
+}))
+"""
+
+
+def probe(path, with_indexes):
+    env = {**os.environ, "SECRET_KEY": "bench", "MAIL_OUTBOX_SENDER": "off",
+           "MONGO_CREATE_INDEXES": "1" if with_indexes else "0"}
+    out = subprocess.check_output([sys.executable, "-W", "ignore", "-c", PROBE, path], cwd=ROOT, env=env, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/login")
+    parser.add_argument("--with-indexes", action="store_true")
+    args = parser.parse_args()
+
+    runs = [probe(args.path, args.with_indexes) for _ in range(args.runs)]
+    print(f"{args.runs} fresh processes, GET {args.path} (status {runs[0]['status']})")
+    for key in ("import_ms", "first_request_ms", "second_request_ms"):
+        values = [r[key] for r in runs]
+        print(f"{key:<20}median {statistics.median(values):8.1f}   min {min(values):8.1f}")
+    print(f"Gemini SDK imported: {runs[0]['gemini_sdk_loaded']}; "
+          f"threads after import: {runs[0]['threads_after_import']} (Mongo monitors start with the client)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Load-test the web app and the API with a realistic mix of requests.
+
+Seeds synthetic users (api/scripts/synthetic_data.py), starts the Flask app
+and the FastAPI service as subprocesses with a stubbed model, then runs
+`--concurrency` virtual users for `--duration` seconds. Each one logs in as
+its own synthetic user and keeps picking from the mix: dashboard views,
+added expenses, re-logins, advice from the web app (AI_FAKE_LATENCY model)
+and advice through the API (a local stub ai-service with the same latency).
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/load_test.py \\
+        [--users 200 --months 12] [--concurrency 16 --duration 30] [--workers 2 --threads 8] \\
+        [--mix dashboard=55,add_expense=20,login=10,web_advice=10,api_advice=5] [--json out.json]
+
+`login_page` (GET /login, no MongoDB) measures the server alone: with a mix
+of only it, nothing is seeded and no MongoDB is needed, e.g.
+
+    python benchmarks/load_test.py --mix login_page=1 --concurrency 16 --duration 8 --workers 2 --threads 8
+
+Prints p50/p95/p99 latency and throughput per request type. Pass
+`--web-url` / `--api-url` to test servers you started yourself (then seed
+with synthetic_data.py first, or let this script seed with the same
+MONGO_URI). `--db` and `--domain` mean what they do in synthetic_data.py.
+
+If users at `--domain` already exist (say, from synthetic_data.py), they are
+used as they are: nothing is seeded and nothing is removed. Otherwise the
+users this run seeds are removed at the end unless --keep-data.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from pymongo import MongoClient
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from api.scripts.synthetic_data import (  # noqa: E402
+    CATEGORIES,
+    DEFAULT_DOMAIN,
+    DEFAULT_PASSWORD,
+    SyntheticData,
+    at_domain,
+    password_hash,
+    remove,
+    write,
+)
+
+DEFAULT_MIX = "dashboard=55,add_expense=20,login=10,web_advice=10,api_advice=5"
+QUESTIONS = (
+    "Can I afford a $50 dinner this week?",
+    "Where am I overspending this month?",
+    "How much should I save from my next paycheck?",
+)
+WEB_PORT, API_PORT, STUB_PORT = 5055, 8055, 8765
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise SystemExit(f"unknown request types in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+# ---- servers ----
+def run_stub_ai_service(latency):
+    stub = FastAPI()
+
+    @stub.post("/advice")
+    async def stub_advice(body: dict):
+        import asyncio
+        await asyncio.sleep(latency)
+        return {"advice": "Fake advice: spend less than you earn.", "question": body.get("question")}
+
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=STUB_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def spawn(args, cwd, env, ready_url, timeout=60):
+    process = subprocess.Popen(args, cwd=cwd, env={**os.environ, **env},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{' '.join(args)} exited with {process.returncode}")
+        try:
+            if httpx.get(ready_url, timeout=1).status_code < 500:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"{ready_url} did not come up within {timeout}s")
+
+
+def start_web(model_latency, bcrypt_rounds, workers=None, threads=None):
+    if workers:
+        # the production server (gunicorn.conf.py) with this many workers x threads
+        args = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{WEB_PORT}",
+                "--workers", str(workers), "--threads", str(threads)]
+    else:
+        args = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(WEB_PORT), "--with-threads"]
+    return spawn(
+        args,
+        cwd=ROOT,
+        env={"AI_FAKE_LATENCY": str(model_latency), "MAIL_OUTBOX_SENDER": "off", "WEB_ACCESS_LOG": "",
+             "PASSWORD_BCRYPT_ROUNDS": str(bcrypt_rounds), "SECRET_KEY": "load-test"},
+        ready_url=f"http://127.0.0.1:{WEB_PORT}/login",
+    )
+
+
+def start_api():
+    return spawn(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(API_PORT), "--log-level", "warning"],
+        cwd=os.path.join(ROOT, "api"),
+        env={"AI_SERVICE_URL": f"http://127.0.0.1:{STUB_PORT}"},
+        ready_url=f"http://127.0.0.1:{API_PORT}/health",
+    )
+
+
+# ---- request types ----
+def login(vu):
+    vu.web.cookies.clear()
+    resp = vu.web.post("/login", data={"email": vu.email, "password": vu.password})
+    return resp.status_code == 302 and "/dashboard" in resp.headers.get("location", "")
+
+
+def login_page(vu):
+    return vu.web.get("/login").status_code == 200
+
+
+def dashboard(vu):
+    return vu.web.get("/dashboard").status_code == 200
+
+
+def add_expense(vu):
+    name, _, median, sigma = vu.rng.choice(CATEGORIES)
+    resp = vu.web.post("/expenses/add", data={
+        "date": date.today().replace(day=vu.rng.randint(1, date.today().day)).isoformat(),
+        "category": name,
+        "amount": f"{vu.rng.lognormvariate(0, sigma) * median:.2f}",
+        "note": "load test",
+    })
+    return resp.status_code == 302 and "/dashboard" in resp.headers.get("location", "")
+
+
+def web_advice(vu):
+    resp = vu.web.post("/ai/advice", json={"question": vu.rng.choice(QUESTIONS)})
+    return resp.status_code == 200
+
+
+def api_advice(vu):
+    resp = vu.api.post("/ai/advice", json={
+        "user_id": vu.email,
+        "question": vu.rng.choice(QUESTIONS),
+        "snapshot": {"month": date.today().strftime("%Y-%m"), "income": 3200.0,
+                     "expenses": [{"category": "Groceries", "amount": 320.0}]},
+    })
+    return resp.status_code == 200
+
+
+ACTIONS = {
+    "login": login,
+    "login_page": login_page,
+    "dashboard": dashboard,
+    "add_expense": add_expense,
+    "web_advice": web_advice,
+    "api_advice": api_advice,
+}
+# request types that need the seeded users (and so MongoDB) and a logged-in session
+NEEDS_LOGIN = {"login", "dashboard", "add_expense", "web_advice"}
+
+
+class VirtualUser:
+    def __init__(self, index, web_url, api_url, email, password, seed):
+        self.rng = random.Random(f"{seed}:vu:{index}")
+        self.email = email
+        self.password = password
+        self.web = httpx.Client(base_url=web_url, timeout=60)
+        self.api = httpx.Client(base_url=api_url, timeout=60)
+
+    def close(self):
+        self.web.close()
+        self.api.close()
+
+
+def run_load(vus, mix, duration):
+    names, weights = list(mix), list(mix.values())
+    results = {name: {"latencies": [], "errors": 0} for name in ACTIONS}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def record(name, ok, elapsed):
+        with lock:
+            results[name]["latencies"].append(elapsed)
+            if not ok:
+                results[name]["errors"] += 1
+
+    def loop(vu):
+        name = "login" if NEEDS_LOGIN & set(mix) else vu.rng.choices(names, weights)[0]
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = ACTIONS[name](vu)
+            except httpx.HTTPError:
+                ok = False
+            record(name, ok, time.perf_counter() - start)
+            name = vu.rng.choices(names, weights)[0]
+
+    threads = [threading.Thread(target=loop, args=(vu,)) for vu in vus]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    rows = {}
+    everything = []
+    for name, r in results.items():
+        if not r["latencies"]:
+            continue
+        everything += r["latencies"]
+        rows[name] = {
+            "requests": len(r["latencies"]),
+            "errors": r["errors"],
+            "req_per_s": len(r["latencies"]) / elapsed,
+            "p50_ms": percentile(r["latencies"], 50),
+            "p95_ms": percentile(r["latencies"], 95),
+            "p99_ms": percentile(r["latencies"], 99),
+        }
+    rows["all"] = {
+        "requests": len(everything),
+        "errors": sum(r["errors"] for r in results.values()),
+        "req_per_s": len(everything) / elapsed,
+        "p50_ms": percentile(everything, 50),
+        "p95_ms": percentile(everything, 95),
+        "p99_ms": percentile(everything, 99),
+    }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default="budgetbaddie", help="the database the servers read")
+    parser.add_argument("--domain", default=DEFAULT_DOMAIN)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="the synthetic users' password")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--model-latency", type=float, default=0.2, help="seconds per stubbed model answer")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, help="run the web app under gunicorn with this many workers "
+                                                    "(default: the single-process flask server)")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument("--web-url", help="use a running web app instead of starting one")
+    parser.add_argument("--api-url", help="use a running API instead of starting one")
+    parser.add_argument("--no-seed", action="store_true", help="the synthetic users already exist")
+    parser.add_argument("--keep-data", action="store_true")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    seeded = bool(NEEDS_LOGIN & set(mix)) and not args.no_seed
+
+    mongo = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    db = mongo[args.db]
+    if seeded and db.users.find_one(at_domain(args.domain), {"_id": 1}):
+        # someone else's dataset: log in as its users, and leave it alone
+        print(f"users at {args.domain} already exist; not seeding")
+        seeded = False
+    if seeded:
+        data = SyntheticData(args.users, args.months, args.seed, domain=args.domain,
+                             password=password_hash(args.password, args.bcrypt_rounds))
+        started = time.perf_counter()
+        counts = write(db, data)
+        print(f"seeded {', '.join(f'{n} {name}' for name, n in counts.items())} "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    stub = run_stub_ai_service(args.model_latency)
+    servers = []
+    try:
+        if not args.web_url:
+            servers.append(start_web(args.model_latency, args.bcrypt_rounds, args.workers, args.threads))
+        if not args.api_url and mix.get("api_advice"):
+            servers.append(start_api())
+    except BaseException:
+        for process in servers:
+            process.terminate()
+        raise
+    web_url = args.web_url or f"http://127.0.0.1:{WEB_PORT}"
+    api_url = args.api_url or f"http://127.0.0.1:{API_PORT}"
+
+    data = SyntheticData(args.users, args.months, args.seed, domain=args.domain)
+    vus = [VirtualUser(i, web_url, api_url, data.email(i % args.users), args.password, args.seed)
+           for i in range(args.concurrency)]
+    try:
+        results, elapsed = run_load(vus, mix, args.duration)
+    finally:
+        for vu in vus:
+            vu.close()
+        for process in servers:
+            process.terminate()
+            process.wait()
+        stub.should_exit = True
+        if seeded and not args.keep_data:
+            # only this run's users were at the domain
+            remove(db, args.domain)
+        mongo.close()
+
+    rows = summarize(results, elapsed)
+    server = f"gunicorn {args.workers}x{args.threads}" if args.workers and not args.web_url else "web app"
+    print(f"{args.concurrency} virtual users, {elapsed:.0f}s, {args.users} users x {args.months} months, "
+          f"model latency {args.model_latency}s, {server}")
+    print(f"{'request':<12}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, r in rows.items():
+        print(f"{name:<12}{r['requests']:>8}{r['errors']:>8}{r['req_per_s']:>9.1f}"
+              f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
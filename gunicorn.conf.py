@@ -0,0 +1,36 @@
+"""
+Production server settings for the web app (gunicorn reads this file from
+the working directory):
+
+    gunicorn app:app
+
+WEB_WORKERS processes, each serving WEB_THREADS requests at a time. The app
+is imported once in the master (preload_app) and forked, which is safe since
+create_app() starts nothing: every worker builds its own MongoClient, thread
+pools and outbox sender after the fork (services/lazy.py). Size the Mongo
+pool per worker: MONGO_MAX_POOL_SIZE >= WEB_THREADS + AI_WORKERS + 1 keeps
+request threads from queueing for a connection.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_WORKERS", "2"))
+threads = int(os.getenv("WEB_THREADS", "8"))
+worker_class = "gthread"
+preload_app = True
+
+# advice requests wait up to AI_MAX_WAIT (25s) for Gemini
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # connect before taking traffic so the first requests don't pay for it
+    # (and so /ready reflects a pool that exists); with MONGO_MIN_POOL_SIZE
+    # the client opens that many connections in the background
+    from app import client
+    client.get()
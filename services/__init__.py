@@ -0,0 +1,10 @@
+from .dashboard_view import dashboard_view
+from .savings import monthly_totals, summarize_months
+from .snapshot import DashboardSnapshot
+
+__all__ = [
+    "DashboardSnapshot",
+    "dashboard_view",
+    "monthly_totals",
+    "summarize_months",
+]
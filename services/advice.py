@@ -0,0 +1,186 @@
+"""
+Prompt building and model helpers for /ai/advice.
+"""
+import json
+import time
+from types import SimpleNamespace
+
+from .cache import SingleFlight, TTLCache
+from .fragments import fingerprint
+
+ADVICE_MODEL = "gemini-2.0-flash-exp"
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation don't change the answer."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def advice_cache_key(user_id, snapshot, question):
+    """
+    Hash of the normalized question plus every number the prompt is built
+    from, so any change to the user's month data gives a new key.
+    """
+    return fingerprint({
+        "user_id": str(user_id),
+        "year": snapshot.year,
+        "month": snapshot.month,
+        "total_income": snapshot.total_income,
+        "category_budgets": snapshot.category_budgets,
+        "total_budget": snapshot.total_budget,
+        "expense_by_category": snapshot.expense_by_category,
+        "question": normalize_question(question),
+    })
+
+
+class AdviceCache:
+    """
+    TTL/LRU cache of advice responses ({"advice", "context"}) with
+    single-flight: concurrent misses for the same key share one upstream call.
+    A ttl of 0 disables it.
+    """
+
+    def __init__(self, maxsize=512, ttl=600.0):
+        self.enabled = ttl > 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flight = SingleFlight()
+
+    def get(self, key):
+        return self._cache.get(key) if self.enabled else None
+
+    def set(self, key, value):
+        if self.enabled:
+            self._cache.set(key, value)
+
+    def generate(self, key, generate):
+        """
+        Call `generate()` and cache its result; concurrent calls for the same
+        key wait for the first one instead of calling upstream again. Callers
+        check get() first.
+        """
+        if not self.enabled:
+            return generate()
+
+        def fill():
+            result = generate()
+            self._cache.set(key, result)
+            return result
+
+        return self._flight.do(key, fill)[0]
+
+    def stats(self):
+        """hits / misses (coalesced callers count as misses too) / coalesced / size."""
+        return {**self._cache.stats(), "coalesced": self._flight.shared}
+
+    def clear(self):
+        self._cache.clear()
+
+
+def build_advice_prompt(snapshot, question):
+    """
+    Build the Gemini prompt for `question` from a DashboardSnapshot.
+    Returns (prompt, context) where context is the summary sent back to the client.
+    """
+    total_income = snapshot.total_income
+    total_budget = snapshot.total_budget
+    category_budgets = snapshot.category_budgets
+    expense_by_category = snapshot.expense_by_category
+    total_spent = snapshot.total_spent
+    remaining_budget = total_budget - total_spent
+    savings = total_income - total_budget
+
+    prompt = f"""You are a helpful financial advisor. Analyze this user's budget and provide practical advice.
+
+Current Financial Situation:
+- Monthly Income: ${total_income:.2f}
+- Total Budget: ${total_budget:.2f}
+- Total Spent This Month: ${total_spent:.2f}
+- Remaining Budget: ${remaining_budget:.2f}
+- Savings/Buffer: ${savings:.2f}
+
+Budget by Category:
+"""
+    for category, budget_amount in category_budgets.items():
+        spent = expense_by_category.get(category, 0)
+        remaining = budget_amount - spent
+        prompt += f"- {category}: ${budget_amount:.2f} budgeted, ${spent:.2f} spent, ${remaining:.2f} remaining\n"
+
+    prompt += f"\nUser Question: {question}\n\nProvide clear, actionable advice. Be concise but helpful. If they're asking about a purchase, tell them if they can afford it and suggest which category it should come from."
+
+    context = {
+        "total_income": total_income,
+        "total_budget": total_budget,
+        "total_spent": total_spent,
+        "remaining_budget": remaining_budget,
+    }
+    return prompt, context
+
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event with a JSON payload."""
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def stream_advice(model, prompt, context, on_complete=None, on_error=None):
+    """
+    Generate advice with the model's streaming API and yield it as SSE:
+    a `context` event right away, one message per text chunk, then `done`
+    (or `error` if the model fails part-way). `on_complete` gets the full
+    text once the model has finished, `on_error` the exception if it failed.
+    """
+    yield sse_event(context, event="context")
+    parts = []
+    try:
+        for chunk in model.generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "")
+            if text:
+                parts.append(text)
+                yield sse_event({"text": text})
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        yield sse_event({"error": f"AI service error: {str(e)}"}, event="error")
+        return
+    if on_complete is not None:
+        on_complete("".join(parts))
+    yield sse_event({}, event="done")
+
+
+def replay_advice(cached):
+    """SSE for an already generated (cached) answer, same events as stream_advice."""
+    yield sse_event(cached["context"], event="context")
+    yield sse_event({"text": cached["advice"]})
+    yield sse_event({}, event="done")
+
+
+class FakeAdviceModel:
+    """
+    Offline stand-in for genai.GenerativeModel, for tests and load tests.
+    Takes `latency` seconds to answer with canned text; with stream=True the
+    text comes back in `chunks` pieces spread over that latency.
+    """
+
+    def __init__(self, latency=0.0, text="Fake advice: spend less than you earn.", chunks=4):
+        self.latency = latency
+        self.text = text
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(text=self.text)
+
+    def _stream(self):
+        words = self.text.split(" ")
+        size = max(1, -(-len(words) // self.chunks))
+        pieces = [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+        for i, piece in enumerate(pieces):
+            if self.latency:
+                time.sleep(self.latency / len(pieces))
+            yield SimpleNamespace(text=piece if i == 0 else " " + piece)
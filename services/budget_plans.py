@@ -0,0 +1,27 @@
+"""
+Parsing for the monthly budget form (save_budget_plan).
+"""
+import json
+
+
+def parse_category_budgets(raw):
+    """
+    The form's `categories_json` ([{"category": ..., "amount": ...}, ...]) as
+    {category: amount}. Bad JSON gives {}, an unparsable amount counts as 0,
+    rows without a name are dropped and a repeated name keeps the last amount.
+    """
+    try:
+        categories_list = json.loads(raw or "[]")
+    except json.JSONDecodeError:
+        return {}
+
+    category_budgets = {}
+    for item in categories_list:
+        name = item.get("category")
+        try:
+            amount = float(item.get("amount", 0) or 0)
+        except ValueError:
+            amount = 0
+        if name:
+            category_budgets[name] = amount
+    return category_budgets
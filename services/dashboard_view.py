@@ -0,0 +1,83 @@
+"""
+View model for dashboard.html.
+
+Every number the template shows (totals, per-category progress, savings
+status) is computed here once from a DashboardSnapshot, so the template only
+formats values and never re-aggregates.
+"""
+
+# view fields each cached fragment depends on (see services/fragments.py):
+# every `view.<field>` its partial reads, so a change to any of them re-renders it
+SAVINGS_FIELDS = ("monthly_savings", "total_savings")
+BUDGET_OVERVIEW_FIELDS = (
+    "year", "month", "total_income", "total_budget", "total_spent",
+    "remaining_budget", "planned_savings", "actual_savings", "status_class", "status_text",
+    "category_budgets", "expense_by_category", "category_rows",
+)
+
+
+def category_status(budget, spent):
+    """(percentage, status_class, status_text) for one budget category."""
+    percentage = spent / budget * 100 if budget > 0 else 0
+    if percentage <= 90:
+        return percentage, "status-under", "Under Budget"
+    if percentage <= 100:
+        return percentage, "status-close", "Close to Budget"
+    return percentage, "status-over", "Over Budget!"
+
+
+def overall_status(total_income, total_budget, total_spent):
+    """(css_class, label) for the income tracker's status card."""
+    remaining = total_budget - total_spent
+    if total_spent > total_income:
+        return "status-warning", "⚠️ Overspending!"
+    if total_spent > total_budget:
+        return "status-warning", "⚠️ Over Budget!"
+    if 0 <= remaining < total_budget * 0.1:
+        return "status-close", "⚡ Tight Budget"
+    if total_income - total_budget < 0:
+        return "status-warning", "⚠️ Budget Exceeds Income!"
+    return "status-good", "✓ Healthy"
+
+
+def dashboard_view(snapshot):
+    """Everything the budget-vs-expenses and savings parts of the dashboard render."""
+    total_income = snapshot.total_income
+    total_budget = snapshot.total_budget
+    expense_by_category = snapshot.expense_by_category
+    total_spent = snapshot.total_spent
+
+    category_rows = []
+    for category, budget in snapshot.category_budgets.items():
+        spent = expense_by_category.get(category, 0)
+        percentage, status_class, status_text = category_status(budget, spent)
+        category_rows.append({
+            "category": category,
+            "budget": budget,
+            "spent": spent,
+            "percentage": percentage,
+            "bar_width": min(percentage, 100),
+            "status_class": status_class,
+            "status_text": status_text,
+        })
+
+    monthly_savings, total_savings = snapshot.monthly_savings()
+    status_class, status_text = overall_status(total_income, total_budget, total_spent)
+
+    return {
+        "year": snapshot.year,
+        "month": snapshot.month,
+        "total_income": total_income,
+        "total_budget": total_budget,
+        "total_spent": total_spent,
+        "remaining_budget": total_budget - total_spent,
+        "planned_savings": total_income - total_budget,
+        "actual_savings": total_income - total_spent,
+        "status_class": status_class,
+        "status_text": status_text,
+        "category_budgets": snapshot.category_budgets,
+        "expense_by_category": expense_by_category,
+        "category_rows": category_rows,
+        "monthly_savings": monthly_savings,
+        "total_savings": total_savings,
+    }
@@ -0,0 +1,33 @@
+"""
+Cache for rendered HTML fragments of the dashboard.
+
+Entries are keyed per fragment, user and month and tagged with a digest of
+the view-model data the fragment was rendered from. When that month's data
+changes (an expense is added, the plan is edited, ...) the digest no longer
+matches and the fragment is re-rendered, so no write path has to remember to
+invalidate anything, and it works the same across processes.
+"""
+import hashlib
+import json
+
+
+def fingerprint(data):
+    raw = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def cached_fragment(cache, key, data, render, ttl=None):
+    """
+    Return the cached HTML for `key` if it was rendered from the same `data`,
+    otherwise call `render()` and cache the result for `ttl` seconds. `cache`
+    is a TTLCache, or None to always render.
+    """
+    if cache is None:
+        return render()
+    digest = fingerprint(data)
+    hit = cache.get(key)
+    if hit is not None and hit[0] == digest:
+        return hit[1]
+    html = render()
+    cache.set(key, (digest, html), ttl)
+    return html
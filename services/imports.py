@@ -0,0 +1,295 @@
+"""
+Streaming import of bank statements (CSV / OFX) into expenses and incomes.
+
+Rows are parsed one at a time from the uploaded file, built with the same
+`Expense.create_expense_dict` / `Income.create_income_dict` helpers as the
+API, and written in `insert_many(ordered=False)` batches, so memory stays
+flat however long the statement is. Rows that can't be parsed are skipped
+and reported back with their line number; the rest are still imported.
+
+CSV files need a header with at least a date and an amount column (or
+debit/credit columns); category, note/description and type are optional.
+Without a type column, negative amounts are expenses and positive ones
+incomes, unless the caller forces every row to one kind.
+"""
+import codecs
+import csv
+import io
+import re
+from datetime import date, datetime
+
+from pymongo.errors import BulkWriteError
+
+from api.app.models import Expense, Income
+
+from .rollups import record_many
+
+AUTO = "auto"
+EXPENSE = "expense"
+INCOME = "income"
+KINDS = (AUTO, EXPENSE, INCOME)
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 100
+
+# header name (lower-case) -> field
+CSV_COLUMNS = {
+    "date": "date", "posted": "date", "posting date": "date", "transaction date": "date",
+    "amount": "amount",
+    "debit": "debit", "withdrawal": "debit",
+    "credit": "credit", "deposit": "credit",
+    "category": "category",
+    "note": "note", "description": "note", "memo": "note", "payee": "note", "name": "note",
+    "source": "note",
+    "type": "type", "kind": "type",
+}
+INCOME_TYPES = {"income", "credit", "deposit", "cr", "dep"}
+EXPENSE_TYPES = {"expense", "debit", "withdrawal", "payment", "dr"}
+DATE_FORMATS = ("%m/%d/%Y", "%Y/%m/%d", "%m/%d/%y")
+
+_OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+_OFX_END = re.compile(r"</STMTTRN>", re.IGNORECASE)
+_OFX_START = re.compile(r"<STMTTRN>", re.IGNORECASE)
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_date(value):
+    value = (value or "").strip()
+    if not value:
+        raise RowError("missing date")
+    if len(value) >= 8 and value[:8].isdigit():
+        # OFX: YYYYMMDD[HHMMSS[.XXX]][TZ]
+        value = f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+    try:
+        d = date.fromisoformat(value[:10])
+    except ValueError:
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        raise RowError(f"invalid date {value!r}")
+    return datetime(d.year, d.month, d.day)
+
+
+def parse_amount(value):
+    raw = (value or "").strip()
+    text = raw.replace("$", "").replace(",", "").replace(" ", "")
+    negative = text.startswith("(") and text.endswith(")")
+    if negative:
+        text = text[1:-1]
+    try:
+        amount = float(text)
+    except ValueError:
+        raise RowError(f"invalid amount {raw!r}")
+    return -amount if negative else amount
+
+
+def _text_stream(stream, encoding="utf-8-sig"):
+    """Decode a binary upload lazily, line by line."""
+    try:
+        return io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    except AttributeError:
+        # file-likes without readable()/seekable() (older SpooledTemporaryFile)
+        return codecs.getreader(encoding)(stream, errors="replace")
+
+
+def iter_csv(stream):
+    """Yield (line_no, record) for each data row of a CSV statement."""
+    reader = csv.reader(_text_stream(stream))
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("empty file")
+    columns = {}
+    for i, name in enumerate(header):
+        field = CSV_COLUMNS.get(name.strip().lower())
+        if field and field not in columns:
+            columns[field] = i
+    if "date" not in columns or not ({"amount", "debit", "credit"} & columns.keys()):
+        raise ValueError("CSV needs a date column and an amount (or debit/credit) column")
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        record = {field: row[i] if i < len(row) else "" for field, i in columns.items()}
+        yield reader.line_num, record
+
+
+def _csv_amount(record):
+    if record.get("amount", "").strip():
+        return parse_amount(record["amount"])
+    credit = parse_amount(record["credit"]) if record.get("credit", "").strip() else 0.0
+    debit = parse_amount(record["debit"]) if record.get("debit", "").strip() else 0.0
+    if not credit and not debit:
+        raise RowError("missing amount")
+    return credit - abs(debit)
+
+
+def iter_ofx(stream, chunk_size=64 * 1024):
+    """
+    Yield (n, record) for each <STMTTRN> of an OFX/QFX statement (SGML or XML
+    flavour), reading the file in chunks.
+    """
+    text = _text_stream(stream, encoding="utf-8")
+    buffer = ""
+    n = 0
+    while True:
+        chunk = text.read(chunk_size)
+        buffer += chunk
+        while True:
+            end = _OFX_END.search(buffer)
+            if not end:
+                break
+            block = buffer[:end.start()]
+            buffer = buffer[end.end():]
+            start = None
+            for start in _OFX_START.finditer(block):
+                pass
+            if start is None:
+                continue
+            fields = {tag.upper(): value.strip() for tag, value in _OFX_FIELD.findall(block[start.end():])}
+            n += 1
+            yield n, {
+                "date": fields.get("DTPOSTED", ""),
+                "amount": fields.get("TRNAMT", ""),
+                "note": fields.get("NAME") or fields.get("MEMO") or "",
+            }
+        if not chunk:
+            return
+        # keep only the unfinished transaction (or nothing) between chunks
+        last = None
+        for last in _OFX_START.finditer(buffer):
+            pass
+        buffer = buffer[last.start():] if last else buffer[-16:]
+
+
+def _row_kind(record, amount, kind):
+    if kind != AUTO:
+        return kind
+    row_type = (record.get("type") or "").strip().lower()
+    if row_type in INCOME_TYPES:
+        return INCOME
+    if row_type in EXPENSE_TYPES:
+        return EXPENSE
+    return EXPENSE if amount < 0 else INCOME
+
+
+def build_document(user_id, record, kind=AUTO):
+    """Return (kind, document) for one parsed row; raises RowError."""
+    dt = parse_date(record.get("date"))
+    amount = _csv_amount(record)
+    if amount == 0:
+        raise RowError("zero amount")
+    row_kind = _row_kind(record, amount, kind)
+    note = (record.get("note") or "").strip()
+
+    if row_kind == EXPENSE:
+        doc = Expense.create_expense_dict(
+            user_id, (record.get("category") or "").strip() or "Other",
+            abs(amount), False, dt, dt.month, dt.year,
+        )
+        doc["note"] = note
+    else:
+        doc = Income.create_income_dict(user_id, abs(amount), False, dt, dt.month, dt.year)
+        doc["source"] = note
+        doc["note"] = ""
+    return row_kind, doc
+
+
+class StatementImport:
+    """
+    One import run for one user. Feed it (line_no, record) pairs with run();
+    it keeps a pending batch per collection and flushes each at `batch_size`.
+    """
+
+    def __init__(self, db, user_id, kind=AUTO, batch_size=BATCH_SIZE, max_errors=MAX_ERRORS):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        self.db = db
+        self.user_id = user_id
+        self.kind = kind
+        self.batch_size = max(1, batch_size)
+        self.max_errors = max_errors
+        self.pending = {EXPENSE: [], INCOME: []}
+        self.inserted = {EXPENSE: 0, INCOME: 0}
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": line_no, "error": message})
+
+    def add(self, line_no, record):
+        self.rows += 1
+        try:
+            row_kind, doc = build_document(self.user_id, record, self.kind)
+        except RowError as e:
+            self.error(line_no, str(e))
+            return
+        batch = self.pending[row_kind]
+        batch.append((line_no, doc))
+        if len(batch) >= self.batch_size:
+            self.flush(row_kind)
+
+    def flush(self, row_kind):
+        batch = self.pending[row_kind]
+        if not batch:
+            return
+        self.pending[row_kind] = []
+        collection = self.db.expenses if row_kind == EXPENSE else self.db.incomes
+        docs = [doc for _, doc in batch]
+        failed = set()
+        try:
+            collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # ordered=False: every other document in the batch was still written
+            for err in e.details.get("writeErrors", []):
+                failed.add(err["index"])
+                self.error(batch[err["index"]][0], err.get("errmsg", "write failed"))
+        written = [doc for i, doc in enumerate(docs) if i not in failed]
+        self.inserted[row_kind] += len(written)
+        if row_kind == EXPENSE:
+            record_many(self.db, expenses=written)
+        else:
+            record_many(self.db, incomes=written)
+
+    def run(self, records):
+        for line_no, record in records:
+            self.add(line_no, record)
+        self.flush(EXPENSE)
+        self.flush(INCOME)
+        return self.summary()
+
+    def summary(self):
+        return {
+            "rows": self.rows,
+            "inserted": {"expenses": self.inserted[EXPENSE], "incomes": self.inserted[INCOME]},
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def detect_format(filename, requested=None):
+    if requested:
+        requested = requested.lower()
+        if requested not in ("csv", "ofx"):
+            raise ValueError("format must be csv or ofx")
+        return requested
+    name = (filename or "").lower()
+    return "ofx" if name.endswith((".ofx", ".qfx")) else "csv"
+
+
+def import_statement(db, user_id, stream, fmt="csv", kind=AUTO, batch_size=BATCH_SIZE, max_errors=MAX_ERRORS):
+    """
+    Import a CSV or OFX statement from a binary stream for `user_id`.
+    Raises ValueError if the file as a whole can't be read (bad header,
+    unknown format); per-row problems end up in the returned summary.
+    """
+    job = StatementImport(db, user_id, kind=kind, batch_size=batch_size, max_errors=max_errors)
+    records = iter_ofx(stream) if fmt == "ofx" else iter_csv(stream)
+    return job.run(records)
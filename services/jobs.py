@@ -0,0 +1,181 @@
+"""
+Bounded background job queue for slow upstream calls (Gemini).
+
+A fixed pool of worker threads runs the jobs; at most `max_workers +
+max_queue` jobs are in flight. When that is reached, `policy` decides:
+"reject" raises QueueFull (the route answers 503 + Retry-After) and
+"caller_runs" runs the job in the calling thread instead.
+
+Threads can't be cancelled, so a job not finished `timeout` seconds after it
+was submitted is reported as "timeout" and its late result is dropped; it
+keeps its slot until the call actually returns, so in-flight work stays
+bounded.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .lazy import after_fork
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+TIMEOUT = "timeout"
+
+POLICIES = ("reject", "caller_runs")
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the queue is full and policy is "reject"."""
+
+    def __init__(self, retry_after):
+        super().__init__("job queue is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, owner, timeout, clock):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created_at = clock()
+        self.started_at = None
+        self.finished_at = None
+        self._timeout = timeout
+        self._clock = clock
+        self._done = threading.Event()
+
+    def _check_timeout(self):
+        if self.status in (PENDING, RUNNING) and self._clock() - self.created_at > self._timeout:
+            self.status = TIMEOUT
+            self.finished_at = self._clock()
+            self._done.set()
+
+    def wait(self, timeout=None):
+        """Block up to `timeout` seconds for the job to finish (long polling)."""
+        self._check_timeout()
+        remaining = max(0.0, self._timeout - (self._clock() - self.created_at))
+        wait_for = remaining if timeout is None else min(timeout, remaining)
+        self._done.wait(wait_for)
+        self._check_timeout()
+        return self.status
+
+    @property
+    def finished(self):
+        return self.status in (DONE, ERROR, TIMEOUT)
+
+
+class JobQueue:
+    """See the module docstring. The thread pool is only started on the first submit."""
+
+    def __init__(self, max_workers=4, max_queue=16, timeout=30.0, policy="reject",
+                 result_ttl=300.0, clock=time.monotonic):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}, expected one of {POLICIES}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.policy = policy
+        self.result_ttl = result_ttl
+        self._clock = clock
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        after_fork(self._after_fork)
+
+    def _after_fork(self):
+        # the parent's worker threads don't exist in a forked child
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="jobs")
+            return self._executor
+
+    def _execute(self, job, fn, args, kwargs):
+        if job.status == TIMEOUT:
+            return
+        job.status = RUNNING
+        job.started_at = self._clock()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if job.status == RUNNING:
+                job.error = str(e)
+                job.status = ERROR
+        else:
+            # a job that timed out meanwhile keeps its TIMEOUT status
+            if job.status == RUNNING:
+                job.result = result
+                job.status = DONE
+        job.finished_at = job.finished_at or self._clock()
+        job._done.set()
+
+    def _run(self, job, fn, args, kwargs):
+        try:
+            self._execute(job, fn, args, kwargs)
+        finally:
+            self._slots.release()
+
+    def submit(self, fn, *args, owner=None, **kwargs):
+        """Queue fn(*args, **kwargs); returns the Job. Raises QueueFull when full and policy is "reject"."""
+        self._prune()
+        job = Job(owner, self.timeout, self._clock)
+
+        if not self._slots.acquire(blocking=False):
+            if self.policy == "reject":
+                raise QueueFull(retry_after=max(1, int(self.timeout / 2)))
+            # caller_runs: back-pressure by doing the work in the request thread
+            self._store(job)
+            self._execute(job, fn, args, kwargs)
+            return job
+
+        self._store(job)
+        self._pool().submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _store(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id, owner=None):
+        """The job, or None if it is unknown, expired or belongs to someone else."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        job._check_timeout()
+        return job
+
+    def _prune(self):
+        now = self._clock()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and now - job.finished_at > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {status: 0 for status in (PENDING, RUNNING, DONE, ERROR, TIMEOUT)}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,101 @@
+"""
+Process resources that are only created when first used, and created again
+in each forked child.
+
+A MongoClient starts monitor threads and opens sockets as soon as it is
+built, and must not be shared across fork(): a pre-fork server (gunicorn)
+that imports the app in the master would hand every worker the same client.
+`ForkSafeClient` builds the client on first use in each process and forgets
+it in the child after a fork, so every worker gets its own client and pool.
+It also stands in for the client itself (`client["db"]`, `client.drop_database`),
+and `client.database(name)` gives a Database stand-in for module globals like
+`db`.
+
+`after_fork(obj.method)` registers a reset for objects that own threads or
+locks (thread pools), without keeping `obj` alive.
+"""
+import os
+import threading
+import weakref
+
+
+def after_fork(method):
+    """Call the bound `method` in the child after every fork, while its object is alive."""
+    ref = weakref.WeakMethod(method)
+
+    def callback():
+        bound = ref()
+        if bound is not None:
+            bound()
+
+    os.register_at_fork(after_in_child=callback)
+
+
+class ForkSafeClient:
+    def __init__(self, factory, on_connect=None):
+        self._factory = factory
+        self._on_connect = on_connect
+        self._client = None
+        self._lock = threading.Lock()
+        after_fork(self._forget)
+
+    @property
+    def created(self):
+        return self._client is not None
+
+    def get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    client = self._factory()
+                    if self._on_connect is not None:
+                        self._on_connect(client)
+                    self._client = client
+                client = self._client
+        return client
+
+    def _forget(self):
+        # the parent's client (sockets, monitor threads) is unusable here; don't close it,
+        # that would talk over sockets the parent still owns
+        self._client = None
+        self._lock = threading.Lock()
+
+    def database(self, name):
+        return LazyDatabase(self, name)
+
+    def __getitem__(self, name):
+        return self.get()[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class LazyDatabase:
+    """`client.get()[name]`, resolved on every access so it follows the client across forks."""
+
+    def __init__(self, client, name):
+        self._client = client
+        self._cached = (None, None)
+        self.name = name
+
+    def _database(self):
+        client = self._client.get()
+        owner, database = self._cached
+        if owner is not client:
+            database = client[self.name]
+            self._cached = (client, database)
+        return database
+
+    def __getitem__(self, collection):
+        return self._database()[collection]
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._database(), attr)
+
+    def __repr__(self):
+        return f"LazyDatabase({self.name!r})"
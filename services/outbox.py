@@ -0,0 +1,347 @@
+"""
+Email outbox: requests store a message document and return; a background
+sender delivers it.
+
+Each message goes through these states:
+
+    pending -> sending -> sent
+                       -> pending (retry later, exponential backoff)
+                       -> failed  (after `max_attempts`, or a 5xx reply)
+
+Senders claim one message at a time with find_one_and_update, so several
+threads (or processes, e.g. `flask --app app send-outbox`) can drain the
+same outbox. A claim is a lease: if a sender dies mid-send, any sender still
+running puts the message back to pending once `lease` seconds have passed
+(each drain pass reclaims expired claims, at most once per lease). Every sender thread keeps
+one SMTP connection open and reuses it for consecutive messages, so
+`concurrency` also caps the open SMTP connections.
+
+Bodies can hold secrets (a password reset link), so they are removed once a
+message is sent or has failed, and a message enqueued with `expires_at` is
+dropped, unsent, once that time passes.
+
+stats() feeds every /metrics scrape, so the queue depths it reads from
+MongoDB (one aggregate over the status index) are reused for `stats_ttl`
+seconds; the in-process counters are always current.
+"""
+import random
+import smtplib
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from pymongo import ReturnDocument
+
+from api.app.metrics import UPSTREAM_SECONDS
+
+COLLECTION = "outbox"
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def enqueue(db, to, subject, body, now=None, expires_at=None):
+    """Store a message for the sender; returns its id. It isn't sent after `expires_at`."""
+    now = now or datetime.utcnow()
+    return db[COLLECTION].insert_one({
+        "to": to,
+        "subject": subject,
+        "body": body,
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "locked_until": None,
+        "last_error": None,
+        "created_at": now,
+        "expires_at": expires_at,
+        "sent_at": None,
+    }).inserted_id
+
+
+class SmtpSettings(namedtuple("SmtpSettings", "host port use_tls use_ssl username password sender timeout")):
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            host=config.get("MAIL_SERVER") or "localhost",
+            port=int(config.get("MAIL_PORT") or 25),
+            use_tls=bool(config.get("MAIL_USE_TLS")),
+            use_ssl=bool(config.get("MAIL_USE_SSL")),
+            username=config.get("MAIL_USERNAME"),
+            password=config.get("MAIL_PASSWORD"),
+            sender=config.get("MAIL_DEFAULT_SENDER") or config.get("MAIL_USERNAME") or "noreply@localhost",
+            timeout=float(config.get("MAIL_TIMEOUT") or 10),
+        )
+
+
+class SmtpConnection:
+    """One SMTP session reused across messages; reopened when dropped or idle too long."""
+
+    def __init__(self, settings, idle_timeout=60.0, clock=time.monotonic):
+        self.settings = settings
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._smtp = None
+        self._last_used = 0.0
+        self.opened = 0
+
+    def _open(self):
+        s = self.settings
+        smtp_class = smtplib.SMTP_SSL if s.use_ssl else smtplib.SMTP
+        smtp = smtp_class(s.host, s.port, timeout=s.timeout)
+        if s.use_tls and not s.use_ssl:
+            smtp.starttls()
+        if s.username and s.password:
+            smtp.login(s.username, s.password)
+        self._smtp = smtp
+        self.opened += 1
+
+    def send(self, message):
+        if self._smtp is not None and self._clock() - self._last_used > self.idle_timeout:
+            self.close()
+        if self._smtp is None:
+            self._open()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped our idle connection; one fresh try
+            self.close()
+            self._open()
+            self._smtp.send_message(message)
+        self._last_used = self._clock()
+
+    def close_if_idle(self):
+        if self._smtp is not None and self._clock() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+class OutboxSender:
+    """
+    Drains the outbox. `get_db` is called for every query so the app can
+    swap its database (tests). Threads start on the first notify()/start().
+    """
+
+    def __init__(self, get_db, settings, concurrency=1, max_attempts=5, backoff=30.0,
+                 max_backoff=3600.0, lease=120.0, poll_interval=5.0, idle_timeout=60.0,
+                 stats_ttl=10.0, now=datetime.utcnow, connection_factory=SmtpConnection,
+                 clock=time.monotonic):
+        self.get_db = get_db
+        self.settings = settings
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.stats_ttl = stats_ttl
+        self.now = now
+        self.connection_factory = connection_factory
+        self._clock = clock
+        self._depths = (None, None)  # (read at, counts) for stats()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._counts = {"sent": 0, "retried": 0, "failed": 0}
+        self._next_reclaim = 0.0
+        self._send_ms = deque(maxlen=500)
+        self._delivery_ms = deque(maxlen=500)
+
+    # ---- claiming and sending ----
+    def claim(self):
+        now = self.now()
+        return self.get_db()[COLLECTION].find_one_and_update(
+            {"status": PENDING, "next_attempt_at": {"$lte": now}},
+            {"$set": {"status": SENDING, "locked_until": now + timedelta(seconds=self.lease)}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def reclaim_stale(self):
+        """Put messages whose sender died mid-send back in the queue."""
+        return self.get_db()[COLLECTION].update_many(
+            {"status": SENDING, "locked_until": {"$lt": self.now()}},
+            {"$set": {"status": PENDING, "locked_until": None}},
+        ).modified_count
+
+    def reclaim_if_due(self):
+        """reclaim_stale(), at most once per `lease` across this sender's threads."""
+        with self._lock:
+            if time.monotonic() < self._next_reclaim:
+                return 0
+            self._next_reclaim = time.monotonic() + self.lease
+        return self.reclaim_stale()
+
+    def build_message(self, doc):
+        message = EmailMessage()
+        message["From"] = self.settings.sender
+        message["To"] = doc["to"]
+        message["Subject"] = doc["subject"]
+        message.set_content(doc["body"])
+        return message
+
+    def retry_delay(self, attempts):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def process(self, connection, doc):
+        """Send one claimed message and record the outcome. Returns True if it was delivered."""
+        collection = self.get_db()[COLLECTION]
+        expires_at = doc.get("expires_at")
+        if expires_at is not None and expires_at <= self.now():
+            collection.update_one({"_id": doc["_id"]}, {
+                "$set": {"status": FAILED, "locked_until": None, "last_error": "expired before it was sent"},
+                "$unset": {"body": ""},
+            })
+            with self._lock:
+                self._counts["failed"] += 1
+            return False
+
+        started = time.perf_counter()
+        try:
+            connection.send(self.build_message(doc))
+        except (smtplib.SMTPException, OSError) as e:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, "smtp", "error")
+            connection.close()
+            attempts = doc.get("attempts", 0) + 1
+            update = {"attempts": attempts, "locked_until": None, "last_error": str(e)[:500]}
+            permanent = getattr(e, "smtp_code", 0) >= 500  # e.g. 550 no such mailbox
+            if permanent or attempts >= self.max_attempts:
+                update["status"] = FAILED
+                outcome = "failed"
+            else:
+                update["status"] = PENDING
+                update["next_attempt_at"] = self.now() + timedelta(seconds=self.retry_delay(attempts))
+                outcome = "retried"
+            change = {"$set": update}
+            if outcome == "failed":
+                change["$unset"] = {"body": ""}
+            collection.update_one({"_id": doc["_id"]}, change)
+            with self._lock:
+                self._counts[outcome] += 1
+            return False
+
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, "smtp", "ok")
+        sent_at = self.now()
+        collection.update_one({"_id": doc["_id"]}, {
+            "$set": {
+                "status": SENT, "sent_at": sent_at, "locked_until": None,
+                "attempts": doc.get("attempts", 0) + 1,
+            },
+            "$unset": {"body": ""},
+        })
+        with self._lock:
+            self._counts["sent"] += 1
+            self._send_ms.append((time.perf_counter() - started) * 1000)
+            self._delivery_ms.append((sent_at - doc["created_at"]).total_seconds() * 1000)
+        return True
+
+    def drain(self, connection=None, limit=None):
+        """Send every due message in the calling thread; returns how many were processed."""
+        own = connection is None
+        connection = connection or self.connection_factory(self.settings, idle_timeout=self.idle_timeout)
+        processed = 0
+        try:
+            self.reclaim_if_due()
+            while limit is None or processed < limit:
+                if self._stop.is_set():
+                    break
+                doc = self.claim()
+                if doc is None:
+                    break
+                self.process(connection, doc)
+                processed += 1
+        finally:
+            if own:
+                connection.close()
+        return processed
+
+    # ---- background threads ----
+    def _worker(self):
+        connection = self.connection_factory(self.settings, idle_timeout=self.idle_timeout)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.drain(connection)
+                except Exception as e:  # keep the thread alive on database hiccups
+                    print("OUTBOX ERROR:", e)
+                connection.close_if_idle()
+                if self._wake.wait(self.poll_interval):
+                    self._wake.clear()
+        finally:
+            connection.close()
+
+    def start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._worker, name=f"outbox-sender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        """A message was just enqueued: start the senders if needed and wake one up."""
+        self.start()
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ---- observability ----
+    def depths(self):
+        """Messages per unfinished status, read at most once per `stats_ttl` seconds."""
+        read_at, depths = self._depths
+        if read_at is not None and self._clock() - read_at < self.stats_ttl:
+            return depths
+        by_status = {PENDING: 0, SENDING: 0, FAILED: 0}
+        for row in self.get_db()[COLLECTION].aggregate([
+            {"$match": {"status": {"$in": list(by_status)}}},
+            {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+        ]):
+            by_status[row["_id"]] = row["n"]
+        depths = {"depth": by_status[PENDING], "in_flight": by_status[SENDING], "failed_total": by_status[FAILED]}
+        self._depths = (self._clock(), depths)
+        return depths
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            send_ms = sorted(self._send_ms)
+            delivery_ms = sorted(self._delivery_ms)
+        return {
+            **self.depths(),
+            "senders": sum(t.is_alive() for t in self._threads),
+            **counts,
+            "send_ms": _summary(send_ms),
+            "delivery_ms": _summary(delivery_ms),
+        }
+
+
+def _summary(sorted_values):
+    if not sorted_values:
+        return {"count": 0, "avg": None, "p95": None}
+    p95 = sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * 0.95))]
+    return {
+        "count": len(sorted_values),
+        "avg": round(sum(sorted_values) / len(sorted_values), 1),
+        "p95": round(p95, 1),
+    }
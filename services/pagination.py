@@ -0,0 +1,23 @@
+"""
+Keyset pagination for the web app's listings. The cursor format and the
+filter are shared with the API and live in api/app/pagination.py.
+"""
+from api.app.pagination import (  # noqa: F401
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    SORT,
+    clamp_page_size,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    split_page,
+)
+
+
+def fetch_page(collection, base_filter, cursor=None, limit=PAGE_SIZE, projection=None):
+    docs = list(
+        collection.find(keyset_filter(base_filter, cursor), projection)
+        .sort(SORT)
+        .limit(limit + 1)
+    )
+    return split_page(docs, limit)
@@ -0,0 +1,117 @@
+"""
+Password hashing on a small dedicated thread pool.
+
+Hashing is slow on purpose. Running it inline let a burst of logins occupy
+every request thread, so here at most `max_workers` hashes run at once
+(bcrypt and hashlib's scrypt/pbkdf2 release the GIL while they work). Up to
+`max_queue` more wait for a slot. Anything beyond that raises QueueFull so
+the route can answer straight away instead of queueing forever.
+
+`scheme` is "bcrypt" (cost = `rounds`) or any werkzeug method string
+("scrypt", "pbkdf2:sha256:600000", ...). Hashes made with another scheme or
+cost still verify; `needs_rehash` tells the login route to upgrade them.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .jobs import QueueFull
+from .lazy import after_fork
+
+BCRYPT = "bcrypt"
+# bcrypt only looks at the first 72 bytes (bcrypt>=5 raises instead of ignoring the rest)
+BCRYPT_MAX_BYTES = 72
+
+
+def is_bcrypt(stored):
+    return stored.startswith(("$2b$", "$2a$", "$2y$"))
+
+
+def _bcrypt_secret(password):
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+
+class PasswordHasher:
+    def __init__(self, scheme=BCRYPT, rounds=12, max_workers=2, max_queue=32, retry_after=1):
+        self.scheme = scheme
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._werkzeug_prefix = None
+        self.rejected = 0
+        after_fork(self._after_fork)
+
+    def _after_fork(self):
+        # the parent's pool threads don't exist in a forked child
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+
+    # ---- the actual work (runs on the pool) ----
+    def _hash(self, password):
+        if self.scheme == BCRYPT:
+            salt = bcrypt.gensalt(rounds=self.rounds)
+            return bcrypt.hashpw(_bcrypt_secret(password), salt).decode("ascii")
+        return generate_password_hash(password, method=self.scheme)
+
+    @staticmethod
+    def _verify(stored, password):
+        if not stored:
+            return False
+        if is_bcrypt(stored):
+            try:
+                return bcrypt.checkpw(_bcrypt_secret(password), stored.encode("ascii"))
+            except ValueError:  # malformed hash
+                return False
+        return check_password_hash(stored, password)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise QueueFull(self.retry_after)
+        try:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="password-hash")
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    # ---- public API (blocks the caller until the pool is done) ----
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def verify(self, stored, password):
+        return self._run(self._verify, stored, password)
+
+    def needs_rehash(self, stored):
+        """True if `stored` was made with another scheme or cost than the configured one."""
+        if not stored:
+            return False
+        if self.scheme == BCRYPT:
+            if not is_bcrypt(stored):
+                return True
+            return int(stored.split("$")[2]) != self.rounds
+        if is_bcrypt(stored):
+            return True
+        return stored.split("$", 1)[0] != self._target_prefix()
+
+    def _target_prefix(self):
+        # werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1"),
+        # so read them back from a real hash once
+        if self._werkzeug_prefix is None:
+            self._werkzeug_prefix = self.hash("").split("$", 1)[0]
+        return self._werkzeug_prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
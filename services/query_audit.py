@@ -0,0 +1,117 @@
+"""
+Explain every query shape the web routes issue and flag collection scans.
+
+Shapes are built from the same helpers the routes use (DashboardSnapshot's
+pipeline, the rollup filter, ...), so a new query that isn't covered by
+api/app/indexes.py shows up here as a COLLSCAN.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+
+from bson.objectid import ObjectId
+
+from .exports import SOURCES as EXPORT_SOURCES
+from .pagination import SORT as PAGE_SORT, encode_cursor, keyset_filter
+from .reset_tokens import hash_token
+from .snapshot import DashboardSnapshot
+
+QueryShape = namedtuple("QueryShape", "label collection filter pipeline sort", defaults=(None, None, None))
+
+
+def query_shapes():
+    uid = ObjectId()
+    today = date.today()
+    year, month = today.year, today.month
+    month_filter = {"user_id": uid, "year": year, "month": month}
+
+    shapes = [
+        QueryShape("signup/login/forgot_password: user by email", "users", {"email": "someone@example.com"}),
+        QueryShape("get_current_user: user by id", "users", {"_id": uid}),
+        QueryShape("reset_password: live token by hash", "password_reset_tokens",
+                   {"token_hash": hash_token("token"), "expires_at": {"$gt": datetime.utcnow()}}),
+        QueryShape("save_budget_plan: month plan", "budget_plans", month_filter),
+        QueryShape("delete_expense: own expense", "expenses", {"_id": ObjectId(), "user_id": uid}),
+        QueryShape("rollups: month $inc", "monthly_rollups", month_filter),
+        QueryShape("outbox: claim due message", "outbox",
+                   {"status": "pending", "next_attempt_at": {"$lte": datetime.utcnow()}},
+                   sort=[("next_attempt_at", 1)]),
+    ]
+
+    # /api/expenses and /api/incomes: a later page of the keyset listing
+    cursor = encode_cursor({"_id": ObjectId(), "date": datetime(year, month, 1)})
+    month_start = datetime(year, month, 1)
+    for label, collection, base_filter in (
+        ("list_expenses_api: month page", "expenses", month_filter),
+        ("list_expenses_api: page", "expenses", {"user_id": uid}),
+        ("list_incomes_api: month page", "incomes", {"user_id": uid, "date": {"$gte": month_start}}),
+    ):
+        shapes.append(QueryShape(label, collection, keyset_filter(base_filter, cursor), sort=PAGE_SORT))
+
+    # /api/export: one full-history cursor per collection
+    for name, (_, collection, _, _, sort) in EXPORT_SOURCES.items():
+        shapes.append(QueryShape(f"export_history_api: {name}", collection, {"user_id": uid}, sort=sort))
+
+    for kind, user in (("raw", {"_id": uid}), ("rollups", {"_id": uid, "rollups_ready": True})):
+        pipeline = DashboardSnapshot.pipeline(user, year, month)
+        outer = [stage for stage in pipeline if "$lookup" not in stage]
+        shapes.append(QueryShape(f"DashboardSnapshot ({kind})", "users", pipeline=outer))
+        # $lookup sub-pipelines don't show up in the outer plan; explain each on its own
+        for stage in pipeline:
+            lookup = stage.get("$lookup")
+            if lookup:
+                shapes.append(QueryShape(
+                    f"DashboardSnapshot ({kind}): {lookup['as']}",
+                    lookup["from"],
+                    pipeline=lookup["pipeline"],
+                ))
+    return shapes
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def winning_plan_stages(explain):
+    """Every stage name that appears in a winning plan of an explain() result."""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield from _plan_stages(value)
+            else:
+                yield from winning_plan_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from winning_plan_stages(item)
+
+
+def explain_shape(db, shape):
+    if shape.pipeline is not None:
+        return db.command("aggregate", shape.collection, pipeline=shape.pipeline, explain=True)
+    cursor = db[shape.collection].find(shape.filter or {})
+    if shape.sort:
+        cursor = cursor.sort(shape.sort)
+    return cursor.explain()
+
+
+def audit_queries(db, shapes=None):
+    """
+    Explain each query shape. Returns a list of
+    {"label", "collection", "stages", "collscan"} dicts, one per shape.
+    """
+    results = []
+    for shape in shapes or query_shapes():
+        stages = list(winning_plan_stages(explain_shape(db, shape)))
+        results.append({
+            "label": shape.label,
+            "collection": shape.collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
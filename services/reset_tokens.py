@@ -0,0 +1,61 @@
+"""
+Password reset tokens, kept in their own collection.
+
+Only a SHA-256 of the token is stored, so a leaked database dump can't be
+used to reset anyone's password. `token_hash` has a unique index and
+`user_id` a unique one too: issuing a new token replaces the user's previous
+one, so each user has at most one live link. A TTL index on `expires_at`
+lets Mongo delete expired tokens on its own. Lookups also check
+`expires_at`, because the TTL monitor only runs about once a minute.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from .savings import _as_object_id
+
+COLLECTION = "password_reset_tokens"
+TOKEN_TTL = 3600
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue_token(db, user_id, ttl=TOKEN_TTL, now=None):
+    """Create a token for `user_id` (replacing any earlier one) and return it in plain text."""
+    now = now or datetime.utcnow()
+    token = secrets.token_urlsafe(32)
+    uid = _as_object_id(user_id)
+    doc = {
+        "user_id": uid,
+        "token_hash": hash_token(token),
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=ttl),
+    }
+    try:
+        db[COLLECTION].replace_one({"user_id": uid}, doc, upsert=True)
+    except DuplicateKeyError:
+        # two requests for the same user raced to insert; the row exists now
+        db[COLLECTION].replace_one({"user_id": uid}, doc)
+    return token
+
+
+def find_token(db, token, now=None):
+    """The user id a live token belongs to, or None."""
+    doc = db[COLLECTION].find_one(
+        {"token_hash": hash_token(token), "expires_at": {"$gt": now or datetime.utcnow()}},
+        {"user_id": 1},
+    )
+    return doc["user_id"] if doc else None
+
+
+def consume_token(db, token, now=None):
+    """Delete a live token and return its user id (None if invalid); each token works once."""
+    doc = db[COLLECTION].find_one_and_delete(
+        {"token_hash": hash_token(token), "expires_at": {"$gt": now or datetime.utcnow()}},
+        projection={"user_id": 1},
+    )
+    return doc["user_id"] if doc else None
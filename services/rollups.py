@@ -0,0 +1,241 @@
+"""
+Per-user, per-month rollups kept up to date by every write path.
+
+One document per (user_id, year, month):
+
+    {user_id, year, month, income_total, expense_total,
+     category_spent: {<category>: amount}, updated_at}
+
+Writes `$inc` the matching document (upserting it), so reads cost O(months)
+instead of O(expenses + incomes). A user only reads from rollups once
+`rollups_ready` is set on their user document: new signups get it straight
+away, existing users get it from `rebuild_rollups`.
+"""
+from datetime import datetime
+
+from pymongo import ReplaceOne
+
+from api.app.indexes import INDEXES
+from api.app.rollups import (  # noqa: F401
+    COLLECTION,
+    category_key,
+    category_name,
+    expense_month,
+    income_month,
+    rollup_updates,
+)
+
+from .savings import HAS_MONTH, _as_object_id, expense_month_fields
+
+
+def rollups_ready(user):
+    return bool(user and user.get("rollups_ready"))
+
+
+def _inc(db, user_id, year, month, fields):
+    db[COLLECTION].update_one(
+        {"user_id": user_id, "year": year, "month": month},
+        {"$inc": fields, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def record_income(db, income, sign=1):
+    """Apply an inserted (sign=1) or removed (sign=-1) income to its month's rollup."""
+    ym = income_month(income)
+    if not ym:
+        return
+    amount = float(income.get("amount") or 0) * sign
+    _inc(db, income["user_id"], ym[0], ym[1], {"income_total": amount})
+
+
+def record_expense(db, expense, sign=1):
+    """Apply an inserted (sign=1) or removed (sign=-1) expense to its month's rollup."""
+    ym = expense_month(expense)
+    if not ym:
+        return
+    amount = float(expense.get("amount") or 0) * sign
+    _inc(db, expense["user_id"], ym[0], ym[1], {
+        "expense_total": amount,
+        f"category_spent.{category_key(expense.get('category'))}": amount,
+    })
+
+
+def record_many(db, expenses=(), incomes=()):
+    """
+    Apply a batch of inserted expenses and incomes with one upsert per
+    (user, month) touched instead of one per document (bulk import).
+    """
+    ops = rollup_updates(expenses, incomes)
+    if ops:
+        db[COLLECTION].bulk_write(ops, ordered=False)
+
+
+def _cents(value):
+    # repeated +/- $inc on floats drifts by tiny amounts; money only needs cents
+    return round(float(value or 0), 2)
+
+
+def month_rollup(db, user_id, year, month):
+    """
+    Return {"income_total", "expense_total", "expense_by_category"} for one month.
+    Missing months read as zeros.
+    """
+    doc = db[COLLECTION].find_one(
+        {"user_id": _as_object_id(user_id), "year": year, "month": month}
+    ) or {}
+    return rollup_view(doc)
+
+
+def rollup_view(doc):
+    expense_by_category = {}
+    for key, amount in (doc.get("category_spent") or {}).items():
+        amount = _cents(amount)
+        if amount:
+            expense_by_category[category_name(key)] = amount
+    return {
+        "income_total": _cents(doc.get("income_total")),
+        "expense_total": _cents(doc.get("expense_total")),
+        "expense_by_category": expense_by_category,
+    }
+
+
+def monthly_totals_from_rollups(db, user_id):
+    """Same shape as savings.monthly_totals, read from the rollup collection."""
+    month_income, month_expense = {}, {}
+    docs = db[COLLECTION].find(
+        {"user_id": _as_object_id(user_id)},
+        {"year": 1, "month": 1, "income_total": 1, "expense_total": 1},
+    )
+    for doc in docs:
+        key = (doc["year"], doc["month"])
+        month_income[key] = _cents(doc.get("income_total"))
+        month_expense[key] = _cents(doc.get("expense_total"))
+    return month_income, month_expense
+
+
+def ensure_rollup_indexes(db):
+    db[COLLECTION].create_indexes(INDEXES[COLLECTION])
+
+
+def _raw_rollups(db, user_ids):
+    """Recompute rollup documents for `user_ids` from the raw collections."""
+    rollups = {}
+
+    def doc_for(uid, year, month):
+        key = (uid, year, month)
+        if key not in rollups:
+            rollups[key] = {
+                "user_id": uid, "year": year, "month": month,
+                "income_total": 0.0, "expense_total": 0.0, "category_spent": {},
+            }
+        return rollups[key]
+
+    incomes = db.incomes.aggregate([
+        {"$match": {"user_id": {"$in": user_ids}, "date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "year": {"$year": "$date"}, "month": {"$month": "$date"}},
+            "total": {"$sum": "$amount"},
+        }},
+    ])
+    for row in incomes:
+        key = row["_id"]
+        doc_for(key["user_id"], key["year"], key["month"])["income_total"] += float(row["total"] or 0)
+
+    expenses = db.expenses.aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$project": {"user_id": 1, "amount": 1, "category": 1, **expense_month_fields()}},
+        {"$match": HAS_MONTH},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "year": "$year", "month": "$month", "category": "$category"},
+            "total": {"$sum": "$amount"},
+        }},
+    ])
+    for row in expenses:
+        key = row["_id"]
+        doc = doc_for(key["user_id"], key["year"], key["month"])
+        total = float(row["total"] or 0)
+        cat = category_key(key.get("category"))
+        doc["expense_total"] += total
+        doc["category_spent"][cat] = doc["category_spent"].get(cat, 0.0) + total
+
+    return rollups
+
+
+def _user_id_batches(db, batch_size, user_ids=None):
+    if user_ids is not None:
+        ids = [_as_object_id(u) for u in user_ids]
+        for i in range(0, len(ids), batch_size):
+            yield ids[i:i + batch_size]
+        return
+
+    batch = []
+    for user in db.users.find({}, {"_id": 1}).batch_size(batch_size):
+        batch.append(user["_id"])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild_rollups(db, batch_size=100, user_ids=None):
+    """
+    Recompute rollups from raw expenses/incomes, `batch_size` users at a time,
+    then mark those users as `rollups_ready`. Returns the number of users rebuilt.
+
+    Writes that land while a user's batch is being rebuilt can be lost, so run
+    this before switching traffic over (and use check_rollups afterwards).
+    """
+    ensure_rollup_indexes(db)
+    rebuilt = 0
+    for batch in _user_id_batches(db, batch_size, user_ids):
+        now = datetime.utcnow()
+        fresh = _raw_rollups(db, batch)
+        ops = []
+        for (uid, year, month), doc in fresh.items():
+            doc["updated_at"] = now
+            ops.append(ReplaceOne({"user_id": uid, "year": year, "month": month}, doc, upsert=True))
+        if ops:
+            db[COLLECTION].bulk_write(ops, ordered=False)
+        # months that no longer have any raw data
+        stale = [
+            doc["_id"]
+            for doc in db[COLLECTION].find({"user_id": {"$in": batch}}, {"user_id": 1, "year": 1, "month": 1})
+            if (doc["user_id"], doc["year"], doc["month"]) not in fresh
+        ]
+        if stale:
+            db[COLLECTION].delete_many({"_id": {"$in": stale}})
+        db.users.update_many({"_id": {"$in": batch}}, {"$set": {"rollups_ready": True}})
+        rebuilt += len(batch)
+    return rebuilt
+
+
+def check_rollups(db, batch_size=100, user_ids=None, tolerance=0.005):
+    """
+    Compare stored rollups with totals recomputed from raw data.
+    Returns a list of mismatches: {user_id, year, month, field, expected, actual}.
+    """
+    mismatches = []
+    for batch in _user_id_batches(db, batch_size, user_ids):
+        expected = _raw_rollups(db, batch)
+        stored = {
+            (doc["user_id"], doc["year"], doc["month"]): doc
+            for doc in db[COLLECTION].find({"user_id": {"$in": batch}})
+        }
+        for key in set(expected) | set(stored):
+            want = rollup_view(expected.get(key, {}))
+            have = rollup_view(stored.get(key, {}))
+            fields = [("income_total", want["income_total"], have["income_total"]),
+                      ("expense_total", want["expense_total"], have["expense_total"])]
+            for cat in set(want["expense_by_category"]) | set(have["expense_by_category"]):
+                fields.append((f"category_spent.{cat}",
+                               want["expense_by_category"].get(cat, 0.0),
+                               have["expense_by_category"].get(cat, 0.0)))
+            for field, exp_val, act_val in fields:
+                if abs(exp_val - act_val) > tolerance:
+                    mismatches.append({
+                        "user_id": key[0], "year": key[1], "month": key[2],
+                        "field": field, "expected": exp_val, "actual": act_val,
+                    })
+    return mismatches
@@ -0,0 +1,97 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+
+
+def _as_object_id(user_id):
+    return user_id if isinstance(user_id, ObjectId) else ObjectId(user_id)
+
+
+def expense_month_fields():
+    """
+    $project expressions giving an expense's (year, month).
+    Legacy expenses without a date fall back to their stored year/month fields.
+    """
+    has_date = {"$eq": [{"$type": "$date"}, "date"]}
+    return {
+        "year": {"$cond": [has_date, {"$year": "$date"}, "$year"]},
+        "month": {"$cond": [has_date, {"$month": "$date"}, "$month"]},
+    }
+
+
+# expenses with neither a date nor year/month can't be placed in a month
+HAS_MONTH = {"year": {"$nin": [None, 0]}, "month": {"$nin": [None, 0]}}
+
+
+def income_totals_pipeline(uid):
+    """Sum incomes per (year, month). Incomes without a real date are skipped."""
+    return [
+        {"$match": {"user_id": uid, "date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {"year": {"$year": "$date"}, "month": {"$month": "$date"}},
+            "total": {"$sum": "$amount"},
+        }},
+    ]
+
+
+def expense_totals_pipeline(uid):
+    """Sum expenses per (year, month); rows that can't be placed in a month are skipped."""
+    return [
+        {"$match": {"user_id": uid}},
+        {"$project": {"amount": 1, **expense_month_fields()}},
+        {"$match": HAS_MONTH},
+        {"$group": {
+            "_id": {"year": "$year", "month": "$month"},
+            "total": {"$sum": "$amount"},
+        }},
+    ]
+
+
+def _totals_by_month(rows):
+    return {
+        (row["_id"]["year"], row["_id"]["month"]): float(row.get("total") or 0)
+        for row in rows
+    }
+
+
+def monthly_totals(db, user_id):
+    """
+    Return ({(year, month): income}, {(year, month): expense}) computed on the server,
+    so only one small document per month comes back over the wire.
+    """
+    uid = _as_object_id(user_id)
+    month_income = _totals_by_month(db.incomes.aggregate(income_totals_pipeline(uid)))
+    month_expense = _totals_by_month(db.expenses.aggregate(expense_totals_pipeline(uid)))
+    return month_income, month_expense
+
+
+def summarize_months(month_income, month_expense):
+    """
+    Turn per-month totals into (monthly_savings, total_savings).
+    saving = max(income - expense, 0); months with no income and no expense are skipped.
+    """
+    monthly_savings = []
+    total_savings = 0.0
+
+    all_keys = sorted(set(month_income.keys()) | set(month_expense.keys()))
+    for (y, m) in all_keys:
+        inc = month_income.get((y, m), 0.0)
+        exp = month_expense.get((y, m), 0.0)
+
+        if inc == 0 and exp == 0:
+            continue
+
+        saving = inc - exp
+        if saving < 0:
+            saving = 0.0   # 亏损月份当成 0 savings 显示
+
+        monthly_savings.append({
+            "year": y,
+            "month": m,
+            "month_name": datetime(y, m, 1).strftime("%B"),
+            "income": inc,
+            "expense": exp,
+            "savings": saving,
+        })
+        total_savings += saving
+
+    return monthly_savings, total_savings
@@ -0,0 +1,142 @@
+"""
+DashboardSnapshot: everything /dashboard and /ai/advice need for one user and
+month, loaded with a single aggregate on `users`.
+
+Each piece (plan, the month's expenses, income, per-category spend, monthly
+savings) is an uncorrelated `$lookup` sub-pipeline, so the server runs them all
+and sends back one document instead of us making a round trip per query.
+"""
+from calendar import monthrange
+from datetime import datetime
+
+from .pagination import split_page
+from .rollups import COLLECTION as ROLLUPS, rollup_view, rollups_ready
+from .savings import (
+    _as_object_id,
+    _totals_by_month,
+    expense_totals_pipeline,
+    income_totals_pipeline,
+    summarize_months,
+)
+
+
+def _lookup(name, collection, pipeline):
+    return {"$lookup": {"from": collection, "pipeline": pipeline, "as": name}}
+
+
+def _month_range(year, month):
+    last_day = monthrange(year, month)[1]
+    return datetime(year, month, 1), datetime(year, month, last_day, 23, 59, 59)
+
+
+class DashboardSnapshot:
+    """Budget plan, spending and savings for one user and month."""
+
+    def __init__(self, year, month, plan=None, expenses=None, total_income=0.0,
+                 expense_by_category=None, month_income=None, month_expense=None,
+                 next_cursor=None):
+        self.year = year
+        self.month = month
+        self.plan = plan
+        self.expenses = expenses if expenses is not None else []
+        # keyset cursor for the expense page after `expenses` (None when there is no more)
+        self.next_cursor = next_cursor
+        self.total_income = total_income
+        self.expense_by_category = expense_by_category or {}
+        self.month_income = month_income or {}
+        self.month_expense = month_expense or {}
+
+    @property
+    def total_budget(self):
+        return self.plan.get("total_budget", 0) if self.plan else 0
+
+    @property
+    def category_budgets(self):
+        return self.plan.get("category_budgets", {}) if self.plan else {}
+
+    @property
+    def total_spent(self):
+        return sum(self.expense_by_category.values())
+
+    def monthly_savings(self):
+        """(monthly_savings, total_savings), same shape as compute_monthly_savings."""
+        return summarize_months(self.month_income, self.month_expense)
+
+    @staticmethod
+    def pipeline(user, year, month, with_expenses=True, with_savings=True, page_size=None):
+        uid = _as_object_id(user["_id"])
+        month_filter = {"user_id": uid, "year": year, "month": month}
+
+        stages = [
+            {"$match": {"_id": uid}},
+            {"$project": {"_id": 1}},
+            _lookup("plan", "budget_plans", [{"$match": month_filter}, {"$limit": 1}]),
+        ]
+        if with_expenses:
+            expense_stages = [{"$match": month_filter}, {"$sort": {"date": -1, "_id": -1}}]
+            if page_size:
+                # one extra row tells us whether there is a next page
+                expense_stages.append({"$limit": page_size + 1})
+            stages.append(_lookup("expenses", "expenses", expense_stages))
+
+        if rollups_ready(user):
+            rollup_match = {"user_id": uid}
+            if not with_savings:
+                rollup_match.update(year=year, month=month)
+            stages.append(_lookup("rollups", ROLLUPS, [{"$match": rollup_match}]))
+            return stages
+
+        start_date, end_date = _month_range(year, month)
+        stages += [
+            _lookup("month_income", "incomes", [
+                {"$match": {"user_id": uid, "date": {"$gte": start_date, "$lte": end_date}}},
+                {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+            ]),
+            _lookup("month_categories", "expenses", [
+                {"$match": month_filter},
+                {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+            ]),
+        ]
+        if with_savings:
+            stages += [
+                _lookup("income_totals", "incomes", income_totals_pipeline(uid)),
+                _lookup("expense_totals", "expenses", expense_totals_pipeline(uid)),
+            ]
+        return stages
+
+    @classmethod
+    def load(cls, db, user, year, month, with_expenses=True, with_savings=True, page_size=None):
+        """
+        Load the snapshot in one round trip. `user` is the already-authenticated user doc.
+        With `page_size`, only the first page of the month's expenses is loaded;
+        totals always cover the whole month.
+        """
+        pipeline = cls.pipeline(user, year, month, with_expenses, with_savings, page_size)
+        doc = next(db.users.aggregate(pipeline), None) or {}
+
+        plan = (doc.get("plan") or [None])[0]
+        expenses, next_cursor = doc.get("expenses"), None
+        if expenses is not None and page_size:
+            expenses, next_cursor = split_page(expenses, page_size)
+        snapshot = cls(year, month, plan=plan, expenses=expenses, next_cursor=next_cursor)
+
+        if "rollups" in doc:
+            for rollup in doc["rollups"]:
+                key = (rollup["year"], rollup["month"])
+                view = rollup_view(rollup)
+                snapshot.month_income[key] = view["income_total"]
+                snapshot.month_expense[key] = view["expense_total"]
+                if key == (year, month):
+                    snapshot.total_income = view["income_total"]
+                    snapshot.expense_by_category = view["expense_by_category"]
+            return snapshot
+
+        month_income = doc.get("month_income") or []
+        snapshot.total_income = month_income[0]["total"] if month_income else 0
+        snapshot.expense_by_category = {
+            row["_id"] if row["_id"] is not None else "Other": row["total"]
+            for row in doc.get("month_categories") or []
+        }
+        snapshot.month_income = _totals_by_month(doc.get("income_totals") or [])
+        snapshot.month_expense = _totals_by_month(doc.get("expense_totals") or [])
+        return snapshot
@@ -0,0 +1,99 @@
+// Expense list lazy loading.
+// The dashboard renders the first page of this month's expenses; the rest is
+// fetched page by page from /api/expenses (keyset cursor) when the
+// "Load more" button scrolls into view or is clicked.
+document.addEventListener("DOMContentLoaded", function () {
+  const tableBody = document.getElementById("expenses-table-body");
+  const loadMoreBtn = document.getElementById("load-more-expenses");
+
+  window.BudgetBaddie = window.BudgetBaddie || {};
+
+  let cursor = loadMoreBtn ? loadMoreBtn.dataset.cursor : null;
+  let inFlight = null;
+
+  function buildRow(expense) {
+    const row = document.createElement("tr");
+    [expense.date, expense.category, "$" + expense.amount.toFixed(2), expense.note || "-"].forEach(function (text, i) {
+      const cell = document.createElement("td");
+      if (i === 3) cell.className = "note-cell";
+      cell.textContent = text;
+      row.appendChild(cell);
+    });
+
+    const actions = document.createElement("td");
+    const form = document.createElement("form");
+    form.method = "POST";
+    form.action = "/expenses/delete/" + expense.id;
+    form.style.display = "inline";
+    form.onsubmit = function () { return confirm("Delete this expense?"); };
+    const button = document.createElement("button");
+    button.type = "submit";
+    button.className = "icon-button delete-btn";
+    const icon = document.createElement("img");
+    icon.src = tableBody.dataset.deleteIcon;
+    icon.alt = "Delete";
+    button.appendChild(icon);
+    form.appendChild(button);
+    actions.appendChild(form);
+    row.appendChild(actions);
+    return row;
+  }
+
+  function loadNextPage() {
+    if (!cursor) return Promise.resolve([]);
+    if (inFlight) return inFlight;
+
+    const url = new URL(loadMoreBtn.dataset.url, window.location.origin);
+    url.searchParams.set("cursor", cursor);
+    loadMoreBtn.disabled = true;
+
+    inFlight = fetch(url, { headers: { Accept: "application/json" } })
+      .then(function (res) {
+        if (!res.ok) throw new Error("HTTP " + res.status);
+        return res.json();
+      })
+      .then(function (data) {
+        data.items.forEach(function (expense) {
+          tableBody.appendChild(buildRow(expense));
+        });
+        cursor = data.next_cursor;
+        if (!cursor) loadMoreBtn.remove();
+        document.dispatchEvent(new CustomEvent("expenses:loaded", { detail: data.items }));
+        return data.items;
+      })
+      .catch(function (err) {
+        console.error("Failed to load expenses:", err);
+        return [];
+      })
+      .finally(function () {
+        inFlight = null;
+        loadMoreBtn.disabled = false;
+      });
+    return inFlight;
+  }
+
+  // used by the search modal, which filters over every expense of the month
+  async function loadAllExpenses() {
+    while (cursor) {
+      const before = cursor;
+      await loadNextPage();
+      if (cursor === before) break; // request failed; don't spin
+    }
+  }
+
+  window.BudgetBaddie.loadNextExpenses = loadNextPage;
+  window.BudgetBaddie.loadAllExpenses = loadAllExpenses;
+
+  if (!loadMoreBtn || !tableBody) return;
+
+  loadMoreBtn.addEventListener("click", loadNextPage);
+
+  if ("IntersectionObserver" in window) {
+    const observer = new IntersectionObserver(function (entries) {
+      if (entries.some(function (entry) { return entry.isIntersecting; })) {
+        loadNextPage();
+      }
+    });
+    observer.observe(loadMoreBtn);
+  }
+});
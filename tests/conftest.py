@@ -7,6 +7,12 @@ import sys
 # Add parent directory to path to import app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# read when app.py is imported, which happens at collection time
+# cheapest bcrypt cost keeps the auth tests fast
+os.environ.setdefault("PASSWORD_BCRYPT_ROUNDS", "4")
+# queued emails stay in the outbox; tests drain it against a local SMTP server
+os.environ.setdefault("MAIL_OUTBOX_SENDER", "off")
+
 @pytest.fixture(scope='session')
 def test_db():
     """Create a test database connection using app's mongo client"""
@@ -34,11 +40,15 @@ def app(test_db):
     flask_app.db = test_db
     flask_app.app.config['TESTING'] = True
     flask_app.app.config['WTF_CSRF_ENABLED'] = False
+    # fresh limiter/breaker so upstream failures in one test can't open the circuit for the next
+    original_guard = flask_app.ai_guard
+    flask_app.ai_guard = flask_app.UpstreamGuard()
     
     yield flask_app.app
     
     # Restore original db
     flask_app.db = original_db
+    flask_app.ai_guard = original_guard
     
 @pytest.fixture
 def client(app):
@@ -81,10 +91,73 @@ def authenticated_client(client, test_user):
 
 @pytest.fixture
 def mock_mail(monkeypatch):
-    """Mock Flask-Mail to prevent actual email sending"""
-    class MockMail:
-        def send(self, message):
-            pass
-    
+    """Keep reset emails in the outbox instead of sending them over SMTP"""
     import app as flask_app
-    monkeypatch.setattr(flask_app, 'mail', MockMail())
+    monkeypatch.setitem(flask_app.app.config, 'MAIL_OUTBOX_SENDER', 'off')
+
+
+class LocalSMTPServer:
+    """A tiny in-process SMTP server: records messages, can refuse the next N with 451"""
+
+    def __init__(self):
+        import socketserver
+        import threading
+        from email import message_from_bytes
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                server.connections += 1
+                self.reply("220 localhost test smtp")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    verb = line.decode().strip().split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO", "RCPT", "RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "MAIL":
+                        if server.fail_next:
+                            server.fail_next -= 1
+                            self.reply("451 try again later")
+                        else:
+                            self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 end with .")
+                        data = []
+                        for raw in iter(self.rfile.readline, b""):
+                            if raw in (b".\r\n", b".\n"):
+                                break
+                            data.append(raw[1:] if raw.startswith(b"..") else raw)
+                        server.messages.append(message_from_bytes(b"".join(data)))
+                        self.reply("250 queued")
+                    elif verb == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("502 not implemented")
+
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def smtp_server():
+    """Local SMTP server on a free port"""
+    server = LocalSMTPServer()
+    yield server
+    server.close()
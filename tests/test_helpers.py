@@ -2,6 +2,14 @@ import pytest
 from datetime import datetime
 from bson.objectid import ObjectId
 import app as flask_app
+from services.advice import AdviceCache, advice_cache_key, normalize_question
+from services.cache import SingleFlight, TTLCache
+from services.dashboard_view import category_status, dashboard_view, overall_status
+from services.fragments import cached_fragment
+from services.snapshot import DashboardSnapshot
+from services.pagination import clamp_page_size, decode_cursor, encode_cursor, keyset_filter
+from services.query_audit import audit_queries, query_shapes, winning_plan_stages
+from api.app.indexes import INDEXES, ensure_indexes
 
 class TestComputeMonthlySavings:
     """Test the compute_monthly_savings helper function"""
@@ -123,6 +131,55 @@ class TestComputeMonthlySavings:
         assert monthly[1]['savings'] == 800.0  # Feb: 1200-400
         assert total == 1500.0
 
+    def test_legacy_expense_without_date(self, app, db, test_user):
+        """Test expenses without a date fall back to their year/month fields"""
+        db.expenses.insert_one({
+            "user_id": test_user['_id'],
+            "category": "Rent",
+            "amount": 250.0,
+            "month": 3,
+            "year": 2025,
+            "created_at": datetime.utcnow()
+        })
+        # No date and no year/month -> skipped
+        db.expenses.insert_one({
+            "user_id": test_user['_id'],
+            "category": "Rent",
+            "amount": 99.0,
+            "created_at": datetime.utcnow()
+        })
+        db.incomes.insert_one({
+            "user_id": test_user['_id'],
+            "date": datetime(2025, 3, 1),
+            "amount": 1000.0,
+            "source": "Salary",
+            "created_at": datetime.utcnow()
+        })
+
+        monthly, total = flask_app.compute_monthly_savings(str(test_user['_id']))
+
+        assert len(monthly) == 1
+        assert monthly[0]['year'] == 2025
+        assert monthly[0]['month'] == 3
+        assert monthly[0]['month_name'] == 'March'
+        assert monthly[0]['expense'] == 250.0
+        assert total == 750.0
+
+    def test_income_without_date_is_skipped(self, app, db, test_user):
+        """Test incomes without a valid date are ignored"""
+        db.incomes.insert_one({
+            "user_id": test_user['_id'],
+            "date": None,
+            "amount": 1000.0,
+            "source": "Salary",
+            "created_at": datetime.utcnow()
+        })
+
+        monthly, total = flask_app.compute_monthly_savings(test_user['_id'])
+
+        assert monthly == []
+        assert total == 0.0
+
 class TestGetCurrentUser:
     """Test the get_current_user helper function"""
     
@@ -152,6 +209,235 @@ class TestGetCurrentUser:
             assert user is not None
             assert user['email'] == 'test@test.com'
 
+class TestTTLCache:
+    """Test the TTL/LRU cache used for per-process caching"""
+
+    def test_entries_expire(self):
+        """Test entries disappear once their TTL has passed"""
+        now = [100.0]
+        cache = TTLCache(maxsize=10, ttl=5, clock=lambda: now[0])
+        cache.set('a', 1)
+
+        assert cache.get('a') == 1
+        now[0] += 5
+        assert cache.get('a') is None
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the LRU entry is evicted when the cache is full"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+class TestAdviceCaching:
+    """Test the advice cache key, hit/miss counters and single-flight"""
+
+    def test_cache_counts_hits_and_misses(self):
+        """Test TTLCache counts hits and misses, expired entries included"""
+        now = [0.0]
+        cache = TTLCache(maxsize=10, ttl=5, clock=lambda: now[0])
+        cache.get('a')
+        cache.set('a', 1)
+        cache.get('a')
+        now[0] = 10
+        cache.get('a')
+
+        assert cache.stats() == {"hits": 1, "misses": 2, "size": 0}
+
+    def test_normalize_question(self):
+        """Test case, spacing and trailing punctuation are ignored"""
+        assert normalize_question("  Can I   buy SHOES?! ") == "can i buy shoes"
+
+    def test_key_follows_month_data(self):
+        """Test the key changes with the question's meaning or the month's numbers"""
+        uid = ObjectId()
+        snapshot = DashboardSnapshot(2025, 3, total_income=100.0, expense_by_category={"Food": 5.0})
+        key = advice_cache_key(uid, snapshot, "Can I buy shoes?")
+
+        assert advice_cache_key(uid, snapshot, "can i buy shoes") == key
+        assert advice_cache_key(uid, snapshot, "Can I buy a car?") != key
+        snapshot.expense_by_category["Food"] = 6.0
+        assert advice_cache_key(uid, snapshot, "Can I buy shoes?") != key
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        """Test concurrent misses for one key make a single upstream call"""
+        import threading
+        import time
+        cache = AdviceCache(maxsize=10, ttl=60)
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"advice": "x"}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.generate("k", slow)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == [{"advice": "x"}] * 5
+        assert cache.stats()["coalesced"] == 4
+        assert cache.get("k") == {"advice": "x"}
+
+    def test_single_flight_shares_errors(self):
+        """Test waiters see the leader's exception and nothing is cached"""
+        flight = SingleFlight()
+
+        with pytest.raises(RuntimeError):
+            flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+        assert flight.do("k", lambda: 1) == (1, False)
+
+class TestDashboardView:
+    """Test the precomputed dashboard view model"""
+
+    def test_category_status_thresholds(self):
+        """Test the under/close/over thresholds match the old template logic"""
+        assert category_status(100, 90)[1:] == ("status-under", "Under Budget")
+        assert category_status(100, 100)[1:] == ("status-close", "Close to Budget")
+        assert category_status(100, 101)[1:] == ("status-over", "Over Budget!")
+        assert category_status(0, 50)[0] == 0
+
+    def test_overall_status(self):
+        """Test the income tracker status picks the first matching warning"""
+        assert overall_status(100, 50, 150)[1] == "⚠️ Overspending!"
+        assert overall_status(500, 100, 150)[1] == "⚠️ Over Budget!"
+        assert overall_status(500, 100, 95)[1] == "⚡ Tight Budget"
+        assert overall_status(50, 100, 10)[1] == "⚠️ Budget Exceeds Income!"
+        assert overall_status(500, 100, 10)[1] == "✓ Healthy"
+
+    def test_view_totals(self):
+        """Test totals and per-category rows come from the snapshot"""
+        snapshot = DashboardSnapshot(
+            2025, 3,
+            plan={"total_budget": 300.0, "category_budgets": {"Food": 200.0, "Fun": 100.0}},
+            total_income=1000.0,
+            expense_by_category={"Food": 50.0, "Fun": 150.0},
+            month_income={(2025, 3): 1000.0},
+            month_expense={(2025, 3): 200.0},
+        )
+
+        view = dashboard_view(snapshot)
+
+        assert view["total_spent"] == 200.0
+        assert view["remaining_budget"] == 100.0
+        assert view["planned_savings"] == 700.0
+        assert view["actual_savings"] == 800.0
+        assert [(r["category"], r["status_class"], r["bar_width"]) for r in view["category_rows"]] == [
+            ("Food", "status-under", 25.0),
+            ("Fun", "status-over", 100),
+        ]
+        assert view["total_savings"] == 800.0
+
+class TestFragmentCache:
+    """Test digest-tagged fragment caching"""
+
+    def test_reuses_html_until_data_changes(self):
+        """Test a fragment renders once per distinct data"""
+        cache = TTLCache(maxsize=10, ttl=60)
+        renders = []
+
+        def render():
+            renders.append(1)
+            return f"<p>{len(renders)}</p>"
+
+        assert cached_fragment(cache, ("f", "u1"), {"total": 1}, render) == "<p>1</p>"
+        assert cached_fragment(cache, ("f", "u1"), {"total": 1}, render) == "<p>1</p>"
+        assert cached_fragment(cache, ("f", "u1"), {"total": 2}, render) == "<p>2</p>"
+        assert len(renders) == 2
+        assert len(cache) == 1
+
+    def test_no_cache_always_renders(self):
+        """Test passing no cache renders every time"""
+        renders = []
+        for _ in range(3):
+            cached_fragment(None, ("f",), {}, lambda: renders.append(1) or "")
+
+        assert len(renders) == 3
+
+class TestPagination:
+    """Test the keyset cursor helpers"""
+
+    def test_cursor_round_trip(self):
+        """Test a cursor decodes back to the row's (date, _id)"""
+        oid = ObjectId()
+        cursor = encode_cursor({"_id": oid, "date": datetime(2025, 3, 4, 5, 6)})
+
+        assert decode_cursor(cursor) == (datetime(2025, 3, 4, 5, 6), oid)
+        assert decode_cursor(encode_cursor({"_id": oid, "date": None})) == (None, oid)
+
+    def test_bad_cursor_raises_value_error(self):
+        """Test malformed cursors raise ValueError"""
+        with pytest.raises(ValueError):
+            decode_cursor("!!!")
+        with pytest.raises(ValueError):
+            keyset_filter({}, encode_cursor({"_id": "nope", "date": None}))
+
+    def test_clamp_page_size(self):
+        """Test page sizes are clamped and bad input falls back to the default"""
+        assert clamp_page_size("10") == 10
+        assert clamp_page_size(0) == 1
+        assert clamp_page_size(10**6) == 100
+        assert clamp_page_size("abc") == 25
+
+class TestIndexesAndQueryAudit:
+    """Test the shared index manifest and the explain()-based query audit"""
+
+    def test_winning_plan_stages_finds_collscan(self):
+        """Test COLLSCAN is found in nested aggregate explain output"""
+        explain = {"stages": [{"$cursor": {"queryPlanner": {
+            "winningPlan": {"stage": "PROJECTION_SIMPLE", "inputStage": {"stage": "COLLSCAN"}},
+            "rejectedPlans": [],
+        }}}]}
+
+        assert list(winning_plan_stages(explain)) == ["PROJECTION_SIMPLE", "COLLSCAN"]
+
+    def test_rejected_plans_are_ignored(self):
+        """Test only the winning plan counts"""
+        explain = {"queryPlanner": {
+            "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+            "rejectedPlans": [{"stage": "COLLSCAN"}],
+        }}
+
+        assert "COLLSCAN" not in list(winning_plan_stages(explain))
+
+    def test_shapes_cover_snapshot_lookups(self):
+        """Test every DashboardSnapshot sub-pipeline is audited"""
+        labels = [shape.label for shape in query_shapes()]
+
+        for piece in ("plan", "expenses", "month_income", "month_categories",
+                      "income_totals", "expense_totals", "rollups"):
+            assert any(label.endswith(f": {piece}") for label in labels)
+
+    def test_ensure_indexes_is_idempotent(self, db):
+        """Test the manifest can be applied repeatedly"""
+        ensure_indexes(db)
+        ensure_indexes(db)
+
+        names = db.incomes.index_information()
+        assert any(list(spec['key']) == [('user_id', 1), ('date', -1), ('_id', -1)] for spec in names.values())
+        assert set(INDEXES) >= {"users", "expenses", "incomes", "budget_plans", "monthly_rollups"}
+
+    def test_route_queries_use_indexes(self, db):
+        """Test no route query shape needs a collection scan"""
+        ensure_indexes(db)
+
+        results = audit_queries(db)
+
+        assert results
+        assert [r['label'] for r in results if r['collscan']] == []
+
 class TestSendResetEmail:
     """Test the send_reset_email helper function"""
     
@@ -166,3 +452,208 @@ class TestSendResetEmail:
             assert True
         except Exception as e:
             pytest.fail(f"send_reset_email raised exception: {e}")
+
+
+class TestPasswordHasher:
+    """Test scheme/cost detection for rehash-on-login"""
+
+    def test_bcrypt_round_trip(self):
+        """Test hashing and verifying with bcrypt, including over-long passwords"""
+        from services.passwords import PasswordHasher
+        hasher = PasswordHasher(rounds=4)
+        long_password = 'x' * 100
+
+        stored = hasher.hash(long_password)
+
+        assert stored.startswith('$2b$04$')
+        assert hasher.verify(stored, long_password)
+        assert not hasher.verify(stored, 'y' * 100)
+        assert not hasher.verify(None, long_password)
+
+    def test_needs_rehash(self):
+        """Test another scheme or cost is flagged, the configured one is not"""
+        from werkzeug.security import generate_password_hash
+        from services.passwords import PasswordHasher
+        bcrypt_hasher = PasswordHasher(rounds=4)
+        pbkdf2_hasher = PasswordHasher(scheme='pbkdf2:sha256:1000')
+
+        legacy = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+        assert bcrypt_hasher.needs_rehash(legacy)
+        assert not bcrypt_hasher.needs_rehash(bcrypt_hasher.hash('pw'))
+        assert PasswordHasher(rounds=5).needs_rehash(bcrypt_hasher.hash('pw'))
+        assert not pbkdf2_hasher.needs_rehash(legacy)
+        assert pbkdf2_hasher.needs_rehash(generate_password_hash('pw', method='pbkdf2:sha256:2000'))
+        assert pbkdf2_hasher.needs_rehash(bcrypt_hasher.hash('pw'))
+        assert pbkdf2_hasher.verify(bcrypt_hasher.hash('pw'), 'pw')
+
+
+class TestMetricsRegistry:
+    """Test the Prometheus text exporter and the Mongo command listener"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket counts accumulate and sum/count are rendered"""
+        from api.app.metrics import Registry
+        registry = Registry()
+        latency = registry.histogram('t_seconds', 'test', ('route',), buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, '/a')
+        text = registry.render()
+
+        assert 't_seconds_bucket{route="/a",le="0.1"} 1' in text
+        assert 't_seconds_bucket{route="/a",le="1.0"} 2' in text
+        assert 't_seconds_bucket{route="/a",le="+Inf"} 3' in text
+        assert 't_seconds_count{route="/a"} 3' in text
+        assert 't_seconds_sum{route="/a"} 5.55' in text
+
+    def test_listener_charges_current_route(self):
+        """Test commands count toward the active request's route, else 'background'"""
+        from types import SimpleNamespace
+        from api.app.metrics import (
+            MONGO_COMMANDS, MONGO_DOCUMENTS, MongoCommandMetrics, clear_request, start_request,
+        )
+        listener = MongoCommandMetrics()
+        event = SimpleNamespace(command_name='find', duration_micros=1500,
+                                reply={'cursor': {'firstBatch': [{}, {}, {}]}, 'ok': 1})
+        before = MONGO_DOCUMENTS.value('/unit-test', 'find')
+
+        ctx = start_request('/unit-test')
+        listener.started(event)
+        listener.succeeded(event)
+        clear_request()
+        background = MONGO_COMMANDS.value('background', 'find')
+        listener.succeeded(event)
+
+        assert ctx.mongo_commands == 1
+        assert MONGO_DOCUMENTS.value('/unit-test', 'find') == before + 3
+        assert MONGO_COMMANDS.value('background', 'find') == background + 1
+
+    def test_pool_listener_tracks_connections(self):
+        """Test checkouts move connections between idle, in use and waiting"""
+        from types import SimpleNamespace
+        from api.app.metrics import MongoPoolMetrics
+        pool = MongoPoolMetrics()
+        event = SimpleNamespace(duration=0.25)
+
+        pool.connection_created(event)
+        pool.connection_created(event)
+        pool.connection_check_out_started(event)
+        pool.connection_checked_out(event)
+        pool.connection_check_out_started(event)
+        waiting = pool.stats()
+        pool.connection_check_out_failed(event)
+        pool.connection_checked_in(event)
+        pool.connection_closed(event)
+
+        assert waiting['in_use'] == 1 and waiting['waiting'] == 1 and waiting['idle'] == 1
+        stats = pool.stats()
+        assert stats['open'] == 1 and stats['in_use'] == 0 and stats['waiting'] == 0
+        assert stats['checked_out'] == 1 and stats['checkout_failed'] == 1
+        assert stats['wait_seconds'] == 0.5
+        pool.reset()
+        assert pool.stats()['created'] == 0
+
+
+class TestSyntheticData:
+    """Test the deterministic load-test data generator"""
+
+    def test_same_seed_same_documents(self):
+        """Test a seed reproduces the data exactly and mixes the legacy shapes in"""
+        from api.scripts.synthetic_data import SyntheticData
+        first = list(SyntheticData(users=3, months=4, seed=7, end=(2025, 6), password='x').documents())
+        again = list(SyntheticData(users=3, months=4, seed=7, end=(2025, 6), password='x').documents())
+        other = list(SyntheticData(users=3, months=4, seed=8, end=(2025, 6), password='x').documents())
+
+        assert first == again
+        assert first != other
+        expenses = [doc for name, doc in first if name == 'expenses']
+        incomes = [doc for name, doc in first if name == 'incomes']
+        assert any('date' not in doc and doc['year'] for doc in expenses)
+        assert any('year' not in doc and doc['date'] for doc in incomes)
+        assert {doc['year'] * 100 + doc['month'] for doc in expenses} == {202503, 202504, 202505, 202506}
+
+    def test_write_and_remove(self, db):
+        """Test batched writes land every document and remove() cleans up only synthetic users"""
+        from api.scripts.synthetic_data import SyntheticData, remove, write
+        db.users.insert_one({'email': 'real@example.com'})
+        data = SyntheticData(users=4, months=2, seed=1, password='x')
+
+        counts = write(db, data, batch_size=10)
+
+        assert counts['users'] == 4
+        assert db.expenses.count_documents({}) == counts['expenses'] > 10
+        assert remove(db) == 4
+        assert db.expenses.count_documents({}) == 0
+        assert db.users.count_documents({}) == 1
+
+    def test_remove_clears_what_the_apps_wrote(self, db):
+        """Test rollups, reset tokens and outbox emails go too, and the domain's dots are literal"""
+        from api.scripts.synthetic_data import DEFAULT_DOMAIN, SyntheticData, remove, write
+        write(db, SyntheticData(users=2, months=1, seed=1, password='x'))
+        user = db.users.find_one({'email': {'$regex': 'synthetic'}})
+        lookalike = 'someone@' + DEFAULT_DOMAIN.replace('.', 'x')
+        db.users.insert_one({'email': lookalike})
+        db.monthly_rollups.insert_one({'user_id': user['_id'], 'year': 2025, 'month': 1, 'expense_total': 5})
+        db.password_reset_tokens.insert_one({'user_id': user['_id'], 'token_hash': 'h'})
+        db.outbox.insert_many([{'to': user['email']}, {'to': lookalike}])
+
+        assert remove(db) == 2
+
+        assert db.monthly_rollups.count_documents({}) == 0
+        assert db.password_reset_tokens.count_documents({}) == 0
+        assert [m['to'] for m in db.outbox.find({})] == [lookalike]
+        assert db.users.find_one({'email': lookalike}) is not None
+
+
+class TestParseCategoryBudgets:
+    """Test the budget form's categories_json parsing"""
+
+    def test_parses_rows(self):
+        """Test amounts become floats; bad amounts count as 0 and unnamed rows are dropped"""
+        from services.budget_plans import parse_category_budgets
+        raw = '[{"category": "Rent", "amount": "1200"}, {"category": "Fun", "amount": "lots"},' \
+              ' {"category": "", "amount": 5}, {"category": "Food"}]'
+
+        assert parse_category_budgets(raw) == {'Rent': 1200.0, 'Fun': 0, 'Food': 0.0}
+
+    def test_bad_json_is_empty(self):
+        """Test malformed or missing JSON gives no categories"""
+        from services.budget_plans import parse_category_budgets
+
+        assert parse_category_budgets('not json') == {}
+        assert parse_category_budgets('') == {}
+
+
+class TestForkSafeClient:
+    """Test the lazily created, per-process Mongo client wrapper"""
+
+    def test_created_on_first_use(self):
+        """Test the factory runs once, on first access, and the database follows it"""
+        from services.lazy import ForkSafeClient
+        made = []
+        client = ForkSafeClient(lambda: made.append(1) or {'appdb': {'users': 'users-collection'}})
+        db = client.database('appdb')
+
+        assert not client.created and made == []
+        assert db['users'] == 'users-collection'
+        assert client['appdb']['users'] == 'users-collection'
+        assert made == [1]
+
+    @pytest.mark.skipif(not hasattr(__import__('os'), 'fork'), reason='needs os.fork')
+    def test_child_builds_its_own_client(self):
+        """Test a forked child doesn't reuse the parent's client"""
+        import os
+        from services.lazy import ForkSafeClient
+        client = ForkSafeClient(lambda: {'pid': os.getpid()})
+        assert client.get()['pid'] == os.getpid()
+
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            ok = not client.created and client.get()['pid'] == os.getpid()
+            os.write(write, b'1' if ok else b'0')
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        assert os.read(read, 1) == b'1'
+        assert client.get()['pid'] == os.getpid()
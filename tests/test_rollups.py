@@ -0,0 +1,135 @@
+from datetime import datetime
+import app as flask_app
+from services.rollups import (
+    category_key,
+    category_name,
+    check_rollups,
+    month_rollup,
+    rebuild_rollups,
+)
+
+class TestRollupWritePaths:
+    """Test that write routes keep monthly_rollups up to date"""
+
+    def test_add_expense_increments_rollup(self, authenticated_client, db, test_user):
+        """Test adding expenses $incs the month's rollup"""
+        for amount in (20.0, 30.5):
+            authenticated_client.post('/expenses/add', data={
+                'date': '2025-11-03',
+                'category': 'Groceries',
+                'amount': amount,
+            })
+
+        rollup = month_rollup(db, test_user['_id'], 2025, 11)
+        assert rollup['expense_total'] == 50.5
+        assert rollup['expense_by_category'] == {'Groceries': 50.5}
+        assert db.monthly_rollups.count_documents({"user_id": test_user['_id']}) == 1
+
+    def test_add_income_increments_rollup(self, authenticated_client, db, test_user):
+        """Test adding income $incs the month's rollup"""
+        authenticated_client.post('/income/add', data={
+            'date': '2025-11-01',
+            'source': 'Salary',
+            'amount': 2000,
+        })
+
+        rollup = month_rollup(db, test_user['_id'], 2025, 11)
+        assert rollup['income_total'] == 2000.0
+        assert rollup['expense_total'] == 0.0
+
+    def test_delete_expense_decrements_rollup(self, authenticated_client, db, test_user):
+        """Test deleting an expense takes it back out of the rollup"""
+        authenticated_client.post('/expenses/add', data={
+            'date': '2025-11-03',
+            'category': 'Rent',
+            'amount': 500,
+        })
+        expense = db.expenses.find_one({"user_id": test_user['_id']})
+
+        authenticated_client.post(f"/expenses/delete/{expense['_id']}")
+
+        rollup = month_rollup(db, test_user['_id'], 2025, 11)
+        assert rollup['expense_total'] == 0.0
+        assert rollup['expense_by_category'] == {}
+
+    def test_category_with_dots_round_trips(self):
+        """Test category names that aren't valid Mongo keys are escaped"""
+        name = "Dining.out $pecial"
+        assert "." not in category_key(name)
+        assert "$" not in category_key(name)
+        assert category_name(category_key(name)) == name
+
+class TestRollupMaintenance:
+    """Test rebuild and consistency-check helpers"""
+
+    def _seed_raw(self, db, user_id):
+        db.incomes.insert_one({
+            "user_id": user_id,
+            "date": datetime(2025, 1, 5),
+            "amount": 1000.0,
+            "source": "Salary",
+        })
+        db.expenses.insert_many([
+            {"user_id": user_id, "date": datetime(2025, 1, 9), "year": 2025, "month": 1,
+             "category": "Rent", "amount": 400.0},
+            # legacy shape: no date
+            {"user_id": user_id, "year": 2025, "month": 2, "category": "Food", "amount": 50.0},
+        ])
+
+    def test_rebuild_matches_raw_data(self, app, db, test_user):
+        """Test rebuild recomputes rollups and marks the user ready"""
+        self._seed_raw(db, test_user['_id'])
+        # stale month that has no raw data any more
+        db.monthly_rollups.insert_one({
+            "user_id": test_user['_id'], "year": 2024, "month": 6,
+            "income_total": 10.0, "expense_total": 0.0, "category_spent": {},
+        })
+
+        assert rebuild_rollups(db, batch_size=1) == 1
+
+        assert month_rollup(db, test_user['_id'], 2025, 1)['expense_by_category'] == {'Rent': 400.0}
+        assert month_rollup(db, test_user['_id'], 2025, 2)['expense_total'] == 50.0
+        assert db.monthly_rollups.count_documents({"user_id": test_user['_id'], "year": 2024}) == 0
+        assert db.users.find_one({"_id": test_user['_id']})['rollups_ready'] is True
+        assert check_rollups(db) == []
+
+    def test_rollup_savings_match_aggregation(self, app, db, test_user):
+        """Test savings come from the rollups once the user is rollups_ready, and equal the raw aggregation"""
+        self._seed_raw(db, test_user['_id'])
+        raw = flask_app.compute_monthly_savings(test_user['_id'])
+        rebuild_rollups(db, user_ids=[test_user['_id']])
+
+        assert flask_app.compute_monthly_savings(test_user['_id']) == raw
+
+        db.monthly_rollups.update_many({"user_id": test_user['_id']}, {"$set": {"income_total": 0.0}})
+        assert flask_app.compute_monthly_savings(test_user['_id'])[1] == 0
+        user = db.users.find_one({"_id": test_user['_id']}) | {"rollups_ready": False}
+        assert flask_app.compute_monthly_savings(test_user['_id'], user) == raw
+
+    def test_check_reports_drift(self, app, db, test_user):
+        """Test the checker reports rollups that disagree with raw data"""
+        self._seed_raw(db, test_user['_id'])
+        rebuild_rollups(db, user_ids=[str(test_user['_id'])])
+        db.monthly_rollups.update_one(
+            {"user_id": test_user['_id'], "year": 2025, "month": 1},
+            {"$inc": {"expense_total": 5.0}},
+        )
+
+        mismatches = check_rollups(db, user_ids=[test_user['_id']])
+
+        assert len(mismatches) == 1
+        assert mismatches[0]['field'] == 'expense_total'
+        assert mismatches[0]['expected'] == 400.0
+        assert mismatches[0]['actual'] == 405.0
+
+    def test_cli_commands(self, app, db, test_user):
+        """Test the rebuild-rollups / check-rollups CLI commands"""
+        self._seed_raw(db, test_user['_id'])
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=['rebuild-rollups', '--batch-size', '10'])
+        assert 'rebuilt rollups for 1 user(s)' in result.output
+
+        result = runner.invoke(args=['check-rollups'])
+        assert result.exit_code == 0
+        assert 'consistent' in result.output
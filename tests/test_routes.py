@@ -1,9 +1,37 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson.objectid import ObjectId
-from werkzeug.security import check_password_hash
 import json
+import os
+import re
 from unittest.mock import Mock, patch
+from pymongo import MongoClient, monitoring
+import app as flask_app
+from services.reset_tokens import issue_token
+
+class CommandCounter(monitoring.CommandListener):
+    """Records the name of every Mongo command sent by a client"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+@pytest.fixture
+def counted_db(app, db, monkeypatch):
+    """Point the app at the test DB through a client that counts commands"""
+    counter = CommandCounter()
+    client = MongoClient(os.environ["MONGO_URI"], event_listeners=[counter])
+    monkeypatch.setattr(flask_app, 'db', client[db.name])
+    yield counter
+    client.close()
 
 class TestAuthenticationRoutes:
     """Test authentication-related routes"""
@@ -33,7 +61,7 @@ class TestAuthenticationRoutes:
         # Verify user was created
         user = db.users.find_one({"email": "newuser@test.com"})
         assert user is not None
-        assert check_password_hash(user['password'], 'newpass123')
+        assert flask_app.passwords.verify(user['password'], 'newpass123')
     
     def test_signup_duplicate_email(self, client, test_user):
         """Test signup with existing email"""
@@ -101,17 +129,14 @@ class TestAuthenticationRoutes:
         
         assert response.status_code == 200
         
-        # Verify token was set
-        user = db.users.find_one({"email": "test@test.com"})
-        assert user['password_reset_token'] is not None
+        # Verify a (hashed) token was issued
+        token = db.password_reset_tokens.find_one({"user_id": test_user['_id']})
+        assert token is not None
+        assert len(token['token_hash']) == 64
     
     def test_reset_password_valid_token(self, client, test_user, db):
         """Test password reset with valid token"""
-        token = "valid-reset-token"
-        db.users.update_one(
-            {"_id": test_user['_id']},
-            {"$set": {"password_reset_token": token}}
-        )
+        token = issue_token(db, test_user['_id'])
         
         response = client.post(f'/reset-password/{token}', data={
             'password': 'newpassword123'
@@ -122,8 +147,8 @@ class TestAuthenticationRoutes:
         
         # Verify password was changed
         user = db.users.find_one({"_id": test_user['_id']})
-        assert check_password_hash(user['password'], 'newpassword123')
-        assert user['password_reset_token'] is None
+        assert flask_app.passwords.verify(user['password'], 'newpassword123')
+        assert db.password_reset_tokens.count_documents({}) == 0
     
     def test_reset_password_invalid_token(self, client):
         """Test password reset with invalid token"""
@@ -149,6 +174,171 @@ class TestDashboardAccess:
         assert response.status_code == 200
         assert b'dashboard' in response.data.lower() or b'budget' in response.data.lower()
 
+    def test_dashboard_query_count(self, authenticated_client, db, test_user, counted_db):
+        """Test a dashboard render costs one user lookup plus one snapshot aggregate"""
+        db.expenses.insert_one({
+            "user_id": test_user['_id'],
+            "category": "Groceries",
+            "amount": 25.0,
+            "date": datetime(2025, 1, 2),
+            "month": 1,
+            "year": 2025,
+        })
+        counted_db.commands.clear()
+
+        response = authenticated_client.get('/dashboard')
+
+        assert response.status_code == 200
+        assert counted_db.commands == ['find', 'aggregate']
+
+    def test_dashboard_query_count_with_rollups(self, authenticated_client, db, test_user, counted_db):
+        """Test rollup-backed users render with the same number of commands"""
+        db.users.update_one({"_id": test_user['_id']}, {"$set": {"rollups_ready": True}})
+        counted_db.commands.clear()
+
+        response = authenticated_client.get('/dashboard')
+
+        assert response.status_code == 200
+        assert counted_db.commands == ['find', 'aggregate']
+
+    def test_dashboard_shows_month_totals(self, authenticated_client, db, test_user):
+        """Test the snapshot feeds this month's income and spending into the page"""
+        today = datetime.utcnow()
+        db.budget_plans.insert_one({
+            "user_id": test_user['_id'],
+            "year": today.year,
+            "month": today.month,
+            "total_budget": 900.0,
+            "category_budgets": {"Groceries": 900.0},
+            "is_filled": True,
+        })
+        db.incomes.insert_one({
+            "user_id": test_user['_id'],
+            "date": datetime(today.year, today.month, 1),
+            "source": "Salary",
+            "amount": 1234.0,
+        })
+        db.expenses.insert_one({
+            "user_id": test_user['_id'],
+            "category": "Groceries",
+            "amount": 56.0,
+            "date": datetime(today.year, today.month, 1),
+            "month": today.month,
+            "year": today.year,
+        })
+
+        response = authenticated_client.get('/dashboard')
+
+        assert response.status_code == 200
+        assert b'$1234.00' in response.data
+        assert b'Total Spent: $56.00' in response.data
+
+    def test_cached_fragments_follow_writes(self, app, authenticated_client, db, test_user, monkeypatch):
+        """Test a cached budget overview is re-rendered after the month's data changes"""
+        monkeypatch.setitem(app.config, "FRAGMENT_CACHE_TTL", 300)
+        today = datetime.utcnow()
+        db.budget_plans.insert_one({
+            "user_id": test_user['_id'],
+            "year": today.year,
+            "month": today.month,
+            "total_budget": 100.0,
+            "category_budgets": {"Food": 100.0},
+            "is_filled": True,
+        })
+
+        first = authenticated_client.get('/dashboard')
+        authenticated_client.post('/expenses/add', data={
+            'date': today.strftime('%Y-%m-%d'),
+            'category': 'Food',
+            'amount': '42',
+        })
+        second = authenticated_client.get('/dashboard')
+
+        assert b'Total Spent: $0.00' in first.data
+        assert b'Total Spent: $42.00' in second.data
+
+    def test_cached_overview_follows_total_budget(self, app, authenticated_client, db, test_user, monkeypatch):
+        """Test editing only the plan's total re-renders the cached budget overview"""
+        monkeypatch.setitem(app.config, "FRAGMENT_CACHE_TTL", 300)
+        today = datetime.utcnow()
+        db.budget_plans.insert_one({
+            "user_id": test_user['_id'],
+            "year": today.year,
+            "month": today.month,
+            "total_budget": 1000.0,
+            "category_budgets": {"Food": 100.0},
+            "is_filled": True,
+        })
+
+        first = authenticated_client.get('/dashboard')
+        db.budget_plans.update_one({"user_id": test_user['_id']}, {"$set": {"total_budget": 2500.0}})
+        second = authenticated_client.get('/dashboard')
+
+        assert b'1000.00' in first.data
+        assert b'2500.00' in second.data
+
+    def test_overview_digest_covers_every_field_it_renders(self):
+        """Test every view field the budget overview partial reads is part of its cache digest"""
+        import os
+        import re
+        from services.dashboard_view import BUDGET_OVERVIEW_FIELDS
+        partial = os.path.join(os.path.dirname(__file__), '..', 'templates', 'partials', '_budget_overview.html')
+        with open(partial) as f:
+            used = set(re.findall(r'view\.(\w+)', f.read()))
+
+        assert used <= set(BUDGET_OVERVIEW_FIELDS)
+
+class TestCurrentUserCaching:
+    """Test get_current_user's request-scoped and per-process caches"""
+
+    @pytest.fixture
+    def user_cache_ttl(self, app):
+        app.config['USER_CACHE_TTL'] = 30
+        flask_app.user_cache.clear()
+        yield
+        app.config['USER_CACHE_TTL'] = 0
+        flask_app.user_cache.clear()
+
+    def test_user_loaded_once_per_request(self, app, test_user, counted_db):
+        """Test repeated calls within one request hit Mongo once"""
+        with app.test_request_context():
+            flask_app.session['user_id'] = str(test_user['_id'])
+            first = flask_app.get_current_user()
+            second = flask_app.get_current_user()
+
+        assert first is second
+        assert counted_db.commands == ['find']
+
+    def test_projection_drops_secrets(self, app, test_user):
+        """Test the cached user doesn't carry the password hash or reset token"""
+        with app.test_request_context():
+            flask_app.session['user_id'] = str(test_user['_id'])
+            user = flask_app.get_current_user()
+
+        assert user['email'] == 'test@test.com'
+        assert 'password' not in user
+        assert 'password_reset_token' not in user
+
+    def test_ttl_cache_skips_lookup(self, authenticated_client, test_user, counted_db, user_cache_ttl):
+        """Test a second request is served from the per-process cache"""
+        authenticated_client.get('/dashboard')
+        counted_db.commands.clear()
+
+        response = authenticated_client.get('/dashboard')
+
+        assert response.status_code == 200
+        assert counted_db.commands == ['aggregate']
+
+    def test_password_reset_invalidates_cache(self, authenticated_client, test_user, db, user_cache_ttl):
+        """Test resetting a password evicts the cached user"""
+        authenticated_client.get('/dashboard')
+        assert len(flask_app.user_cache) == 1
+
+        token = issue_token(db, test_user['_id'])
+        authenticated_client.post(f'/reset-password/{token}', data={'password': 'another-pass'})
+
+        assert len(flask_app.user_cache) == 0
+
 class TestBudgetPlanRoutes:
     """Test budget plan routes"""
     
@@ -321,6 +511,496 @@ class TestExpenseRoutes:
         expense_check = db.expenses.find_one({"_id": expense_id})
         assert expense_check is not None
 
+class TestResetTokens:
+    """Test hashed, single-use, expiring reset tokens"""
+
+    def test_token_stored_hashed(self, db, test_user):
+        """Test only the SHA-256 of the token is stored"""
+        from services.reset_tokens import hash_token
+        token = issue_token(db, test_user['_id'])
+
+        doc = db.password_reset_tokens.find_one({})
+        assert doc['token_hash'] == hash_token(token)
+        assert token not in str(doc)
+
+    def test_new_token_replaces_old(self, client, db, test_user):
+        """Test requesting a second link invalidates the first one"""
+        first = issue_token(db, test_user['_id'])
+        second = issue_token(db, test_user['_id'])
+
+        assert db.password_reset_tokens.count_documents({'user_id': test_user['_id']}) == 1
+        assert '/login' in client.get(f'/reset-password/{first}').location
+        assert client.get(f'/reset-password/{second}').status_code == 200
+
+    def test_expired_token_rejected(self, client, db, test_user):
+        """Test a token past its expiry is refused even before the TTL monitor removes it"""
+        token = issue_token(db, test_user['_id'], ttl=60, now=datetime.utcnow() - timedelta(minutes=5))
+
+        response = client.post(f'/reset-password/{token}', data={'password': 'newpassword123'})
+
+        assert '/login' in response.location
+        user = db.users.find_one({'_id': test_user['_id']})
+        assert user['password'] == test_user['password']
+
+    def test_token_works_once(self, client, db, test_user):
+        """Test a reset link can't be replayed"""
+        token = issue_token(db, test_user['_id'])
+        client.post(f'/reset-password/{token}', data={'password': 'first-pass'})
+
+        client.post(f'/reset-password/{token}', data={'password': 'second-pass'})
+
+        user = db.users.find_one({'_id': test_user['_id']})
+        assert flask_app.passwords.verify(user['password'], 'first-pass')
+
+
+class TestMailOutbox:
+    """Test reset emails go through the outbox and a local SMTP server"""
+
+    @pytest.fixture
+    def sender(self, db, smtp_server, monkeypatch):
+        from services.outbox import OutboxSender, SmtpSettings
+        settings = SmtpSettings(
+            host='127.0.0.1', port=smtp_server.port, use_tls=False, use_ssl=False,
+            username=None, password=None, sender='noreply@test.com', timeout=5,
+        )
+        sender = OutboxSender(lambda: db, settings, concurrency=2, max_attempts=2, backoff=60, poll_interval=0.05)
+        monkeypatch.setattr(flask_app, 'outbox', sender)
+        yield sender
+        sender.stop()
+
+    def _queue(self, db, n):
+        for i in range(n):
+            flask_app.enqueue_email(db, f'user{i}@test.com', 'Hello', f'Message {i}')
+
+    def test_forgot_password_never_shows_the_link(self, client, test_user):
+        """Test the reset link only goes out by email, not onto the page"""
+        response = client.post('/forgot-password', data={'email': 'test@test.com'}, follow_redirects=True)
+
+        assert b'/reset-password/' not in response.data
+        assert b'If this email exists' in response.data
+
+    def test_forgot_password_only_enqueues(self, client, db, test_user, smtp_server):
+        """Test the request stores the reset email and returns without talking SMTP"""
+        response = client.post('/forgot-password', data={'email': 'test@test.com'})
+
+        assert response.status_code == 302
+        message = db.outbox.find_one({})
+        assert message['to'] == 'test@test.com'
+        assert message['status'] == 'pending'
+        token = message['body'].split('/reset-password/')[1].split()[0]
+        assert flask_app.find_token(db, token) == test_user['_id']
+        assert smtp_server.connections == 0
+
+    def test_drain_reuses_one_connection(self, db, smtp_server, sender):
+        """Test several queued emails are delivered over a single SMTP session"""
+        self._queue(db, 3)
+
+        assert sender.drain() == 3
+
+        assert smtp_server.connections == 1
+        assert sorted(m['To'] for m in smtp_server.messages) == ['user0@test.com', 'user1@test.com', 'user2@test.com']
+        assert db.outbox.count_documents({'status': 'sent'}) == 3
+        assert db.outbox.count_documents({'body': {'$exists': True}}) == 0
+        stats = sender.stats()
+        assert (stats['depth'], stats['sent']) == (0, 3)
+        assert stats['send_ms']['count'] == 3
+
+    def test_transient_failure_backs_off_then_fails(self, db, smtp_server, sender, monkeypatch):
+        """Test a 451 reply schedules a retry later, and the last attempt marks it failed"""
+        self._queue(db, 1)
+        smtp_server.fail_next = 2
+
+        sender.drain()
+        message = db.outbox.find_one({})
+        assert (message['status'], message['attempts']) == ('pending', 1)
+        assert message['next_attempt_at'] > datetime.utcnow()
+        assert sender.drain() == 0  # not due yet
+
+        monkeypatch.setattr(sender, 'now', lambda: datetime.utcnow() + timedelta(hours=2))
+        sender.drain()
+        message = db.outbox.find_one({})
+        assert (message['status'], message['attempts']) == ('failed', 2)
+        assert '451' in message['last_error']
+        assert 'body' not in message
+        assert sender.stats()['failed_total'] == 1
+
+    def test_stats_reuse_the_queue_depths_between_scrapes(self, db, sender, monkeypatch):
+        """Test /metrics scrapes within stats_ttl don't query the outbox again"""
+        clock = [100.0]
+        monkeypatch.setattr(sender, '_clock', lambda: clock[0])
+        self._queue(db, 2)
+        assert sender.stats()['depth'] == 2
+
+        self._queue(db, 1)
+        clock[0] += sender.stats_ttl / 2
+        assert sender.stats()['depth'] == 2
+
+        clock[0] += sender.stats_ttl
+        stats = sender.stats()
+        assert (stats['depth'], stats['in_flight'], stats['failed_total']) == (3, 0, 0)
+
+    def test_expired_reset_link_is_dropped_unsent(self, client, db, test_user, smtp_server, sender, monkeypatch):
+        """Test a reset email still queued when its token expires is never sent and loses its link"""
+        client.post('/forgot-password', data={'email': 'test@test.com'})
+        monkeypatch.setattr(sender, 'now', lambda: datetime.utcnow() + timedelta(hours=2))
+
+        assert sender.drain() == 1
+
+        message = db.outbox.find_one({})
+        assert message['status'] == 'failed'
+        assert 'body' not in message
+        assert smtp_server.messages == []
+
+    def test_background_sender_delivers(self, app, client, db, test_user, smtp_server, sender, monkeypatch):
+        """Test the background threads pick up a message right after forgot_password"""
+        import time
+        monkeypatch.setitem(app.config, 'MAIL_OUTBOX_SENDER', 'thread')
+
+        client.post('/forgot-password', data={'email': 'test@test.com'})
+
+        deadline = time.monotonic() + 5
+        while not smtp_server.messages and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert smtp_server.messages[0]['Subject'] == 'Reset your BudgetBaddie password'
+        assert sender.stats()['senders'] == 2
+        # the counters are only published through /metrics
+        assert client.get('/mail/outbox/stats').status_code == 404
+        assert 'mail_outbox_senders 2' in client.get('/metrics').get_data(as_text=True)
+
+    def test_stale_claim_is_reclaimed(self, db, sender):
+        """Test a message left "sending" by a dead sender goes back to pending after its lease"""
+        self._queue(db, 1)
+        sender.claim()
+        db.outbox.update_one({}, {'$set': {'locked_until': datetime.utcnow() - timedelta(seconds=1)}})
+
+        assert sender.reclaim_stale() == 1
+        assert db.outbox.find_one({})['status'] == 'pending'
+
+    def test_running_sender_takes_over_an_expired_lease(self, db, smtp_server, sender):
+        """Test a running sender delivers a message whose other sender died mid-send, without a restart"""
+        import time
+        from services.outbox import OutboxSender
+        sender.lease = 0.2
+        sender.start()
+        dead = OutboxSender(lambda: db, sender.settings, lease=0.2)
+        self._queue(db, 1)
+        assert dead.claim() is not None  # claimed, then never sent
+
+        deadline = time.monotonic() + 5
+        while not smtp_server.messages and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        assert [m['To'] for m in smtp_server.messages] == ['user0@test.com']
+        assert db.outbox.find_one({})['status'] == 'sent'
+
+
+class TestPasswordHashing:
+    """Test off-thread hashing and the rehash-on-login upgrade"""
+
+    def _login(self, client, password='testpass123'):
+        return client.post('/login', data={'email': 'test@test.com', 'password': password})
+
+    def test_legacy_hash_upgraded_on_login(self, client, db, test_user):
+        """Test a werkzeug hash is replaced by a bcrypt one after a successful login"""
+        response = self._login(client)
+
+        assert '/dashboard' in response.location
+        stored = db.users.find_one({'_id': test_user['_id']})['password']
+        assert stored.startswith('$2b$')
+        assert not flask_app.passwords.needs_rehash(stored)
+        # and the upgraded hash still logs in
+        assert '/dashboard' in self._login(client).location
+
+    def test_outdated_cost_upgraded(self, client, db, test_user, monkeypatch):
+        """Test a bcrypt hash with an old cost factor is rehashed at the configured cost"""
+        import bcrypt
+        old = bcrypt.hashpw(b'testpass123', bcrypt.gensalt(rounds=5)).decode()
+        db.users.update_one({'_id': test_user['_id']}, {'$set': {'password': old}})
+        monkeypatch.setattr(flask_app.passwords, 'rounds', 6)
+
+        self._login(client)
+
+        stored = db.users.find_one({'_id': test_user['_id']})['password']
+        assert stored.startswith('$2b$06$')
+
+    def test_failed_login_keeps_hash(self, client, db, test_user):
+        """Test a wrong password neither logs in nor touches the stored hash"""
+        response = self._login(client, password='wrong')
+
+        assert '/login' in response.location
+        assert db.users.find_one({'_id': test_user['_id']})['password'] == test_user['password']
+
+    def test_saturated_pool_is_refused(self, client, test_user, monkeypatch):
+        """Test logins beyond the hashing queue are turned away instead of piling up"""
+        from services.passwords import PasswordHasher
+        hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=0)
+        hasher._slots.acquire()  # the only slot is busy
+        monkeypatch.setattr(flask_app, 'passwords', hasher)
+
+        response = self._login(client)
+
+        assert '/login' in response.location
+        assert hasher.rejected == 1
+        with client.session_transaction() as sess:
+            assert 'user_id' not in sess
+
+
+class TestPaginatedListings:
+    """Test the keyset-paginated /api/expenses and /api/incomes endpoints"""
+
+    def _add_expenses(self, db, user_id, days, year=2025, month=3):
+        ids = []
+        for day in days:
+            ids.append(db.expenses.insert_one({
+                "user_id": user_id,
+                "category": "Food",
+                "amount": float(day),
+                "note": "",
+                "date": datetime(year, month, day),
+                "month": month,
+                "year": year,
+            }).inserted_id)
+        return ids
+
+    def test_list_expenses_unauthenticated(self, client):
+        """Test the listing requires a login"""
+        response = client.get('/api/expenses')
+
+        assert response.status_code == 401
+
+    def test_walk_all_pages(self, authenticated_client, db, test_user):
+        """Test following next_cursor visits every expense once, newest first"""
+        # two rows share a date so the _id tie-break matters
+        ids = self._add_expenses(db, test_user['_id'], [1, 2, 2, 3, 4, 5, 6])
+
+        seen, cursor = [], None
+        while True:
+            url = '/api/expenses?year=2025&month=3&limit=3'
+            if cursor:
+                url += f'&cursor={cursor}'
+            data = authenticated_client.get(url).get_json()
+            assert len(data['items']) <= 3
+            seen += data['items']
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        assert sorted(item['id'] for item in seen) == sorted(str(i) for i in ids)
+        assert [item['date'] for item in seen] == sorted((item['date'] for item in seen), reverse=True)
+        assert seen[0] == {"id": str(ids[-1]), "date": "2025-03-06", "category": "Food", "amount": 6.0, "note": ""}
+
+    def test_month_filter(self, authenticated_client, db, test_user):
+        """Test ?year=&month= only returns that month"""
+        self._add_expenses(db, test_user['_id'], [1], month=3)
+        self._add_expenses(db, test_user['_id'], [1], month=4)
+
+        data = authenticated_client.get('/api/expenses?year=2025&month=4').get_json()
+
+        assert [item['date'] for item in data['items']] == ['2025-04-01']
+        assert data['next_cursor'] is None
+
+    def test_page_size_is_capped(self, authenticated_client, db, test_user):
+        """Test limit is clamped to MAX_PAGE_SIZE"""
+        from services.pagination import MAX_PAGE_SIZE
+        db.expenses.insert_many([
+            {"user_id": test_user['_id'], "category": "Food", "amount": 1.0,
+             "date": datetime(2025, 3, 1), "month": 3, "year": 2025}
+            for _ in range(MAX_PAGE_SIZE + 5)
+        ])
+
+        data = authenticated_client.get('/api/expenses?limit=100000').get_json()
+
+        assert len(data['items']) == MAX_PAGE_SIZE
+        assert data['next_cursor']
+
+    def test_invalid_cursor(self, authenticated_client):
+        """Test a garbage cursor is a 400, not a 500"""
+        response = authenticated_client.get('/api/expenses?cursor=not-a-cursor')
+
+        assert response.status_code == 400
+
+    def test_list_incomes_by_month(self, authenticated_client, db, test_user):
+        """Test incomes are filtered by their date and paginated"""
+        for day in (1, 15, 28):
+            db.incomes.insert_one({
+                "user_id": test_user['_id'],
+                "date": datetime(2025, 3, day),
+                "source": "Job",
+                "amount": 100.0,
+                "note": "",
+            })
+        db.incomes.insert_one({
+            "user_id": test_user['_id'],
+            "date": datetime(2025, 4, 1),
+            "source": "Job",
+            "amount": 100.0,
+        })
+
+        first = authenticated_client.get('/api/incomes?year=2025&month=3&limit=2').get_json()
+        second = authenticated_client.get(
+            f"/api/incomes?year=2025&month=3&limit=2&cursor={first['next_cursor']}"
+        ).get_json()
+
+        assert [i['date'] for i in first['items']] == ['2025-03-28', '2025-03-15']
+        assert [i['date'] for i in second['items']] == ['2025-03-01']
+        assert second['next_cursor'] is None
+
+    def test_dashboard_renders_first_page_only(self, app, authenticated_client, db, test_user, monkeypatch):
+        """Test the dashboard lists one page but totals cover the whole month"""
+        monkeypatch.setitem(app.config, "EXPENSE_PAGE_SIZE", 2)
+        today = datetime.utcnow()
+        db.budget_plans.insert_one({
+            "user_id": test_user['_id'],
+            "year": today.year,
+            "month": today.month,
+            "total_budget": 100.0,
+            "category_budgets": {"Food": 100.0},
+            "is_filled": True,
+        })
+        self._add_expenses(db, test_user['_id'], [1, 2, 3], year=today.year, month=today.month)
+
+        response = authenticated_client.get('/dashboard')
+
+        assert response.status_code == 200
+        assert len(re.findall(rb'action="/expenses/delete/[0-9a-f]{24}"', response.data)) == 2
+        assert b'id="load-more-expenses"' in response.data
+        assert b'Total Spent: $6.00' in response.data
+
+class TestStatementImport:
+    """Test the streaming CSV / OFX import at /api/import"""
+
+    def _upload(self, client, body, filename='statement.csv', **form):
+        from io import BytesIO
+        form['file'] = (BytesIO(body.encode()), filename)
+        return client.post('/api/import', data=form, content_type='multipart/form-data')
+
+    def test_import_unauthenticated(self, client):
+        """Test importing requires a login"""
+        response = self._upload(client, "date,amount\n")
+
+        assert response.status_code == 401
+
+    def test_csv_rows_become_expenses_and_incomes(self, app, authenticated_client, db, test_user, monkeypatch):
+        """Test signed amounts are split into expenses and incomes, in small batches"""
+        monkeypatch.setitem(app.config, "IMPORT_BATCH_SIZE", 2)
+        body = (
+            "Date,Description,Amount,Category\n"
+            "2025-03-01,Groceries,-42.50,Food\n"
+            "2025-03-02,Paycheck,1500.00,\n"
+            "03/05/2025,Bus pass,\"-1,020.00\",Transport\n"
+            "2025-03-06,Coffee,(3.25),\n"
+        )
+
+        response = self._upload(authenticated_client, body)
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['inserted'] == {'expenses': 3, 'incomes': 1}
+        assert data['error_count'] == 0
+        expense = db.expenses.find_one({'note': 'Groceries'})
+        assert expense['user_id'] == test_user['_id']
+        assert (expense['amount'], expense['category'], expense['year'], expense['month']) == (42.5, 'Food', 2025, 3)
+        assert db.expenses.find_one({'note': 'Coffee'})['category'] == 'Other'
+        income = db.incomes.find_one({'user_id': test_user['_id']})
+        assert (income['amount'], income['source']) == (1500.0, 'Paycheck')
+        rollup = db.monthly_rollups.find_one({'user_id': test_user['_id'], 'year': 2025, 'month': 3})
+        assert rollup['expense_total'] == pytest.approx(1065.75)
+        assert rollup['income_total'] == pytest.approx(1500.0)
+
+    def test_bad_rows_are_reported_and_skipped(self, authenticated_client, db):
+        """Test unparsable rows come back with their line numbers"""
+        body = "date,amount\n2025-03-01,-10\nnot a date,-5\n2025-03-02,abc\n2025-03-03,-7\n"
+
+        data = self._upload(authenticated_client, body, kind='expense').get_json()
+
+        assert data['inserted'] == {'expenses': 2, 'incomes': 0}
+        assert [e['row'] for e in data['errors']] == [3, 4]
+        assert db.expenses.count_documents({}) == 2
+
+    def test_missing_columns_rejected(self, authenticated_client, db):
+        """Test a CSV without a date/amount header is refused before anything is written"""
+        response = self._upload(authenticated_client, "foo,bar\n1,2\n")
+
+        assert response.status_code == 400
+        assert db.expenses.count_documents({}) == 0
+
+    def test_ofx_statement(self, authenticated_client, db):
+        """Test OFX (SGML style, unclosed field tags) transactions are imported by sign"""
+        body = (
+            "OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            "<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20250304120000[-5:EST]\n<TRNAMT>-19.99\n<NAME>Streaming\n</STMTTRN>\n"
+            "<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20250315\n<TRNAMT>2000.00\n<NAME>Salary\n</STMTTRN>\n"
+            "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        )
+
+        data = self._upload(authenticated_client, body, filename='march.ofx').get_json()
+
+        assert data['inserted'] == {'expenses': 1, 'incomes': 1}
+        expense = db.expenses.find_one({})
+        assert (expense['amount'], expense['note'], expense['date']) == (19.99, 'Streaming', datetime(2025, 3, 4))
+
+
+class TestHistoryExport:
+    """Test the streaming /api/export of expenses, incomes and plans"""
+
+    def _seed(self, db, user_id):
+        db.expenses.insert_one({
+            "user_id": user_id, "budget_plan_id": None, "category": "Food", "amount": 12.5,
+            "note": "lunch, with friends", "date": datetime(2025, 3, 2), "month": 3, "year": 2025,
+        })
+        db.incomes.insert_one({"user_id": user_id, "source": "Job", "amount": 900.0, "date": datetime(2025, 3, 1)})
+        db.budget_plans.insert_one({
+            "user_id": user_id, "year": 2025, "month": 3, "is_filled": True,
+            "total_budget": 800.0, "category_budgets": {"Food": 300.0},
+        })
+        # someone else's data must not leak into the export
+        db.expenses.insert_one({"user_id": ObjectId(), "category": "Food", "amount": 1.0, "date": datetime(2025, 3, 3)})
+
+    def test_export_unauthenticated(self, client):
+        """Test exporting requires a login"""
+        response = client.get('/api/export')
+
+        assert response.status_code == 401
+
+    def test_ndjson_matches_api_shape(self, authenticated_client, db, test_user):
+        """Test every NDJSON line is a to_response() document tagged with its type"""
+        self._seed(db, test_user['_id'])
+
+        response = authenticated_client.get('/api/export?format=ndjson')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'attachment' in response.headers['Content-Disposition']
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [line['type'] for line in lines] == ['expense', 'income', 'budget_plan']
+        expense = lines[0]
+        assert expense['user_id'] == str(test_user['_id'])
+        assert expense['budget_plan_id'] is None
+        assert expense['date'] == '2025-03-02T00:00:00'
+        assert '_id' not in expense and len(expense['id']) == 24
+        assert lines[2]['category_budgets'] == {'Food': 300.0}
+
+    def test_csv_with_gzip(self, authenticated_client, db, test_user):
+        """Test the CSV export can be gzipped on the fly"""
+        import csv
+        import gzip
+        import io
+        self._seed(db, test_user['_id'])
+
+        response = authenticated_client.get('/api/export?format=csv&gzip=1&include=expenses,incomes')
+
+        assert response.mimetype == 'application/gzip'
+        assert response.headers['Content-Disposition'].endswith('.csv.gz"')
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.get_data()).decode())))
+        assert [(r['type'], r['amount']) for r in rows] == [('expense', '12.5'), ('income', '900.0')]
+        assert rows[0]['note'] == 'lunch, with friends'
+
+    def test_invalid_arguments(self, authenticated_client):
+        """Test unknown formats and sections are rejected before streaming starts"""
+        assert authenticated_client.get('/api/export?format=xml').status_code == 400
+        assert authenticated_client.get('/api/export?include=expenses,secrets').status_code == 400
+
+
 class TestAIAdviceRoute:
     """Test AI advice route"""
     
@@ -397,3 +1077,416 @@ class TestAIAdviceRoute:
         data = json.loads(response.data)
         assert data['context']['total_budget'] == 1000
         assert data['context']['total_income'] == 2000
+
+class TestAsyncAIAdvice:
+    """Test the background-job mode of /ai/advice against the local fake model"""
+
+    @pytest.fixture
+    def advice_jobs(self, app, monkeypatch):
+        """A one-worker, no-queue job pool and a fake model with 0.3s latency"""
+        from services.jobs import JobQueue
+        jobs = JobQueue(max_workers=1, max_queue=0, timeout=5)
+        monkeypatch.setattr(flask_app, 'advice_jobs', jobs)
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.3)
+        yield jobs
+        jobs.shutdown()
+
+    def _ask(self, client):
+        return client.post('/ai/advice',
+            data=json.dumps({'question': 'Can I afford a $50 dinner?', 'async': True}),
+            content_type='application/json'
+        )
+
+    def test_job_result_via_long_poll(self, authenticated_client, advice_jobs):
+        """Test the POST returns a job id right away and the result can be long-polled"""
+        response = self._ask(authenticated_client)
+
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data['status'] in ('pending', 'running')
+
+        result = authenticated_client.get(data['status_url'] + '?wait=5')
+
+        assert result.status_code == 200
+        body = result.get_json()
+        assert body['status'] == 'done'
+        assert body['advice'].startswith('Fake advice')
+        assert 'total_budget' in body['context']
+
+    def test_poll_without_wait_reports_pending(self, authenticated_client, advice_jobs):
+        """Test a plain poll returns 202 while the model is still working"""
+        data = self._ask(authenticated_client).get_json()
+
+        response = authenticated_client.get(data['status_url'])
+
+        assert response.status_code == 202
+        assert response.get_json()['status'] in ('pending', 'running')
+
+    def test_full_queue_is_rejected(self, authenticated_client, advice_jobs):
+        """Test a full pool answers 503 with Retry-After"""
+        assert self._ask(authenticated_client).status_code == 202
+
+        response = self._ask(authenticated_client)
+
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+
+    def test_caller_runs_policy(self, authenticated_client, advice_jobs):
+        """Test the caller_runs policy answers inline instead of rejecting"""
+        advice_jobs.policy = "caller_runs"
+        self._ask(authenticated_client)
+
+        response = self._ask(authenticated_client)
+
+        assert response.status_code == 202
+        assert response.get_json()['status'] == 'done'
+
+    def test_slow_model_times_out(self, app, authenticated_client, advice_jobs):
+        """Test a job that outlives AI timeout is reported as 504"""
+        advice_jobs.timeout = 0.1
+        data = self._ask(authenticated_client).get_json()
+
+        response = authenticated_client.get(data['status_url'] + '?wait=1')
+
+        assert response.status_code == 504
+        assert response.get_json()['status'] == 'timeout'
+
+    def test_unknown_job(self, authenticated_client, advice_jobs):
+        """Test polling a job id that doesn't exist (or isn't yours) is a 404"""
+        response = authenticated_client.get('/ai/advice/jobs/does-not-exist')
+
+        assert response.status_code == 404
+
+class TestStreamingAIAdvice:
+    """Test Server-Sent Events streaming of /ai/advice with the local stub model"""
+
+    def _stream(self, client, **kwargs):
+        return client.post('/ai/advice',
+            data=json.dumps({'question': 'Can I afford a $50 dinner?'}),
+            content_type='application/json',
+            headers={'Accept': 'text/event-stream'},
+            **kwargs
+        )
+
+    @staticmethod
+    def _events(body):
+        events = []
+        for raw in body.decode().strip().split('\n\n'):
+            name, data = 'message', None
+            for line in raw.split('\n'):
+                if line.startswith('event: '):
+                    name = line[len('event: '):]
+                elif line.startswith('data: '):
+                    data = json.loads(line[len('data: '):])
+            events.append((name, data))
+        return events
+
+    def test_streams_chunks_as_events(self, app, authenticated_client, monkeypatch):
+        """Test the answer arrives as context, text chunks, then done"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.0)
+
+        response = self._stream(authenticated_client)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = self._events(response.data)
+        assert events[0][0] == 'context'
+        assert 'total_budget' in events[0][1]
+        chunks = [data['text'] for name, data in events if name == 'message']
+        assert len(chunks) > 1
+        assert ''.join(chunks) == 'Fake advice: spend less than you earn.'
+        assert events[-1][0] == 'done'
+
+    def test_first_event_before_model_finishes(self, app, authenticated_client, monkeypatch):
+        """Test the first bytes go out before the (slow) model has finished"""
+        import time
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.8)
+
+        start = time.monotonic()
+        response = self._stream(authenticated_client, buffered=False)
+        first = next(response.response)
+        elapsed = time.monotonic() - start
+        rest = b''.join(response.response)
+        response.close()
+
+        assert (first if isinstance(first, bytes) else first.encode()).startswith(b'event: context')
+        assert elapsed < 0.5
+        assert b'event: done' in rest
+
+    @patch('app.genai.GenerativeModel')
+    def test_model_error_becomes_error_event(self, mock_model, app, authenticated_client, monkeypatch):
+        """Test an upstream failure is reported in-stream instead of a broken response"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", None)
+        mock_model.return_value.generate_content.side_effect = RuntimeError("quota exceeded")
+
+        response = self._stream(authenticated_client)
+
+        events = self._events(response.data)
+        assert events[-1] == ('error', {'error': 'AI service error: quota exceeded'})
+
+    def test_json_without_event_stream_accept(self, app, authenticated_client, monkeypatch):
+        """Test clients that don't ask for SSE keep getting the JSON response"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.0)
+
+        response = authenticated_client.post('/ai/advice',
+            data=json.dumps({'question': 'Hi'}),
+            content_type='application/json',
+            headers={'Accept': '*/*'}
+        )
+
+        assert response.mimetype == 'application/json'
+        assert response.get_json()['advice'].startswith('Fake advice')
+
+class TestAIAdviceCache:
+    """Test the advice response cache in front of the model"""
+
+    def _ask(self, client, question, **headers):
+        return client.post('/ai/advice',
+            data=json.dumps({'question': question}),
+            content_type='application/json',
+            headers=headers
+        )
+
+    @patch('app.genai.GenerativeModel')
+    def test_identical_question_hits_cache(self, mock_model, app, authenticated_client, monkeypatch):
+        """Test a repeated (normalized) question is answered without calling the model"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", None)
+        mock_model.return_value.generate_content.return_value = Mock(text="Cached advice")
+        before = flask_app.advice_cache.stats()
+
+        first = self._ask(authenticated_client, 'Can I afford a $50 dinner?')
+        second = self._ask(authenticated_client, '  can I afford a $50   DINNER ')
+
+        assert first.get_json() == second.get_json()
+        assert mock_model.return_value.generate_content.call_count == 1
+        assert flask_app.advice_cache.stats()['hits'] == before['hits'] + 1
+        # the counters are only published through /metrics
+        assert authenticated_client.get('/ai/advice/stats').status_code == 404
+        assert f"ai_advice_cache_hits {before['hits'] + 1}" in authenticated_client.get('/metrics').get_data(as_text=True)
+
+    @patch('app.genai.GenerativeModel')
+    def test_new_expense_invalidates(self, mock_model, app, authenticated_client, monkeypatch):
+        """Test changing this month's data means a fresh model call"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", None)
+        mock_model.return_value.generate_content.return_value = Mock(text="Advice")
+
+        self._ask(authenticated_client, 'How am I doing?')
+        authenticated_client.post('/expenses/add', data={
+            'date': datetime.utcnow().strftime('%Y-%m-%d'),
+            'category': 'Food',
+            'amount': '12',
+        })
+        response = self._ask(authenticated_client, 'How am I doing?')
+
+        assert response.get_json()['context']['total_spent'] == 12.0
+        assert mock_model.return_value.generate_content.call_count == 2
+
+    def test_streamed_answer_is_cached(self, app, authenticated_client, monkeypatch):
+        """Test a completed stream fills the cache for the JSON path and vice versa"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.0)
+
+        self._ask(authenticated_client, 'Stream me', Accept='text/event-stream').get_data()
+        with patch('app.genai.GenerativeModel') as mock_model:
+            monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", None)
+            response = self._ask(authenticated_client, 'Stream me')
+            replay = self._ask(authenticated_client, 'Stream me', Accept='text/event-stream')
+
+        assert response.get_json()['advice'] == 'Fake advice: spend less than you earn.'
+        assert b'"text": "Fake advice: spend less than you earn."' in replay.data
+        assert mock_model.call_count == 0
+
+    @patch('app.genai.GenerativeModel')
+    def test_errors_are_not_cached(self, mock_model, app, authenticated_client, monkeypatch):
+        """Test a failed upstream call is retried next time"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", None)
+        mock_model.return_value.generate_content.side_effect = [RuntimeError("boom"), Mock(text="ok")]
+
+        assert self._ask(authenticated_client, 'Retry?').status_code == 500
+        assert self._ask(authenticated_client, 'Retry?').get_json()['advice'] == 'ok'
+
+class TestAIUpstreamGuard:
+    """Test admission control and the circuit breaker in front of the model"""
+
+    def _ask(self, client, question='Anything?', **headers):
+        return client.post('/ai/advice',
+            data=json.dumps({'question': question}),
+            content_type='application/json',
+            headers=headers
+        )
+
+    @pytest.fixture
+    def guard(self, app, monkeypatch):
+        from api.app.resilience import AdmissionLimiter, CircuitBreaker, UpstreamGuard
+        guard = UpstreamGuard(
+            AdmissionLimiter(max_in_flight=1, max_waiting=0, retry_after=3),
+            CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        )
+        monkeypatch.setattr(flask_app, 'ai_guard', guard)
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", None)
+        return guard
+
+    @patch('app.genai.GenerativeModel')
+    def test_saturated_upstream_fails_fast(self, mock_model, authenticated_client, guard):
+        """Test a request beyond the in-flight limit gets 503 + Retry-After without calling the model"""
+        guard.limiter.acquire()  # someone else holds the only slot
+        try:
+            response = self._ask(authenticated_client)
+        finally:
+            guard.limiter.release()
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '3'
+        assert mock_model.return_value.generate_content.call_count == 0
+        assert guard.stats()['rejected'] == 1
+
+    @patch('app.genai.GenerativeModel')
+    def test_breaker_opens_after_repeated_errors(self, mock_model, authenticated_client, guard):
+        """Test consecutive upstream errors open the circuit and later calls are shed"""
+        mock_model.return_value.generate_content.side_effect = RuntimeError("upstream down")
+
+        assert self._ask(authenticated_client, 'one').status_code == 500
+        assert self._ask(authenticated_client, 'two').status_code == 500
+        shed = self._ask(authenticated_client, 'three')
+
+        assert shed.status_code == 503
+        assert int(shed.headers['Retry-After']) > 0
+        assert mock_model.return_value.generate_content.call_count == 2
+        stats = guard.stats()
+        assert stats['state'] == 'open'
+        assert stats['short_circuited'] == 1
+
+    @patch('app.genai.GenerativeModel')
+    def test_half_open_probe_closes_circuit(self, mock_model, authenticated_client, guard):
+        """Test one successful probe after the reset timeout closes the circuit"""
+        guard.breaker.record_failure()
+        guard.breaker.record_failure()
+        guard.breaker.opened_at -= 61
+        mock_model.return_value.generate_content.return_value = Mock(text="back")
+
+        response = self._ask(authenticated_client)
+
+        assert response.status_code == 200
+        assert guard.breaker.state == 'closed'
+
+    def test_async_mode_sheds_while_open(self, authenticated_client, guard):
+        """Test async submissions are refused up front while the circuit is open"""
+        guard.breaker.record_failure()
+        guard.breaker.record_failure()
+
+        response = authenticated_client.post('/ai/advice',
+            data=json.dumps({'question': 'Later?', 'async': True}),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+
+    def test_stream_releases_slot(self, app, authenticated_client, guard, monkeypatch):
+        """Test a finished stream gives its slot back and counts as a success"""
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.0)
+
+        response = self._ask(authenticated_client, Accept='text/event-stream')
+        response.get_data()
+        response.close()
+
+        stats = guard.stats()
+        assert stats['in_flight'] == 0
+        assert stats['admitted'] == 1
+        assert stats['state'] == 'closed'
+
+class TestMetrics:
+    """Test the Prometheus /metrics endpoint and per-route attribution"""
+
+    def test_request_latency_by_route(self, client):
+        """Test requests show up under their route template with method and status"""
+        client.get('/login')
+
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        body = response.get_data(as_text=True)
+        assert 'http_request_duration_seconds_count{route="/login",method="GET",status="200"}' in body
+        assert '# TYPE http_request_duration_seconds histogram' in body
+        assert 'ai_upstream_state{value="closed"} 1' in body
+
+    def test_mongo_commands_charged_to_route(self, app, db, authenticated_client, monkeypatch):
+        """Test the command listener attributes the dashboard's queries to its route"""
+        from api.app.metrics import MONGO_COMMANDS, MongoCommandMetrics
+        client = MongoClient(os.environ["MONGO_URI"], event_listeners=[MongoCommandMetrics()])
+        monkeypatch.setattr(flask_app, 'db', client[db.name])
+        before = MONGO_COMMANDS.value('/dashboard', 'find')
+
+        authenticated_client.get('/dashboard')
+
+        assert MONGO_COMMANDS.value('/dashboard', 'find') > before
+        body = authenticated_client.get('/metrics').get_data(as_text=True)
+        assert 'mongo_command_duration_seconds_count{route="/dashboard",command="find"}' in body
+        assert 'http_request_mongo_commands_count{route="/dashboard"}' in body
+        client.close()
+
+    def test_gemini_calls_timed(self, app, authenticated_client, monkeypatch):
+        """Test advice generation records an upstream timing for gemini"""
+        from api.app.metrics import UPSTREAM_SECONDS
+        monkeypatch.setitem(app.config, "AI_FAKE_LATENCY", 0.0)
+        before = UPSTREAM_SECONDS.count('gemini', 'ok')
+
+        authenticated_client.post('/ai/advice',
+            data=json.dumps({'question': 'Can I afford a $50 dinner?'}),
+            content_type='application/json',
+        )
+
+        assert UPSTREAM_SECONDS.count('gemini', 'ok') == before + 1
+
+
+class TestReadiness:
+    """Test the /ready probe used by the production server's health checks"""
+
+    def test_ready_reports_pool(self, client):
+        """Test a reachable MongoDB gives 200 with this worker's pool settings and state"""
+        response = client.get('/ready')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] == 'ready'
+        assert data['pid'] == os.getpid()
+        assert data['pool']['max_pool_size'] == flask_app.config['MONGO_MAX_POOL_SIZE']
+        assert {'open', 'in_use', 'waiting', 'checkout_failed'} <= set(data['pool'])
+
+    def test_unreachable_mongo_is_not_ready(self, client):
+        """Test a failed ping gives 503 with the error"""
+        from pymongo.errors import ServerSelectionTimeoutError
+        unreachable = Mock()
+        unreachable.admin.command.side_effect = ServerSelectionTimeoutError('no servers')
+
+        with patch.object(flask_app.client, 'get', return_value=unreachable):
+            response = client.get('/ready')
+
+        assert response.status_code == 503
+        data = response.get_json()
+        assert data['status'] == 'unavailable'
+        assert 'no servers' in data['error']
+        assert 'pool' in data
+
+
+class TestAppFactory:
+    """Test create_app() builds independent, fully wired apps"""
+
+    def test_create_app_with_overrides(self, app, db):
+        """Test a second app gets the same routes and its own config"""
+        other = flask_app.create_app({'TESTING': True, 'EXPENSE_PAGE_SIZE': 5})
+
+        assert other is not app
+        assert other.config['EXPENSE_PAGE_SIZE'] == 5
+        assert app.config['EXPENSE_PAGE_SIZE'] == flask_app.config['EXPENSE_PAGE_SIZE']
+        assert {r.endpoint for r in other.url_map.iter_rules()} == {r.endpoint for r in app.url_map.iter_rules()}
+        assert 'send-outbox' in other.cli.commands
+        assert other.test_client().get('/login').status_code == 200
+
+    def test_request_hooks_cover_unmatched_urls(self, app, client, monkeypatch):
+        """Test the metrics hooks run app-wide, not only for the blueprint's own routes"""
+        monkeypatch.setitem(app.config, 'METRICS_ENABLED', True)
+
+        assert client.get('/no-such-page').status_code == 404
+
+        assert 'route="unmatched"' in client.get('/metrics').get_data(as_text=True)